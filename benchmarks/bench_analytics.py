@@ -0,0 +1,180 @@
+"""
+Сравнение движков агрегатов главной страницы и статистики машины на текущей базе (только чтение):
+pandas по DataFrame хранилища, DuckDB по тем же DataFrame и по Parquet-копии,
+GROUP BY в Postgres. Для каждого движка проверяется, что результат совпадает с pandas.
+
+Нужен пакет duckdb. Запуск из корня проекта:
+    python -m benchmarks.bench_analytics --repeat 5
+"""
+import argparse
+import tempfile
+import time
+
+import pandas as pd
+from sqlalchemy import text
+
+import database.parquet_mirror as parquet_mirror
+import database.snapshot as snapshot
+import services.analytics as analytics
+import services.calculate as calculate
+from database.db import reporting_engine
+from database.frame_store import get_frames
+
+MONTHLY_INCOME_START = '2024-09-01'
+MONTHLY_COUNTS_START = '2022-05-01'
+LOW_SALES_THRESHOLD = 200
+
+# Те же агрегаты запросами к Postgres (так считались средние на странице статистики машины)
+POSTGRES_QUERIES = {
+    'monthly_income': """
+        SELECT to_char(date_trunc('month', date), 'MM/YY') AS month_str,
+               sum(coalesce(change_amount, 0)) AS change_amount
+        FROM profits
+        WHERE date IS NOT NULL AND date >= :start_date
+        GROUP BY date_trunc('month', date)
+        ORDER BY date_trunc('month', date) DESC
+    """,
+    'monthly_counts': """
+        WITH purchases AS (
+            SELECT date_trunc('month', purchesdate) AS month, count(*) AS purchases
+            FROM cars WHERE purchesdate >= :start_date GROUP BY 1
+        ), inventories AS (
+            SELECT date_trunc('month', inventoried) AS month, count(*) AS inventories
+            FROM cars WHERE inventoried >= :start_date GROUP BY 1
+        )
+        SELECT
+            to_char(coalesce(purchases.month, inventories.month), 'MM/YY') AS month_str,
+            coalesce(purchases.purchases, 0) AS "Количество покупок",
+            coalesce(inventories.inventories, 0) AS "Количество инвентаризаций"
+        FROM purchases FULL OUTER JOIN inventories ON purchases.month = inventories.month
+        ORDER BY coalesce(purchases.month, inventories.month) DESC
+    """,
+    'low_sales': """
+        WITH last_dates AS (
+            SELECT DISTINCT date FROM profits WHERE date IS NOT NULL ORDER BY date DESC LIMIT 4
+        )
+        SELECT stockn FROM profits
+        WHERE date IN (SELECT date FROM last_dates) AND stockn IN (SELECT stockn FROM cars)
+        GROUP BY stockn
+        HAVING sum(coalesce(change_amount, 0)) <= :threshold
+    """,
+    'daily_averages': """
+        SELECT
+            profits.date,
+            avg(profits.change_amount) AS avg_change_all,
+            avg(profits.change_amount) FILTER (WHERE cars.make = :make) AS avg_change_make,
+            avg(profits.change_amount) FILTER (WHERE cars.model = :model) AS avg_change_model
+        FROM profits LEFT JOIN cars ON cars.stockn = profits.stockn
+        WHERE profits.date BETWEEN :date_from AND :date_to
+        GROUP BY profits.date
+        ORDER BY profits.date
+    """,
+}
+
+
+def frame_aggregates(cars_df: pd.DataFrame, profits_df: pd.DataFrame, car: dict) -> dict:
+    """Агрегаты функциями services/calculate.py (движок выбирается по analytics.BACKEND, без кеша)."""
+    return {
+        'monthly_income': lambda: calculate.get_monthly_income.__wrapped__(profits_df, MONTHLY_INCOME_START),
+        'monthly_counts': lambda: calculate.get_monthly_car_counts.__wrapped__(cars_df, MONTHLY_COUNTS_START),
+        'low_sales': lambda: calculate.get_cars_without_significant_sales.__wrapped__(
+            profits_df, cars_df, threshold=LOW_SALES_THRESHOLD)[['stockn']],
+        'daily_averages': lambda: calculate.get_daily_average_changes.__wrapped__(
+            cars_df, profits_df, car['make'], car['model'], car['date_from'], car['date_to']),
+    }
+
+
+def postgres_aggregates(car: dict) -> dict:
+    params = {
+        'monthly_income': {'start_date': MONTHLY_INCOME_START},
+        'monthly_counts': {'start_date': MONTHLY_COUNTS_START},
+        'low_sales': {'threshold': LOW_SALES_THRESHOLD},
+        'daily_averages': car,
+    }
+    return {
+        name: (lambda sql=sql, params=params[name]: pd.read_sql(text(sql), reporting_engine, params=params))
+        for name, sql in POSTGRES_QUERIES.items()
+    }
+
+
+def normalize(name: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Результат в общем виде для сравнения: обычные типы, одинаковый порядок строк."""
+    df = df.reset_index(drop=True)
+    if name == 'low_sales':
+        df = df.astype({'stockn': 'int64'}).sort_values('stockn').reset_index(drop=True)
+    if name == 'daily_averages':
+        df = df.assign(date=pd.to_datetime(df['date']).astype('datetime64[ns]'))
+    return df.astype({column: 'float64' for column in df.columns if df[column].dtype.kind in 'iuf'})
+
+
+def same(name: str, result: pd.DataFrame, expected: pd.DataFrame) -> bool:
+    try:
+        pd.testing.assert_frame_equal(normalize(name, result), normalize(name, expected), check_dtype=False)
+    except AssertionError:
+        return False
+    return True
+
+
+def measure(run, repeat: int):
+    """Лучшее время из repeat запусков и результат последнего."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        seconds = time.perf_counter() - started
+        best = seconds if best is None else min(best, seconds)
+    return round(best * 1000, 2), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    if analytics.duckdb is None:
+        parser.error("пакет duckdb не установлен")
+
+    # Снимки и Parquet-копия пишутся во временные каталоги, чтобы не трогать файлы приложения
+    snapshot.SNAPSHOT_DIR = tempfile.mkdtemp(prefix='bench_snapshots_')
+    parquet_mirror.ANALYTICS_DIR = tempfile.mkdtemp(prefix='bench_analytics_')
+
+    cars_df, profits_df = get_frames()
+    # Машина с наибольшим числом записей Profits — для средних по датам
+    stockn = int(profits_df['stockn'].value_counts().idxmax())
+    car_row = cars_df[cars_df['stockn'] == stockn].iloc[0]
+    car_profits = profits_df[profits_df['stockn'] == stockn]['date']
+    car = {'make': str(car_row['make']), 'model': str(car_row['model']),
+           'date_from': car_profits.min().to_pydatetime(), 'date_to': car_profits.max().to_pydatetime()}
+
+    analytics.refresh_mirror()
+    paths = {
+        # Производные кадры не имеют метки хранилища: DuckDB читает сами DataFrame
+        'duckdb/frame': frame_aggregates(cars_df.copy(deep=False), profits_df.copy(deep=False), car),
+        # Кадры хранилища: DuckDB читает Parquet-копию их версии
+        'duckdb/parquet': frame_aggregates(cars_df, profits_df, car),
+    }
+
+    results = []
+    analytics.BACKEND = 'pandas'
+    expected = {}
+    for name, run in frame_aggregates(cars_df, profits_df, car).items():
+        milliseconds, expected[name] = measure(run, args.repeat)
+        results.append({'aggregate': name, 'engine': 'pandas', 'ms': milliseconds, 'rows': len(expected[name]), 'same': True})
+
+    analytics.BACKEND = 'duckdb'
+    for engine_name, runs in paths.items():
+        for name, run in runs.items():
+            milliseconds, result = measure(run, args.repeat)
+            results.append({'aggregate': name, 'engine': engine_name, 'ms': milliseconds, 'rows': len(result),
+                            'same': same(name, result, expected[name])})
+
+    for name, run in postgres_aggregates(car).items():
+        milliseconds, result = measure(run, args.repeat)
+        results.append({'aggregate': name, 'engine': 'postgres', 'ms': milliseconds, 'rows': len(result),
+                        'same': same(name, result, expected[name])})
+
+    print(f"Cars: {len(cars_df):,} строк, Profits: {len(profits_df):,} строк, машина для средних: {stockn}")
+    print(pd.DataFrame(results).sort_values(['aggregate', 'engine']).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Память и скорость группировок DataFrame Cars и Profits до и после приведения к компактным типам
+(database/schema.py). По умолчанию используются синтетические таблицы, с --from-db — текущая база.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_frame_dtypes --cars 50000 --profits-per-car 20 --repeat 5
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from database.schema import apply_schema, CARS_SCHEMA, PROFITS_SCHEMA
+
+
+def make_frames(cars: int, profits_per_car: int, seed: int = 0) -> tuple:
+    """Синтетические Cars и Profits с теми же типами, что возвращает загрузчик (строки — object, даты — date)."""
+    rng = np.random.default_rng(seed)
+    base = date(2022, 5, 1)
+    stockn = np.arange(10300, 10300 + cars)
+    inventoried = [base + timedelta(days=int(d)) for d in rng.integers(0, 900, cars)]
+    cars_df = pd.DataFrame({
+        'id': np.arange(1, cars + 1),
+        'stockn': stockn,
+        'make': rng.choice(['FORD', 'HONDA', 'TOYOTA', 'CHEVROLET', 'NISSAN'], cars).astype(object),
+        'model': rng.choice(['FOCUS', 'CIVIC', 'CAMRY', 'MALIBU', 'ALTIMA'], cars).astype(object),
+        'year': rng.integers(1998, 2020, cars),
+        'color': rng.choice(['RED', 'BLUE', 'WHITE', 'BLACK'], cars).astype(object),
+        'milage': rng.integers(10_000, 300_000, cars).astype(float),
+        'engine': rng.choice(['2.0L', '2.4L', '3.5L'], cars).astype(object),
+        'location': [f"{b}/{x}" for b, x in zip(rng.integers(1, 40, cars), rng.integers(1, 20, cars))],
+        'cost': rng.integers(300, 4000, cars).astype(float),
+        'inventoried': inventoried,
+        'breakevendate': [d if i % 3 == 0 else None for i, d in enumerate(inventoried)],
+        'dismantled': [d if i % 7 == 0 else None for i, d in enumerate(inventoried)],
+        'purchesdate': inventoried,
+        'age': rng.integers(0, 900, cars),
+        'payback': rng.integers(0, 400, cars),
+        'profit': rng.normal(500, 800, cars).round(2),
+        'xs': rng.random(cars).round(2),
+        'status': rng.choice(['Active', 'Crushed'], cars).astype(object),
+        'import_id': rng.choice([f"2024-11-{d:02d} 10:00:00" for d in range(1, 29)], cars).astype(object),
+    })
+
+    rows = cars * profits_per_car
+    change_amount = rng.integers(0, 500, rows).astype(float)
+    profits_df = pd.DataFrame({
+        'id': np.arange(1, rows + 1),
+        'stockn': np.repeat(stockn, profits_per_car),
+        'date': [base + timedelta(days=7 * int(w)) for w in np.tile(np.arange(profits_per_car), cars)],
+        'cumulative_amount': change_amount.reshape(cars, profits_per_car).cumsum(axis=1).ravel(),
+        'change_amount': change_amount,
+        'import_id': rng.choice([f"2024-11-{d:02d} 10:00:00" for d in range(1, 29)], rows).astype(object),
+    })
+    return cars_df, profits_df
+
+
+def load_frames() -> tuple:
+    """Cars и Profits из текущей базы тем же загрузчиком, что и в app.py."""
+    from database.models import Cars, Profits
+    from database.loader import load_table, CARS_COLUMNS, PROFITS_COLUMNS
+    return load_table(Cars, CARS_COLUMNS), load_table(Profits, PROFITS_COLUMNS)
+
+
+def best_time(operation, repeat: int) -> float:
+    """Лучшее время из repeat запусков в миллисекундах."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        operation()
+        seconds = time.perf_counter() - started
+        best = seconds if best is None else min(best, seconds)
+    return round(best * 1000, 1)
+
+
+def operations(cars_df: pd.DataFrame, profits_df: pd.DataFrame) -> dict:
+    """Группировки, которые выполняют страницы приложения."""
+    profits_dates = pd.to_datetime(profits_df['date'])
+    cars_dates = pd.to_datetime(cars_df['purchesdate'])
+    return {
+        'profits по stockn': lambda: profits_df.groupby('stockn')['change_amount'].sum(),
+        'profits по месяцам': lambda: profits_df.groupby(profits_dates.dt.to_period('M'))['change_amount'].sum(),
+        'cars по make/model': lambda: cars_df.groupby(['make', 'model'], observed=True)['profit'].mean(),
+        'cars по месяцам покупки': lambda: cars_df.groupby(cars_dates.dt.to_period('M'))['stockn'].count(),
+        'cars isin stockn': lambda: cars_df[cars_df['stockn'].isin(profits_df['stockn'].iloc[::3])],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cars', type=int, default=50_000)
+    parser.add_argument('--profits-per-car', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--from-db', action='store_true', help='Загрузить таблицы из текущей базы')
+    args = parser.parse_args()
+
+    cars_df, profits_df = load_frames() if args.from_db else make_frames(args.cars, args.profits_per_car)
+    started = time.perf_counter()
+    compact_cars = apply_schema(cars_df, CARS_SCHEMA)
+    compact_profits = apply_schema(profits_df, PROFITS_SCHEMA)
+    print(f"Приведение типов: {time.perf_counter() - started:.3f} с\n")
+
+    memory = []
+    for name, before, after in (('cars', cars_df, compact_cars), ('profits', profits_df, compact_profits)):
+        before_mb = before.memory_usage(deep=True).sum() / 2 ** 20
+        after_mb = after.memory_usage(deep=True).sum() / 2 ** 20
+        memory.append({
+            'table': name, 'rows': len(before), 'before_mb': round(before_mb, 1), 'after_mb': round(after_mb, 1),
+            'ratio': round(before_mb / after_mb, 1) if after_mb else None,
+        })
+    print(pd.DataFrame(memory).to_string(index=False), end='\n\n')
+
+    timings = []
+    compact_operations = operations(compact_cars, compact_profits)
+    for name, operation in operations(cars_df, profits_df).items():
+        before_ms = best_time(operation, args.repeat)
+        after_ms = best_time(compact_operations[name], args.repeat)
+        timings.append({
+            'operation': name, 'before_ms': before_ms, 'after_ms': after_ms,
+            'speedup': round(before_ms / after_ms, 1) if after_ms else None,
+        })
+    print(pd.DataFrame(timings).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Сравнение движков чтения файлов импорта на раскладке столбцов инвентарного файла.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_import_readers --rows 10000 --chunk-rows 5000
+"""
+import argparse
+import io
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from services.import_readers import read_import_chunks, XLSX_ENGINES
+
+
+def make_inventory_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Синтетический инвентарный файл с теми же столбцами, что и еженедельная выгрузка."""
+    rng = np.random.default_rng(seed)
+    base = date(2023, 1, 1)
+    inventoried = [(base + timedelta(days=int(d))).strftime('%d/%m/%Y') for d in rng.integers(0, 700, rows)]
+    return pd.DataFrame({
+        'vStockNo': np.arange(10300, 10300 + rows),
+        'Manufacturer': rng.choice(['FORD', 'HONDA', 'TOYOTA', 'CHEVROLET', 'NISSAN'], rows),
+        'ModelName': rng.choice(['FOCUS', 'CIVIC', 'CAMRY', 'MALIBU', 'ALTIMA'], rows),
+        'ModelYear': rng.integers(1998, 2020, rows),
+        'Cost': rng.integers(300, 4000, rows).astype(float),
+        'Inventoried': inventoried,
+        'BreakevenDate': [None if i % 3 else inventoried[i] for i in range(rows)],
+        'Dismantled': [None if i % 7 else inventoried[i] for i in range(rows)],
+        'PurchaseDate': inventoried,
+        'Color': rng.choice(['RED', 'BLUE', 'WHITE', 'BLACK'], rows),
+        'Odo Reading': [f"{int(v):,} mi" for v in rng.integers(10_000, 300_000, rows)],
+        'Engine': rng.choice(['2.0L', '2.4L', '3.5L'], rows),
+        'Bin': rng.integers(1, 40, rows).astype(float),
+        'XCoord': rng.integers(1, 20, rows).astype(float),
+        'Sales': rng.integers(0, 6000, rows).astype(float),
+    })
+
+
+def encode(df: pd.DataFrame, file_format: str) -> bytes:
+    """Сохраняет DataFrame в байты нужного формата."""
+    buffer = io.BytesIO()
+    if file_format == 'xlsx':
+        df.to_excel(buffer, index=False)
+    elif file_format == 'csv':
+        df.to_csv(buffer, index=False)
+    else:
+        df.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+def measure(content: bytes, file_name: str, chunk_rows: int, engine: str) -> dict:
+    """Время чтения всех блоков и пиковая память Python-аллокаций."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows = 0
+    for chunk in read_import_chunks(content, file_name, chunk_rows, engine=engine):
+        rows += len(chunk)
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'rows': rows, 'seconds': round(seconds, 3), 'peak_mb': round(peak / 2 ** 20, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--chunk-rows', type=int, default=5000)
+    args = parser.parse_args()
+
+    df = make_inventory_frame(args.rows)
+    results = []
+
+    xlsx = encode(df, 'xlsx')
+    for engine in XLSX_ENGINES:
+        try:
+            result = measure(xlsx, 'inventory.xlsx', args.chunk_rows, engine)
+        except ImportError as e:
+            print(f"xlsx/{engine}: пропущен ({e})")
+            continue
+        results.append({'format': 'xlsx', 'engine': engine, 'size_mb': round(len(xlsx) / 2 ** 20, 2), **result})
+
+    for file_format in ('csv', 'parquet'):
+        content = encode(df, file_format)
+        result = measure(content, f'inventory.{file_format}', args.chunk_rows, None)
+        results.append({'format': file_format, 'engine': 'native', 'size_mb': round(len(content) / 2 ** 20, 2), **result})
+
+    print(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
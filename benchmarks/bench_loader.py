@@ -0,0 +1,75 @@
+"""
+Сравнение способов загрузки Cars и Profits в DataFrame на текущей базе (только чтение):
+ORM-объекты со списком словарей (прежний load_data), pd.read_sql, COPY в Arrow
+и чтение снимка Arrow IPC с диска (холодный старт без обращения к таблицам).
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_loader --repeat 3
+"""
+import argparse
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+import database.snapshot as snapshot
+from database.db import SessionLocal
+from database.models import Cars, Profits
+from database.loader import load_table, LOAD_METHODS, CARS_COLUMNS, PROFITS_COLUMNS
+
+
+def load_orm(model, columns: list) -> pd.DataFrame:
+    """Прежний способ: все ORM-объекты таблицы и список словарей."""
+    with SessionLocal() as session:
+        return pd.DataFrame([{column: getattr(row, column) for column in columns} for row in session.query(model).all()])
+
+
+def measure(load, repeat: int) -> dict:
+    """Лучшее время из repeat запусков и пиковая память Python-аллокаций."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        df = load()
+        seconds = time.perf_counter() - started
+        best = seconds if best is None else min(best, seconds)
+
+    tracemalloc.start()
+    load()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'rows': len(df), 'seconds': round(best, 3), 'peak_mb': round(peak / 2 ** 20, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    # Снимки пишутся во временный каталог, чтобы не трогать снимки приложения
+    snapshot.SNAPSHOT_DIR = tempfile.mkdtemp(prefix='bench_snapshots_')
+
+    results = []
+    for model, columns in ((Cars, CARS_COLUMNS), (Profits, PROFITS_COLUMNS)):
+        name = model.__tablename__
+        results.append({'table': name, 'method': 'orm', **measure(lambda: load_orm(model, columns), args.repeat)})
+        for method in LOAD_METHODS:
+            results.append({
+                'table': name, 'method': method,
+                **measure(lambda: load_table(model, columns, order_by=model.id, method=method), args.repeat)
+            })
+
+        # Способы должны давать одинаковый результат
+        copied = load_table(model, columns, order_by=model.id, method='copy')
+        read = load_table(model, columns, order_by=model.id, method='read_sql')
+        pd.testing.assert_frame_equal(copied, read, check_dtype=False)
+
+        snapshot.write_snapshot(name, 'bench', copied)
+        results.append({'table': name, 'method': 'snapshot', **measure(lambda: snapshot.read_snapshot(name, 'bench'), args.repeat)})
+        pd.testing.assert_frame_equal(snapshot.read_snapshot(name, 'bench'), copied)
+
+    print(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
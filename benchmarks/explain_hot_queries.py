@@ -0,0 +1,200 @@
+"""
+Проверка планов частых запросов сервисов: каждый запрос должен читать таблицу через индекс,
+а запросы с условием по date — только нужные месячные секции Profits.
+
+EXPLAIN (без ANALYZE, запросы не выполняются) строится с enable_seqscan = off и enable_hashagg = off, поэтому
+на маленькой базе проверяется, что подходящий индекс есть и планировщик может его использовать.
+Для каждого запроса указаны индексы, которые его обслуживают (индексы секций сводятся
+к индексу Profits); код возврата 1, если план не использует ни один из них или читает лишние секции.
+Секции за MONTHS создаются в транзакции проверки и откатываются вместе с ней.
+
+Запуск из корня проекта (после python create_tables.py):
+    python -m benchmarks.explain_hot_queries
+"""
+import sys
+import json
+from datetime import date
+
+from sqlalchemy import select, delete, func, text
+from sqlalchemy.dialects import postgresql
+
+from database.db import engine
+from database.models import Cars, Profits, Imports, ImportChanges
+from database.partitions import ensure_profits_partitions, partition_name, is_partition_name
+from services.calculate import latest_profits_query
+
+STOCKNUMS = [10300, 10301, 10302]
+SNAPSHOT_DATE = date(2024, 11, 1)
+IMPORT_ID = '2024-11-01 10:00:00'
+MONTHS = [date(2024, 9, 1), date(2024, 10, 1), date(2024, 11, 1), date(2024, 12, 1)]
+
+# (название, запрос, индексы, любой из которых подходит)
+HOT_QUERIES = [
+    (
+        'calculate.latest_profits_query (DISTINCT ON)',
+        latest_profits_query(STOCKNUMS),
+        {'ix_profits_stockn_date_desc', '_stockn_date_uc'},
+    ),
+    (
+        'calculate.latest_profits_query до даты',
+        latest_profits_query(STOCKNUMS, before_date=SNAPSHOT_DATE),
+        {'ix_profits_stockn_date_desc', '_stockn_date_uc'},
+    ),
+    (
+        'calculate.rechain_change_amounts (LAG по stockn)',
+        select(
+            Profits.id,
+            func.lag(Profits.cumulative_amount).over(partition_by=Profits.stockn, order_by=Profits.date),
+        ).where(Profits.stockn.in_(STOCKNUMS)),
+        {'ix_profits_stockn_date_desc', '_stockn_date_uc'},
+    ),
+    (
+        'calculate.get_profit_dynamics_bulk',
+        select(Profits.stockn, Profits.change_amount)
+        .where(Profits.stockn.in_(STOCKNUMS))
+        .order_by(Profits.stockn, Profits.date.desc()),
+        {'ix_profits_stockn_date_desc'},
+    ),
+    (
+        'calculate.calculate_change_amount',
+        select(Profits.cumulative_amount)
+        .where(Profits.stockn == STOCKNUMS[0], Profits.date < SNAPSHOT_DATE, Profits.id != 1)
+        .order_by(Profits.date.desc())
+        .limit(1),
+        {'ix_profits_stockn_date_desc', '_stockn_date_uc'},
+    ),
+    (
+        'import_preview: записи Profits на дату',
+        select(Profits.stockn).where(Profits.date == SNAPSHOT_DATE, Profits.stockn.in_(STOCKNUMS)),
+        {'ix_profits_stockn_date_desc', '_stockn_date_uc', 'ix_profits_date'},
+    ),
+    (
+        'delete_service: удаление Profits импорта',
+        delete(Profits)
+        .where(Profits.import_id == IMPORT_ID, Profits.date == SNAPSHOT_DATE)
+        .returning(Profits.stockn, Profits.date),
+        {'ix_profits_import_id'},
+    ),
+    (
+        'delete_service / import_ledger: Cars импорта',
+        select(Cars.stockn).where(Cars.import_id == IMPORT_ID),
+        {'ix_cars_import_id'},
+    ),
+    (
+        'import_ledger: журнал изменений импорта',
+        select(ImportChanges.id).where(ImportChanges.import_id == IMPORT_ID).order_by(ImportChanges.id.desc()),
+        {'ix_import_changes_import_id'},
+    ),
+    (
+        'import_ledger.find_duplicate_import',
+        select(Imports.id).where(Imports.file_hash == 'hash', Imports.import_type == 'inventory'),
+        {'ix_imports_file_hash'},
+    ),
+    (
+        'calculate.get_min_max_avg_sum (status, make, model)',
+        select(func.avg(Cars.age)).where(Cars.status.in_(['active']), Cars.make == 'FORD', Cars.model == 'FOCUS'),
+        {'ix_cars_make_model', 'ix_cars_status', 'ix_cars_model'},
+    ),
+    (
+        'car_stat: активные машины',
+        select(Cars.id).where(Cars.status == 'active'),
+        {'ix_cars_status'},
+    ),
+    (
+        'car_stat: среднее change_amount по датам',
+        select(Profits.date, func.avg(Profits.change_amount)).group_by(Profits.date),
+        {'ix_profits_date'},
+    ),
+    (
+        'car_stat: среднее по модели',
+        select(Profits.date, func.avg(Profits.change_amount))
+        .join(Cars, Profits.stockn == Cars.stockn)
+        .where(Cars.model == 'FOCUS')
+        .group_by(Profits.date),
+        {'ix_cars_model', 'ix_cars_make_model'},
+    ),
+]
+
+# (название, запрос, секции Profits, которые он должен читать)
+PRUNED_QUERIES = [
+    (
+        'car_stat: средние за даты машины',
+        select(Profits.date, func.avg(Profits.change_amount))
+        .where(Profits.date.between(date(2024, 10, 5), date(2024, 11, 20)))
+        .group_by(Profits.date),
+        {partition_name(date(2024, 10, 1)), partition_name(date(2024, 11, 1))},
+    ),
+    (
+        'delete_service: удаление Profits импорта',
+        delete(Profits).where(Profits.import_id == IMPORT_ID, Profits.date == SNAPSHOT_DATE),
+        {partition_name(SNAPSHOT_DATE)},
+    ),
+    (
+        'calculate.calculate_change_amount',
+        select(Profits.cumulative_amount)
+        .where(Profits.stockn == STOCKNUMS[0], Profits.date < SNAPSHOT_DATE)
+        .order_by(Profits.date.desc())
+        .limit(1),
+        {partition_name(date(2024, 9, 1)), partition_name(date(2024, 10, 1))},
+    ),
+]
+
+
+def plan_nodes(plan: dict, key: str) -> set:
+    """Значения поля key во всех узлах плана."""
+    values = {plan[key]} if key in plan else set()
+    for child in plan.get('Plans', []):
+        values |= plan_nodes(child, key)
+    return values
+
+
+def parent_indexes(connection) -> dict:
+    """Индекс секции -> индекс секционированной таблицы, из которого он создан."""
+    rows = connection.execute(text(
+        "SELECT child.relname, parent.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "WHERE child.relkind = 'i'"
+    )).all()
+    return dict(rows)
+
+
+def explain(connection, statement) -> dict:
+    sql = statement.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True})
+    result = connection.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    return (json.loads(result) if isinstance(result, str) else result)[0]['Plan']
+
+
+def main() -> int:
+    failed = 0
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            connection.execute(text("SET LOCAL enable_seqscan = off"))
+            # На пустых таблицах группировка по дате с хешированием одинаково дешева с любым индексом
+            connection.execute(text("SET LOCAL enable_hashagg = off"))
+            ensure_profits_partitions(connection, MONTHS)
+            parents = parent_indexes(connection)
+
+            for name, statement, expected in HOT_QUERIES:
+                used = {parents.get(index, index) for index in plan_nodes(explain(connection, statement), 'Index Name')}
+                ok = bool(used & expected)
+                failed += not ok
+                print(f"{'OK  ' if ok else 'FAIL'} {name}: {', '.join(sorted(used)) or 'без индекса'}")
+
+            print()
+            for name, statement, expected in PRUNED_QUERIES:
+                # Узел DELETE ссылается на саму Profits, читаемые таблицы — секции
+                scanned = set(filter(is_partition_name, plan_nodes(explain(connection, statement), 'Relation Name')))
+                ok = scanned == expected
+                failed += not ok
+                print(f"{'OK  ' if ok else 'FAIL'} {name}: секции {', '.join(sorted(scanned))}")
+        finally:
+            transaction.rollback()
+
+    print(f"\nПроверено запросов: {len(HOT_QUERIES) + len(PRUNED_QUERIES)}, с ошибками: {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
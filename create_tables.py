@@ -1,18 +1,77 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import os
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect, text
+from database.db import engine, session_scope, disable_statement_timeout
 from database.models import Base  # Импортируем Base из models.py
-import config  # Файл, где указана строка подключения к БД
+from services.calculate import refresh_latest_profits
+from services.import_ledger import backfill_import_registry
+from database.snapshot import clear_snapshots
+from database.parquet_mirror import clear_mirror
 
-# Создаем движок для PostgreSQL
-engine = create_engine(config.DATABASE_URL)
+# Ревизия миграций, соответствующая схеме баз, созданных раньше через create_all
+BASELINE_REVISION = '0001'
 
-# Создаем сессию
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Таблицы исходной ревизии. Для старой базы create_all создает только недостающие из них:
+# таблицы следующих ревизий (например, profits_archive) создают сами миграции
+BASELINE_TABLES = [
+    'car_latest_profit', 'cars', 'dashboard_snapshot', 'data_version', 'import_changes',
+    'import_jobs', 'imports', 'profits', 'profits_staging',
+]
+
+# Столбцы, добавленные в уже существующие таблицы до перехода на миграции (create_all их не создает)
+ADDED_COLUMNS = [
+    ('cars', 'fingerprint', 'VARCHAR'),
+    ('cars', 'cme_fingerprint', 'VARCHAR'),
+    ('import_jobs', 'force', 'BOOLEAN'),
+    ('imports', 'rows_done', 'INTEGER'),
+]
+
+def upgrade_columns():
+    with engine.begin() as connection:
+        for table, column, column_type in ADDED_COLUMNS:
+            connection.execute(text(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {column_type}'))
+
+def alembic_config() -> Config:
+    alembic_cfg = Config(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alembic.ini'))
+    alembic_cfg.attributes['configure_logger'] = False
+    return alembic_cfg
+
+def upgrade_schema():
+    """
+    Приводит схему к последней миграции (alembic upgrade head).
+    База, созданная раньше через create_all (без таблицы alembic_version), сначала дополняется
+    недостающими таблицами и столбцами и помечается исходной ревизией.
+    """
+    alembic_cfg = alembic_config()
+    tables = inspect(engine).get_table_names()
+    if tables and 'alembic_version' not in tables:
+        Base.metadata.create_all(bind=engine, tables=[Base.metadata.tables[name] for name in BASELINE_TABLES])
+        upgrade_columns()
+        command.stamp(alembic_cfg, BASELINE_REVISION)
+        print(f"Существующая база помечена ревизией {BASELINE_REVISION}.")
+    command.upgrade(alembic_cfg, 'head')
 
 # Создание таблиц
 def create_database():
-    Base.metadata.create_all(bind=engine)
+    upgrade_schema()
     print("База данных и таблицы созданы успешно.")
 
+    # Заполняем car_latest_profit по уже существующим данным Profits
+    with session_scope() as session:
+        # Полное заполнение на большой базе идет дольше DB_STATEMENT_TIMEOUT_MS
+        disable_statement_timeout(session)
+        refreshed = refresh_latest_profits(session)
+    print(f"Таблица car_latest_profit заполнена: {refreshed} строк.")
+
+    # Регистрируем импорты, выполненные до появления реестра imports
+    with session_scope() as session:
+        registered = backfill_import_registry(session)
+    print(f"Реестр imports дополнен: {registered} импортов.")
+
+    # Снимки на диске сделаны для прежних версий данных
+    print(f"Удалено снимков таблиц: {clear_snapshots()}.")
+    print(f"Удалено Parquet-копий для аналитики: {clear_mirror()}.")
+
 if __name__ == "__main__":
     create_database()
\ No newline at end of file
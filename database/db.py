@@ -1,6 +1,121 @@
-from sqlalchemy import create_engine
+import time
+import threading
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, exc, text
 from sqlalchemy.orm import sessionmaker
-from config import DATABASE_URL
+from sqlalchemy.pool import QueuePool
+import config
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
\ No newline at end of file
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool, который считает выдачи соединений, время их получения и отказы по таймауту."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self.metrics = {'checkouts': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0, 'timeouts': 0}
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            with self._metrics_lock:
+                self.metrics['timeouts'] += 1
+            raise
+        # Включает ожидание свободного соединения и открытие нового, если пул еще не заполнен
+        waited = time.perf_counter() - started
+        with self._metrics_lock:
+            self.metrics['checkouts'] += 1
+            self.metrics['wait_seconds'] += waited
+            self.metrics['max_wait_seconds'] = max(self.metrics['max_wait_seconds'], waited)
+        return connection
+
+
+def _connect_args(application_name: str, statement_timeout_ms: int, read_only: bool = False) -> dict:
+    options = f"-c statement_timeout={statement_timeout_ms}"
+    if read_only:
+        options += " -c default_transaction_read_only=on"
+    return {'application_name': application_name, 'options': options}
+
+
+# values_plus_batch: пакетные INSERT/UPDATE через executemany (psycopg2.extras.execute_batch)
+engine = create_engine(
+    config.DATABASE_URL,
+    executemany_mode='values_plus_batch',
+    poolclass=MeteredQueuePool,
+    pool_size=config.DB_POOL_SIZE,
+    max_overflow=config.DB_MAX_OVERFLOW,
+    pool_timeout=config.DB_POOL_TIMEOUT,
+    pool_recycle=config.DB_POOL_RECYCLE,
+    pool_pre_ping=config.DB_POOL_PRE_PING,
+    connect_args=_connect_args(config.DB_APPLICATION_NAME, config.DB_STATEMENT_TIMEOUT_MS),
+)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@event.listens_for(SessionLocal, 'after_begin')
+def _apply_statement_timeout(session, transaction, connection):
+    if session.info.get('no_statement_timeout'):
+        connection.execute(text("SET LOCAL statement_timeout = 0"))
+
+
+def disable_statement_timeout(session):
+    """
+    Снимает DB_STATEMENT_TIMEOUT_MS для всех транзакций сессии, включая начатые после
+    промежуточных commit(). Для импорта, удаления импорта и полных пересчетов, которые
+    на большой базе идут дольше ограничения. Соединения в пуле сохраняют свой таймаут (SET LOCAL).
+    """
+    session.info['no_statement_timeout'] = True
+    session.execute(text("SET LOCAL statement_timeout = 0"))
+
+# Только чтение: транзакции read-only, результаты читаются серверным курсором порциями
+# по REPORTING_STREAM_ROWS строк, а не загружаются в память драйвера целиком
+reporting_engine = create_engine(
+    config.REPORTING_DATABASE_URL,
+    poolclass=MeteredQueuePool,
+    pool_size=config.REPORTING_POOL_SIZE,
+    max_overflow=config.REPORTING_MAX_OVERFLOW,
+    pool_timeout=config.DB_POOL_TIMEOUT,
+    pool_recycle=config.DB_POOL_RECYCLE,
+    pool_pre_ping=config.DB_POOL_PRE_PING,
+    connect_args=_connect_args(
+        f"{config.DB_APPLICATION_NAME}-reporting", config.REPORTING_STATEMENT_TIMEOUT_MS, read_only=True
+    ),
+    execution_options={'stream_results': True, 'max_row_buffer': config.REPORTING_STREAM_ROWS},
+)
+
+
+@contextmanager
+def session_scope():
+    """
+    Сессия на блок with: фиксация при успешном выходе, откат при исключении,
+    закрытие в любом случае (соединение всегда возвращается в пул).
+    """
+    session = SessionLocal()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def pool_stats() -> list:
+    """Состояние пулов соединений приложения и отчетов для страницы администрирования."""
+    stats = []
+    for name, pool in (('main', engine.pool), ('reporting', reporting_engine.pool)):
+        metrics = dict(pool.metrics)
+        stats.append({
+            'name': name,
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'idle': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0),
+            **metrics,
+            'avg_wait_ms': round(metrics['wait_seconds'] / metrics['checkouts'] * 1000, 2) if metrics['checkouts'] else 0.0,
+            'max_wait_ms': round(metrics['max_wait_seconds'] * 1000, 2),
+        })
+    return stats
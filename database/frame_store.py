@@ -0,0 +1,221 @@
+import time
+import logging
+import weakref
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from database.models import Cars, Profits
+from database.loader import load_table, CARS_COLUMNS, PROFITS_COLUMNS
+from database.schema import apply_schema, CARS_SCHEMA, PROFITS_SCHEMA
+from database.snapshot import load_snapshot
+from database.versions import get_versions
+
+# Хранилище отдает сессиям поверхностные копии общих DataFrame. Данные общих кадров доступны
+# только для чтения (freeze_frame): новые и замененные столбцы копии не затрагивают хранилище,
+# а изменение на месте (.loc[...] = ..., fillna(inplace=True)) завершается ошибкой
+
+# Как часто фоновый поток проверяет версии данных и заранее загружает новые кадры (секунды)
+REFRESH_SECONDS = 30
+
+# Реентерабельная: слабая ссылка из _frame_tokens может сработать в потоке, уже держащем блокировку
+_lock = threading.RLock()
+_state = {
+    'versions': None,
+    'cars': None,
+    'profits': None,
+    'memory_bytes': 0,
+    'loaded_at': None,
+    'load_seconds': None,
+    'loads': 0,
+    'hits': 0,
+}
+_prewarm_thread = None
+
+# Метки выданных кадров: id(DataFrame) -> (weakref, ('cars' или 'profits', версия данных), столбцы, массивы).
+# По метке кеш вычислений (services/cache.py) узнает кадр хранилища без хеширования содержимого.
+# Доступ под _lock
+_frame_tokens = {}
+
+# Значения для пустых полей при загрузке кадров. Они входят в версию снимков и Parquet-копий
+CARS_FILL_VALUES = {
+    'stockn': 0,
+    'make': '',
+    'model': '',
+    'year': 0,
+    'color': '',
+    'milage': 0.0,
+    'engine': '',
+    'location': '',
+    'cost': 0.0,
+    'age': 0,
+    'payback': 0,
+    'profit': 0.0,
+    'xs': 0.0,
+    'status': '',
+    'import_id': '',
+}
+# Пустой change_amount остается NaN, чтобы средние по датам пропускали его, как avg() в SQL.
+# Суммы и фильтр продаж считают его нулем (fillna(0) в pandas, COALESCE в DuckDB)
+PROFITS_FILL_VALUES = {
+    'stockn': 0,
+    'cumulative_amount': 0.0,
+    'import_id': '',
+}
+
+
+def freeze_frame(data):
+    """
+    Запрещает изменение данных DataFrame или Series на месте: массивы numpy его столбцов
+    (включая коды категорий, значения и маски Int32, даты) помечаются только для чтения.
+    Столбцы string[pyarrow] неизменяемы сами по себе. Запись в такой кадр завершается ValueError
+    (для столбцов дат pandas сообщает о ней AssertionError). Возвращает тот же объект.
+
+    Столбцы object не защищаются: memory_usage(deep=True) и другие функции pandas на Cython
+    не принимают массивы object только для чтения. В кадрах хранилища таких столбцов нет.
+    """
+    for values in data._mgr.arrays:
+        if isinstance(values, pd.arrays.ArrowExtensionArray):
+            continue
+        for array in (values, *(getattr(values, name, None) for name in ('_ndarray', '_codes', '_data', '_mask'))):
+            if isinstance(array, np.ndarray) and array.dtype != object:
+                array.flags.writeable = False
+    return data
+
+
+def build_cars_frame() -> pd.DataFrame:
+    # Загружаем только нужные столбцы Cars сразу в DataFrame (без ORM-объектов)
+    cars_df = load_table(Cars, CARS_COLUMNS)
+
+    # Обработка NaN значений в cars_df
+    cars_df.fillna(CARS_FILL_VALUES, inplace=True)
+
+    # Компактные типы столбцов (категории, Int32, float32) и даты приводятся один раз при загрузке
+    return apply_schema(cars_df, CARS_SCHEMA)
+
+
+def build_profits_frame() -> pd.DataFrame:
+    profits_df = load_table(Profits, PROFITS_COLUMNS)
+
+    # Обработка NaN значений в profits_df
+    profits_df.fillna(PROFITS_FILL_VALUES, inplace=True)
+
+    return apply_schema(profits_df, PROFITS_SCHEMA)
+
+
+def _load(versions: tuple):
+    """Загружает кадры для версий данных (из снимков на диске или из базы) и заменяет ими текущие."""
+    started = time.perf_counter()
+    cars_version, profits_version = versions
+    cars_df = load_snapshot('cars', (cars_version, CARS_COLUMNS, CARS_SCHEMA, CARS_FILL_VALUES), build_cars_frame)
+    profits_df = load_snapshot(
+        'profits', (profits_version, PROFITS_COLUMNS, PROFITS_SCHEMA, PROFITS_FILL_VALUES), build_profits_frame
+    )
+
+    freeze_frame(cars_df)
+    freeze_frame(profits_df)
+    memory_bytes = int(cars_df.memory_usage(deep=True).sum() + profits_df.memory_usage(deep=True).sum())
+    _state.update(
+        versions=versions,
+        cars=cars_df,
+        profits=profits_df,
+        memory_bytes=memory_bytes,
+        loaded_at=datetime.now(),
+        load_seconds=round(time.perf_counter() - started, 3),
+        loads=_state['loads'] + 1,
+    )
+    logging.info(f"Хранилище данных загружено: версии {versions}, {memory_bytes / 2 ** 20:.1f} МБ "
+                 f"за {_state['load_seconds']} с")
+
+
+def get_frames(versions: tuple = None) -> tuple:
+    """
+    DataFrame Cars и Profits текущей версии данных, общие для всех сессий процесса.
+    Кадры загружаются один раз на версию; пока идет загрузка, остальные сессии ждут ее, а не читают базу сами.
+
+    Возвращаются поверхностные копии: они не занимают память под данные. В копию можно
+    добавлять и заменять столбцы, а изменение данных на месте запрещено (freeze_frame).
+    """
+    versions = versions or get_versions('cars', 'profits')
+    with _lock:
+        if _state['versions'] != versions:
+            _load(versions)
+        else:
+            _state['hits'] += 1
+        cars_df, profits_df = _state['cars'].copy(deep=False), _state['profits'].copy(deep=False)
+        _register_token(cars_df, ('cars', versions[0]))
+        _register_token(profits_df, ('profits', versions[1]))
+    return cars_df, profits_df
+
+
+def _register_token(df: pd.DataFrame, token: tuple):
+    """Запоминает метку кадра вместе с его столбцами и массивами данных (вызывается под _lock)."""
+    key = id(df)
+
+    def forget(ref):
+        with _lock:
+            # id освободившегося кадра мог уже достаться новому кадру с другой меткой
+            if _frame_tokens.get(key, (None,))[0] is ref:
+                _frame_tokens.pop(key, None)
+
+    _frame_tokens[key] = (weakref.ref(df, forget), token, df.columns, tuple(df._mgr.arrays))
+
+
+def frame_token(df: pd.DataFrame):
+    """
+    Метка ('cars' или 'profits', версия данных) для кадра, выданного get_frames, иначе None.
+    Метка действует, пока у кадра те же столбцы и массивы, что при выдаче: после присваивания
+    или добавления столбца (df[...] = ...), переименования или сортировки на месте кадр считается
+    другим. Производные кадры (фильтры, assign, copy) метки не получают.
+    """
+    with _lock:
+        entry = _frame_tokens.get(id(df))
+    if entry is None or entry[0]() is not df:
+        return None
+    _, token, columns, arrays = entry
+    current = df._mgr.arrays
+    if df.columns is not columns or len(current) != len(arrays) or any(a is not b for a, b in zip(current, arrays)):
+        return None
+    return token
+
+
+def store_stats() -> dict:
+    """Состояние хранилища: версии, объем в памяти, время последней загрузки, число загрузок и обращений."""
+    with _lock:
+        stats = {key: value for key, value in _state.items() if key not in ('cars', 'profits')}
+        stats['rows'] = {
+            'cars': 0 if _state['cars'] is None else len(_state['cars']),
+            'profits': 0 if _state['profits'] is None else len(_state['profits']),
+        }
+    stats['memory_mb'] = round(stats['memory_bytes'] / 2 ** 20, 1)
+    stats['prewarm_running'] = _prewarm_thread is not None and _prewarm_thread.is_alive()
+    return stats
+
+
+def _prewarm_loop(refresh_seconds: int):
+    while True:
+        try:
+            get_frames()
+        except Exception as e:
+            logging.error(f"Ошибка при фоновой загрузке хранилища данных: {e}")
+        if not refresh_seconds:
+            return
+        time.sleep(refresh_seconds)
+
+
+def start_prewarm(refresh_seconds: int = REFRESH_SECONDS):
+    """
+    Запускает фоновый поток, который загружает кадры при старте сервера и затем
+    раз в refresh_seconds подгружает новую версию, чтобы сессии не ждали загрузки.
+    Повторные вызовы ничего не делают, пока поток работает.
+    """
+    global _prewarm_thread
+    with _lock:
+        if _prewarm_thread is not None and _prewarm_thread.is_alive():
+            return
+        _prewarm_thread = threading.Thread(
+            target=_prewarm_loop, args=(refresh_seconds,), name='frame-store-prewarm', daemon=True
+        )
+        _prewarm_thread.start()
@@ -0,0 +1,104 @@
+import io
+
+import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pa_csv
+from sqlalchemy import select, types
+from sqlalchemy.dialects import postgresql
+
+from database.db import reporting_engine
+
+# Столбцы, которые нужны страницам приложения (служебные столбцы импорта не загружаются)
+CARS_COLUMNS = [
+    'id', 'stockn', 'make', 'model', 'year', 'color', 'milage', 'engine', 'location', 'cost',
+    'inventoried', 'breakevendate', 'dismantled', 'purchesdate', 'age', 'payback', 'profit', 'xs',
+    'status', 'import_id', 'age_last_updated',
+]
+PROFITS_COLUMNS = ['id', 'stockn', 'date', 'cumulative_amount', 'change_amount', 'import_id']
+
+# Способы загрузки: 'copy' — COPY ... TO STDOUT (CSV) с разбором в Arrow, 'read_sql' — pd.read_sql
+LOAD_METHODS = ('copy', 'read_sql')
+DEFAULT_LOAD_METHOD = 'copy'
+
+
+def _arrow_type(column_type):
+    """Тип Arrow для типа столбца SQLAlchemy (None — определить по данным)."""
+    if isinstance(column_type, types.Boolean):
+        return pa.bool_()
+    if isinstance(column_type, types.Integer):
+        return pa.int64()
+    if isinstance(column_type, types.Float):
+        return pa.float64()
+    if isinstance(column_type, types.DateTime):
+        return pa.timestamp('us')
+    if isinstance(column_type, types.Date):
+        return pa.date32()
+    if isinstance(column_type, (types.String, types.JSON)):
+        return pa.string()
+    return None
+
+
+def _copy_frame(query, connection) -> pd.DataFrame:
+    """Выгружает результат запроса через COPY в CSV и разбирает его в Arrow с типами из запроса."""
+    sql = query.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True})
+    buffer = io.BytesIO()
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER)", buffer)
+    finally:
+        cursor.close()
+
+    column_types = {
+        column.name: arrow_type
+        for column in query.selected_columns
+        if (arrow_type := _arrow_type(column.type)) is not None
+    }
+    buffer.seek(0)
+    table = pa_csv.read_csv(
+        buffer,
+        convert_options=pa_csv.ConvertOptions(
+            column_types=column_types,
+            # В CSV от COPY NULL — пустое значение без кавычек, пустая строка — ""
+            null_values=[''],
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False,
+            true_values=['t'],
+            false_values=['f'],
+        ),
+    )
+    return table.to_pandas()
+
+
+def load_frame(query, connection=None, method: str = DEFAULT_LOAD_METHOD) -> pd.DataFrame:
+    """
+    Загружает результат Core select в DataFrame без создания ORM-объектов.
+
+    :param query: Запрос sqlalchemy.select
+    :param connection: Соединение SQLAlchemy (по умолчанию берется из пула отчетов reporting_engine)
+    :param method: 'copy' или 'read_sql'
+    """
+    if method not in LOAD_METHODS:
+        raise ValueError(f"Неизвестный способ загрузки: {method}")
+    if connection is None:
+        with reporting_engine.connect() as connection:
+            return load_frame(query, connection, method)
+
+    if method == 'copy':
+        return _copy_frame(query, connection)
+    return pd.read_sql(query, connection)
+
+
+def table_query(model, columns: list = None, order_by=None):
+    """Запрос выбранных столбцов таблицы модели (по умолчанию всех)."""
+    table = model.__table__
+    selected = [table.c[name] for name in columns] if columns else list(table.c)
+    query = select(*selected)
+    if order_by is not None:
+        query = query.order_by(order_by)
+    return query
+
+
+def load_table(model, columns: list = None, order_by=None, connection=None,
+               method: str = DEFAULT_LOAD_METHOD) -> pd.DataFrame:
+    """Загружает выбранные столбцы таблицы модели в DataFrame."""
+    return load_frame(table_query(model, columns, order_by), connection, method)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, Float, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Date, DateTime, Float, Boolean, JSON, LargeBinary, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -28,17 +28,139 @@ class Cars(Base):
     status = Column(String)
     import_id = Column(String)
     age_last_updated = Column(Date)
+    fingerprint = Column(String)  # Хеш полей из инвентарного файла при последнем импорте
+    cme_fingerprint = Column(String)  # Хеш color, milage, engine при последнем импорте
 
-# Модель для таблицы Profits
+# Индексы Cars для фильтров страниц и удаления импорта
+Index('ix_cars_status', Cars.status)
+Index('ix_cars_make_model', Cars.make, Cars.model)
+Index('ix_cars_model', Cars.model)
+Index('ix_cars_import_id', Cars.import_id)
+
+# Модель для таблицы Profits: секционирована по месяцам date (секции создаются при импорте,
+# см. database/partitions.py), поэтому date входит в первичный ключ и уникальные ограничения
 class Profits(Base):
     __tablename__ = 'profits'
     __table_args__ = (
         UniqueConstraint('stockn', 'date', name='_stockn_date_uc'),
+        {'postgresql_partition_by': 'RANGE (date)'},
     )
 
-    id = Column(Integer, primary_key=True, index=True)
-    stockn = Column(Integer, index=True)  # stockn теперь Integer
-    date = Column(Date)  # Изменен на Date
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    stockn = Column(Integer)  # stockn теперь Integer (поиск по stockn — индексы ниже)
+    date = Column(Date, primary_key=True)  # Изменен на Date; ключ секционирования
     cumulative_amount = Column(Float)
     change_amount = Column(Float)  # Новый столбец для хранения разницы
     import_id = Column(String)
+
+# Индексы Profits: последние записи машины без чтения таблицы (DISTINCT ON, LAG, динамика),
+# удаление по import_id и средние значения по датам
+Index(
+    'ix_profits_stockn_date_desc', Profits.stockn, Profits.date.desc(),
+    postgresql_include=['cumulative_amount', 'change_amount'],
+)
+Index('ix_profits_import_id', Profits.import_id)
+Index('ix_profits_date', Profits.date, postgresql_include=['change_amount'])
+
+# Исходные записи Profits, замененные при сжатии старых месяцев одной записью на машину в месяц
+class ProfitsArchive(Base):
+    __tablename__ = 'profits_archive'
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # id записи в Profits
+    stockn = Column(Integer)
+    date = Column(Date)
+    cumulative_amount = Column(Float)
+    change_amount = Column(Float)  # Значение до сжатия
+    import_id = Column(String, index=True)
+    archived_at = Column(DateTime)
+
+Index('ix_profits_archive_stockn_date', ProfitsArchive.stockn, ProfitsArchive.date)
+
+# Последняя запись Profits для каждого stockn (поддерживается при импорте, удалении и редактировании)
+class CarLatestProfit(Base):
+    __tablename__ = 'car_latest_profit'
+
+    stockn = Column(Integer, primary_key=True)
+    date = Column(Date)
+    cumulative_amount = Column(Float)
+    change_amount = Column(Float)
+
+# Реестр импортов
+class Imports(Base):
+    __tablename__ = 'imports'
+
+    id = Column(String, primary_key=True)  # import_id
+    file_name = Column(String)
+    file_hash = Column(String, index=True)  # sha256 содержимого файла
+    import_type = Column(String)  # 'inventory' или 'color_mileage_engine'
+    snapshot_date = Column(Date)  # Дата записей Profits
+    imported_at = Column(DateTime)
+    cars_added = Column(Integer)
+    cars_updated = Column(Integer)
+    profits_added = Column(Integer)
+    parse_seconds = Column(Float)
+    write_seconds = Column(Float)
+    status = Column(String)  # 'done', 'running' (импорт с промежуточными коммитами) или 'legacy'
+    rows_done = Column(Integer)  # Контрольная точка: сколько строк файла уже применено
+
+# Записи Profits импорта с промежуточными коммитами до их переноса в Profits одной транзакцией
+class ProfitsStaging(Base):
+    __tablename__ = 'profits_staging'
+
+    id = Column(Integer, primary_key=True)
+    import_id = Column(String, index=True)
+    stockn = Column(Integer)
+    date = Column(Date)
+    cumulative_amount = Column(Float)
+    change_amount = Column(Float)
+
+# Журнал изменений Cars: значения полей до их обновления импортом
+class ImportChanges(Base):
+    __tablename__ = 'import_changes'
+
+    id = Column(Integer, primary_key=True)
+    import_id = Column(String, index=True)
+    car_id = Column(Integer)
+    stockn = Column(Integer)
+    before = Column(JSON)  # {поле: значение до импорта}
+    after = Column(JSON)  # {поле: значение, записанное импортом}
+
+# Фоновые задачи импорта
+class ImportJobs(Base):
+    __tablename__ = 'import_jobs'
+
+    id = Column(Integer, primary_key=True)
+    status = Column(String, index=True)  # 'queued', 'running', 'done', 'failed'
+    phase = Column(String)  # 'parse', 'cars', 'profits', 'recompute'
+    progress = Column(Float)  # 0..1
+    message = Column(String)
+    file_name = Column(String)
+    content = Column(LargeBinary)  # Загруженный файл (очищается после завершения)
+    snapshot_date = Column(Date)
+    color_mileage_engine = Column(Boolean)
+    force = Column(Boolean)  # Импортировать, даже если такой файл уже загружался
+    import_id = Column(String)
+    result = Column(JSON)
+    created_at = Column(DateTime)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+
+# Версии данных таблиц: увеличиваются в той же транзакции, что и изменения (ключ кешей страниц)
+class DataVersion(Base):
+    __tablename__ = 'data_version'
+
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime)
+
+
+# Готовые результаты главной страницы: таблицы вкладок, сводные показатели и ряды графиков
+class DashboardSnapshot(Base):
+    __tablename__ = 'dashboard_snapshot'
+
+    section = Column(String, primary_key=True)  # 'no_sales', 'unprofitable', 'best', 'monthly_income', 'monthly_counts'
+    data_key = Column(String, nullable=False)  # Версии cars и profits и дата расчета, для которых построен снимок
+    frame = Column(LargeBinary)  # DataFrame раздела в Arrow IPC
+    metrics = Column(JSON)  # Сводные показатели раздела
+    built_at = Column(DateTime)
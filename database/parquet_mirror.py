@@ -0,0 +1,70 @@
+import os
+import hashlib
+import logging
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config import ANALYTICS_DIR, DATABASE_URL
+
+# Parquet-копия таблиц для аналитических запросов DuckDB: один файл на таблицу и версию данных,
+# например profits-3f2a….parquet. Файл неизменяем, новая версия пишется рядом, старые удаляются
+
+
+def _version_tag(version) -> str:
+    """Метка версии в имени файла (адрес базы входит в метку, как у снимков Arrow)."""
+    return hashlib.sha256(repr((DATABASE_URL, version)).encode('utf-8')).hexdigest()[:16]
+
+
+def mirror_path(name: str, version) -> str:
+    return os.path.join(ANALYTICS_DIR, f"{name}-{_version_tag(version)}.parquet")
+
+
+def find_mirror(name: str, version):
+    """Путь к копии таблицы для этой версии или None, если копия еще не записана."""
+    path = mirror_path(name, version)
+    return path if os.path.exists(path) else None
+
+
+def write_mirror(name: str, version, df: pd.DataFrame) -> str:
+    """
+    Записывает DataFrame в Parquet для версии version (атомарно, через временный файл)
+    и удаляет копии этой таблицы для других версий.
+    """
+    path = mirror_path(name, version)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(ANALYTICS_DIR, exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    fd, temp_path = tempfile.mkstemp(dir=ANALYTICS_DIR, prefix=f".{name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as sink:
+            pq.write_table(table, sink, compression='zstd')
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    for file_name in os.listdir(ANALYTICS_DIR):
+        if file_name.startswith(f"{name}-") and file_name.endswith('.parquet') and file_name != os.path.basename(path):
+            try:
+                os.remove(os.path.join(ANALYTICS_DIR, file_name))
+            except OSError as e:
+                logging.warning(f"Устаревшая копия {file_name} не удалена: {e}")
+    return path
+
+
+def clear_mirror():
+    """Удаляет все Parquet-копии (после пересоздания таблиц версии данных начинаются заново)."""
+    if not os.path.isdir(ANALYTICS_DIR):
+        return 0
+    removed = 0
+    for file_name in os.listdir(ANALYTICS_DIR):
+        if file_name.endswith('.parquet'):
+            os.remove(os.path.join(ANALYTICS_DIR, file_name))
+            removed += 1
+    return removed
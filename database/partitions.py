@@ -0,0 +1,87 @@
+import re
+import logging
+from datetime import date, datetime
+from sqlalchemy import text
+
+# Таблица Profits разбита на секции по месяцам date: profits_y2024m11 хранит даты с 2024-11-01 по 2024-11-30
+PARENT_TABLE = 'profits'
+PARTITION_NAME_RE = re.compile(r'^profits_y(\d{4})m(\d{2})$')
+
+
+def month_start(day) -> date:
+    """Первый день месяца даты (date, datetime или pandas.Timestamp)."""
+    if isinstance(day, datetime):
+        day = day.date()
+    return day.replace(day=1)
+
+
+def next_month(day) -> date:
+    start = month_start(day)
+    return start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+
+
+def partition_name(day) -> str:
+    start = month_start(day)
+    return f"{PARENT_TABLE}_y{start.year:04d}m{start.month:02d}"
+
+
+def is_partition_name(name: str) -> bool:
+    """Имя месячной секции Profits (такие таблицы не описаны в моделях и не сравниваются миграциями)."""
+    return bool(PARTITION_NAME_RE.match(name))
+
+
+def partition_month(name: str) -> date:
+    """Первый день месяца секции по ее имени."""
+    year, month = PARTITION_NAME_RE.match(name).groups()
+    return date(int(year), int(month), 1)
+
+
+def list_partitions(connection) -> list:
+    """Имена существующих секций Profits по возрастанию месяца."""
+    return list(connection.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        f"WHERE pg_inherits.inhparent = '{PARENT_TABLE}'::regclass "
+        "ORDER BY child.relname"
+    )).scalars())
+
+
+def ensure_profits_partitions(connection, dates) -> list:
+    """
+    Создает недостающие месячные секции Profits для дат dates в транзакции connection
+    (Connection или Session). Существующие секции не блокируются: CREATE TABLE выполняется
+    только для новых месяцев, но берет ACCESS EXCLUSIVE на profits до конца транзакции,
+    поэтому перед импортом секции создаются prepare_profits_partitions.
+
+    :return: Имена созданных секций
+    """
+    months = sorted({month_start(day) for day in dates if day is not None})
+    if not months:
+        return []
+
+    existing = set(list_partitions(connection))
+    created = []
+    for month in months:
+        name = partition_name(month)
+        if name in existing:
+            continue
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+        ))
+        created.append(name)
+    if created:
+        logging.info(f"Созданы секции Profits: {', '.join(created)}")
+    return created
+
+
+def prepare_profits_partitions(engine, dates) -> list:
+    """
+    Создает недостающие секции для дат dates в отдельной короткой транзакции до начала импорта.
+    Блокировка profits снимается сразу после CREATE TABLE, а не держится всю транзакцию импорта;
+    ensure_profits_partitions внутри импорта тогда только проверяет, что секции есть.
+
+    :return: Имена созданных секций
+    """
+    with engine.begin() as connection:
+        return ensure_profits_partitions(connection, dates)
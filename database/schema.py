@@ -0,0 +1,67 @@
+import pandas as pd
+
+# Типы столбцов DataFrame Cars и Profits в памяти приложения:
+# category для строк с небольшим числом значений, string[pyarrow] для почти уникальных (location),
+# nullable Int32 для целых,
+# float32 там, где хватает точности (денежные суммы остаются float64, т.к. по ним считаются итоги)
+CARS_SCHEMA = {
+    'id': 'Int32',
+    'stockn': 'Int32',
+    'make': 'category',
+    'model': 'category',
+    'year': 'Int32',
+    'color': 'category',
+    'milage': 'float32',
+    'engine': 'category',
+    'location': 'string[pyarrow]',
+    'cost': 'float64',
+    'inventoried': 'datetime64[ns]',
+    'breakevendate': 'datetime64[ns]',
+    'dismantled': 'datetime64[ns]',
+    'purchesdate': 'datetime64[ns]',
+    'age': 'Int32',
+    'payback': 'Int32',
+    'profit': 'float64',
+    'xs': 'float32',
+    'status': 'category',
+    'import_id': 'category',
+    'age_last_updated': 'datetime64[ns]',
+}
+
+PROFITS_SCHEMA = {
+    'id': 'Int32',
+    'stockn': 'Int32',
+    'date': 'datetime64[ns]',
+    'cumulative_amount': 'float64',
+    'change_amount': 'float64',
+    'import_id': 'category',
+}
+
+
+def apply_schema(df: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    """Приводит столбцы DataFrame к типам схемы. Столбцы, которых нет в схеме, не меняются."""
+    converted = {}
+    for column, dtype in schema.items():
+        if column not in df.columns:
+            continue
+        if dtype.startswith('datetime64'):
+            converted[column] = pd.to_datetime(df[column], errors='coerce').astype(dtype)
+        elif dtype.startswith('Int'):
+            converted[column] = pd.to_numeric(df[column], errors='coerce').astype(dtype)
+        else:
+            converted[column] = df[column].astype(dtype)
+    return df.assign(**converted)
+
+
+def to_display_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Возвращает DataFrame с обычными типами numpy вместо category и nullable-целых,
+    чтобы к нему можно было применить fillna('') перед выводом в AgGrid.
+    """
+    converted = {}
+    for column, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            converted[column] = df[column].astype(object)
+        elif isinstance(dtype, pd.api.extensions.ExtensionDtype) and dtype.kind in 'iu':
+            converted[column] = df[column].astype('float64' if df[column].hasnans else 'int64')
+    return df.assign(**converted) if converted else df
@@ -0,0 +1,99 @@
+import os
+import hashlib
+import logging
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+
+from config import SNAPSHOT_DIR, DATABASE_URL
+
+# Ключ метаданных Arrow, в котором хранится версия данных снимка
+VERSION_METADATA_KEY = b'data_version'
+
+
+def _snapshot_path(name: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"{name}.arrow")
+
+
+def _version_tag(version) -> bytes:
+    """
+    Метка версии снимка. В version передается все, от чего зависит содержимое:
+    версии данных таблиц (get_versions) и, например, список столбцов и схема типов.
+    Адрес базы тоже входит в метку, чтобы снимок одной базы не подошел другой.
+    """
+    return hashlib.sha256(repr((DATABASE_URL, version)).encode('utf-8')).hexdigest().encode('ascii')
+
+
+def read_snapshot(name: str, version):
+    """
+    Читает снимок с диска, если он есть и сделан для той же версии.
+    Файл открывается через memory map, поэтому данные не копируются при чтении.
+    Возвращает DataFrame или None.
+    """
+    path = _snapshot_path(name)
+    if not os.path.exists(path):
+        return None
+    try:
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            metadata = reader.schema.metadata or {}
+            if metadata.get(VERSION_METADATA_KEY) != _version_tag(version):
+                return None
+            return reader.read_all().to_pandas()
+    except (OSError, pa.ArrowException) as e:
+        logging.warning(f"Снимок {path} не прочитан: {e}")
+        return None
+
+
+def write_snapshot(name: str, version, df: pd.DataFrame):
+    """
+    Сохраняет DataFrame в Arrow IPC с меткой версии. Файл пишется во временный
+    и заменяется атомарно, поэтому другие процессы не увидят недописанный снимок.
+    """
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), VERSION_METADATA_KEY: _version_tag(version)})
+
+    fd, temp_path = tempfile.mkstemp(dir=SNAPSHOT_DIR, prefix=f".{name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(temp_path, _snapshot_path(name))
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def load_snapshot(name: str, version, build) -> pd.DataFrame:
+    """
+    DataFrame из снимка на диске для этой версии; если снимка нет или версия изменилась,
+    вызывает build(), сохраняет результат и возвращает его.
+
+    Версию нужно получить до build(): если данные изменятся во время загрузки,
+    снимок получит старую метку и будет перечитан при следующем обращении.
+    """
+    df = read_snapshot(name, version)
+    if df is not None:
+        return df
+
+    df = build()
+    try:
+        write_snapshot(name, version, df)
+    except OSError as e:
+        # Без снимка приложение работает как раньше, только медленнее стартует
+        logging.warning(f"Снимок {name} не сохранен: {e}")
+    return df
+
+
+def clear_snapshots():
+    """Удаляет все снимки (например, после пересоздания таблиц, когда версии данных начинаются заново)."""
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return 0
+    removed = 0
+    for file_name in os.listdir(SNAPSHOT_DIR):
+        if file_name.endswith('.arrow'):
+            os.remove(os.path.join(SNAPSHOT_DIR, file_name))
+            removed += 1
+    return removed
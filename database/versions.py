@@ -0,0 +1,63 @@
+import logging
+from datetime import datetime
+from sqlalchemy import select, event
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from database.db import engine
+from database.models import DataVersion
+
+# Обработчики, которые вызываются после фиксации транзакции с новыми версиями данных
+_commit_listeners = []
+
+
+def bump_version(session, *tables):
+    """
+    Увеличивает версию данных таблиц в текущей транзакции сессии,
+    поэтому новая версия становится видна одновременно с изменениями.
+    """
+    table = DataVersion.__table__
+    now = datetime.now()
+    statement = pg_insert(table).values([
+        {'table_name': name, 'version': 1, 'updated_at': now} for name in sorted(set(tables))
+    ])
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.table_name],
+        set_={'version': table.c.version + 1, 'updated_at': statement.excluded.updated_at},
+    )
+    session.execute(statement)
+    session.info.setdefault('bumped_tables', set()).update(tables)
+
+
+def on_version_commit(listener):
+    """
+    Регистрирует listener(tables): он вызывается после фиксации транзакции, в которой
+    bump_version увеличил версии таблиц tables. Запросы к базе в listener выполнять нельзя
+    (сессия еще завершает commit), поэтому тяжелая работа передается в фоновый поток.
+    """
+    _commit_listeners.append(listener)
+
+
+@event.listens_for(Session, 'after_commit')
+def _notify_version_commit(session):
+    tables = session.info.pop('bumped_tables', None)
+    if not tables:
+        return
+    for listener in list(_commit_listeners):
+        try:
+            listener(frozenset(tables))
+        except Exception as e:
+            logging.error(f"Ошибка обработчика изменения версий данных: {e}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_bumped_tables(session):
+    session.info.pop('bumped_tables', None)
+
+
+def get_versions(*tables) -> tuple:
+    """Текущие версии данных таблиц (0 для таблиц, которые еще не изменялись). Используется как ключ кеша."""
+    with engine.connect() as connection:
+        versions = dict(connection.execute(
+            select(DataVersion.table_name, DataVersion.version).where(DataVersion.table_name.in_(tables))
+        ).all())
+    return tuple(versions.get(name, 0) for name in tables)
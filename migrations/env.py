@@ -0,0 +1,48 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, pool
+
+import config
+from database.models import Base
+from database.partitions import is_partition_name
+
+alembic_config = context.config
+
+# Логирование из alembic.ini (create_tables.py отключает его, чтобы не менять настройки приложения)
+if alembic_config.config_file_name is not None and alembic_config.attributes.get('configure_logger', True):
+    fileConfig(alembic_config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+
+def include_name(name, type_, parent_names):
+    """Месячные секции Profits создаются при импорте и не описаны в моделях."""
+    return not (type_ == 'table' and is_partition_name(name))
+
+
+def run_migrations_offline():
+    """Генерация SQL без подключения к базе: alembic upgrade head --sql."""
+    context.configure(
+        url=config.DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={'paramstyle': 'named'},
+        include_name=include_name,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    engine = create_engine(config.DATABASE_URL, poolclass=pool.NullPool)
+    with engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata, include_name=include_name)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,157 @@
+"""Исходная схема: таблицы моделей, включая столбцы из create_tables.ADDED_COLUMNS
+
+Базы, созданные раньше через create_all, помечаются этой ревизией без выполнения (см. create_tables.py).
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 05:12:07.700504
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('car_latest_profit',
+    sa.Column('stockn', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=True),
+    sa.Column('cumulative_amount', sa.Float(), nullable=True),
+    sa.Column('change_amount', sa.Float(), nullable=True),
+    sa.PrimaryKeyConstraint('stockn')
+    )
+    op.create_table('cars',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('stockn', sa.Integer(), nullable=True),
+    sa.Column('make', sa.String(), nullable=True),
+    sa.Column('model', sa.String(), nullable=True),
+    sa.Column('year', sa.Integer(), nullable=True),
+    sa.Column('color', sa.String(), nullable=True),
+    sa.Column('milage', sa.Float(), nullable=True),
+    sa.Column('engine', sa.String(), nullable=True),
+    sa.Column('location', sa.String(), nullable=True),
+    sa.Column('cost', sa.Float(), nullable=True),
+    sa.Column('inventoried', sa.Date(), nullable=True),
+    sa.Column('breakevendate', sa.Date(), nullable=True),
+    sa.Column('dismantled', sa.Date(), nullable=True),
+    sa.Column('purchesdate', sa.Date(), nullable=True),
+    sa.Column('age', sa.Integer(), nullable=True),
+    sa.Column('payback', sa.Integer(), nullable=True),
+    sa.Column('profit', sa.Float(), nullable=True),
+    sa.Column('xs', sa.Float(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('import_id', sa.String(), nullable=True),
+    sa.Column('age_last_updated', sa.Date(), nullable=True),
+    sa.Column('fingerprint', sa.String(), nullable=True),
+    sa.Column('cme_fingerprint', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_cars_id'), 'cars', ['id'], unique=False)
+    op.create_index(op.f('ix_cars_stockn'), 'cars', ['stockn'], unique=False)
+    op.create_table('dashboard_snapshot',
+    sa.Column('section', sa.String(), nullable=False),
+    sa.Column('data_key', sa.String(), nullable=False),
+    sa.Column('frame', sa.LargeBinary(), nullable=True),
+    sa.Column('metrics', sa.JSON(), nullable=True),
+    sa.Column('built_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('section')
+    )
+    op.create_table('data_version',
+    sa.Column('table_name', sa.String(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+    op.create_table('import_changes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('import_id', sa.String(), nullable=True),
+    sa.Column('car_id', sa.Integer(), nullable=True),
+    sa.Column('stockn', sa.Integer(), nullable=True),
+    sa.Column('before', sa.JSON(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_import_changes_import_id'), 'import_changes', ['import_id'], unique=False)
+    op.create_table('import_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('phase', sa.String(), nullable=True),
+    sa.Column('progress', sa.Float(), nullable=True),
+    sa.Column('message', sa.String(), nullable=True),
+    sa.Column('file_name', sa.String(), nullable=True),
+    sa.Column('content', sa.LargeBinary(), nullable=True),
+    sa.Column('snapshot_date', sa.Date(), nullable=True),
+    sa.Column('color_mileage_engine', sa.Boolean(), nullable=True),
+    sa.Column('force', sa.Boolean(), nullable=True),
+    sa.Column('import_id', sa.String(), nullable=True),
+    sa.Column('result', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_import_jobs_status'), 'import_jobs', ['status'], unique=False)
+    op.create_table('imports',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('file_name', sa.String(), nullable=True),
+    sa.Column('file_hash', sa.String(), nullable=True),
+    sa.Column('import_type', sa.String(), nullable=True),
+    sa.Column('snapshot_date', sa.Date(), nullable=True),
+    sa.Column('imported_at', sa.DateTime(), nullable=True),
+    sa.Column('cars_added', sa.Integer(), nullable=True),
+    sa.Column('cars_updated', sa.Integer(), nullable=True),
+    sa.Column('profits_added', sa.Integer(), nullable=True),
+    sa.Column('parse_seconds', sa.Float(), nullable=True),
+    sa.Column('write_seconds', sa.Float(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('rows_done', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_imports_file_hash'), 'imports', ['file_hash'], unique=False)
+    op.create_table('profits',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('stockn', sa.Integer(), nullable=True),
+    sa.Column('date', sa.Date(), nullable=True),
+    sa.Column('cumulative_amount', sa.Float(), nullable=True),
+    sa.Column('change_amount', sa.Float(), nullable=True),
+    sa.Column('import_id', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('stockn', 'date', name='_stockn_date_uc')
+    )
+    op.create_index(op.f('ix_profits_id'), 'profits', ['id'], unique=False)
+    op.create_index(op.f('ix_profits_stockn'), 'profits', ['stockn'], unique=False)
+    op.create_table('profits_staging',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('import_id', sa.String(), nullable=True),
+    sa.Column('stockn', sa.Integer(), nullable=True),
+    sa.Column('date', sa.Date(), nullable=True),
+    sa.Column('cumulative_amount', sa.Float(), nullable=True),
+    sa.Column('change_amount', sa.Float(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_profits_staging_import_id'), 'profits_staging', ['import_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_profits_staging_import_id'), table_name='profits_staging')
+    op.drop_table('profits_staging')
+    op.drop_index(op.f('ix_profits_stockn'), table_name='profits')
+    op.drop_index(op.f('ix_profits_id'), table_name='profits')
+    op.drop_table('profits')
+    op.drop_index(op.f('ix_imports_file_hash'), table_name='imports')
+    op.drop_table('imports')
+    op.drop_index(op.f('ix_import_jobs_status'), table_name='import_jobs')
+    op.drop_table('import_jobs')
+    op.drop_index(op.f('ix_import_changes_import_id'), table_name='import_changes')
+    op.drop_table('import_changes')
+    op.drop_table('data_version')
+    op.drop_table('dashboard_snapshot')
+    op.drop_index(op.f('ix_cars_stockn'), table_name='cars')
+    op.drop_index(op.f('ix_cars_id'), table_name='cars')
+    op.drop_table('cars')
+    op.drop_table('car_latest_profit')
@@ -0,0 +1,57 @@
+"""Индексы для частых запросов Profits и Cars
+
+- profits (stockn, date DESC) INCLUDE (cumulative_amount, change_amount): последние записи машины
+  (DISTINCT ON, LAG при перецепке change_amount, динамика продаж) читаются только из индекса;
+  заменяет отдельный индекс ix_profits_stockn
+- profits (import_id): удаление импорта
+- profits (date) INCLUDE (change_amount): средние значения по датам на странице машины
+- cars (status), (make, model), (model), (import_id): фильтры страниц и удаление импорта
+
+Индексы строятся CONCURRENTLY, чтобы не блокировать запись в большие таблицы.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 05:14:31.201877
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# (имя, таблица, столбцы, INCLUDE)
+INDEXES = [
+    ('ix_profits_stockn_date_desc', 'profits', ['stockn', sa.text('date DESC')], ['cumulative_amount', 'change_amount']),
+    ('ix_profits_import_id', 'profits', ['import_id'], None),
+    ('ix_profits_date', 'profits', ['date'], ['change_amount']),
+    ('ix_cars_status', 'cars', ['status'], None),
+    ('ix_cars_make_model', 'cars', ['make', 'model'], None),
+    ('ix_cars_model', 'cars', ['model'], None),
+    ('ix_cars_import_id', 'cars', ['import_id'], None),
+]
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns, include in INDEXES:
+            op.create_index(
+                name, table, columns, unique=False, if_not_exists=True,
+                postgresql_concurrently=True, postgresql_include=include or [],
+            )
+        op.drop_index('ix_profits_stockn', table_name='profits', if_exists=True, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_profits_stockn', 'profits', ['stockn'], unique=False, if_not_exists=True,
+            postgresql_concurrently=True,
+        )
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
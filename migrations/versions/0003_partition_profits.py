@@ -0,0 +1,103 @@
+"""Секционирование Profits по месяцам date
+
+Profits пересоздается как секционированная таблица (PARTITION BY RANGE (date)) с секцией
+на каждый месяц, в котором есть записи; данные переносятся одной транзакцией.
+date входит в первичный ключ (id, date), поэтому записи без даты не переносятся:
+миграция останавливается, если такие записи есть. Последовательность profits_id_seq
+сохраняется, новые записи продолжают нумерацию.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 07:02:45.118304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from database.partitions import ensure_profits_partitions
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+COLUMNS = 'id, stockn, date, cumulative_amount, change_amount, import_id'
+
+# Индексы Profits после ревизии 0002: (имя, столбцы, INCLUDE)
+INDEXES = [
+    ('ix_profits_id', ['id'], None),
+    ('ix_profits_stockn_date_desc', ['stockn', sa.text('date DESC')], ['cumulative_amount', 'change_amount']),
+    ('ix_profits_import_id', ['import_id'], None),
+    ('ix_profits_date', ['date'], ['change_amount']),
+]
+
+
+def _is_partitioned(connection) -> bool:
+    return connection.execute(sa.text(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('profits')"
+    )).scalar()
+
+
+def _create_profits(partitioned: bool):
+    op.create_table(
+        'profits',
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('profits_id_seq'::regclass)"), nullable=False),
+        sa.Column('stockn', sa.Integer(), nullable=True),
+        sa.Column('date', sa.Date(), nullable=not partitioned),
+        sa.Column('cumulative_amount', sa.Float(), nullable=True),
+        sa.Column('change_amount', sa.Float(), nullable=True),
+        sa.Column('import_id', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint(*(['id', 'date'] if partitioned else ['id'])),
+        sa.UniqueConstraint('stockn', 'date', name='_stockn_date_uc'),
+        **({'postgresql_partition_by': 'RANGE (date)'} if partitioned else {}),
+    )
+    op.execute("ALTER SEQUENCE profits_id_seq OWNED BY profits.id")
+    for name, columns, include in INDEXES:
+        op.create_index(name, 'profits', columns, unique=False, postgresql_include=include or [])
+
+
+def _detach_old_profits(old_name: str):
+    """Переименовывает текущую Profits и освобождает имена ее индексов, ограничений и последовательность."""
+    op.rename_table('profits', old_name)
+    for name, _, _ in INDEXES:
+        op.drop_index(name, table_name=old_name, if_exists=True)
+    op.drop_constraint('_stockn_date_uc', old_name, type_='unique')
+    op.drop_constraint('profits_pkey', old_name, type_='primary')
+    op.execute("ALTER SEQUENCE profits_id_seq OWNED BY NONE")
+
+
+def upgrade():
+    connection = op.get_bind()
+    if _is_partitioned(connection):
+        return
+
+    without_date = connection.execute(sa.text("SELECT count(*) FROM profits WHERE date IS NULL")).scalar()
+    if without_date:
+        raise RuntimeError(
+            f"В Profits {without_date} записей без даты: их нельзя разместить в секциях. "
+            "Заполните date или удалите эти записи и повторите миграцию."
+        )
+
+    _detach_old_profits('profits_unpartitioned')
+    _create_profits(partitioned=True)
+
+    dates = connection.execute(sa.text(
+        "SELECT DISTINCT date_trunc('month', date)::date FROM profits_unpartitioned"
+    )).scalars().all()
+    ensure_profits_partitions(connection, dates)
+    op.execute(f"INSERT INTO profits ({COLUMNS}) SELECT {COLUMNS} FROM profits_unpartitioned")
+    op.drop_table('profits_unpartitioned')
+
+
+def downgrade():
+    connection = op.get_bind()
+    if not _is_partitioned(connection):
+        return
+
+    # Секции удаляются вместе с секционированной таблицей
+    _detach_old_profits('profits_partitioned')
+    _create_profits(partitioned=False)
+    op.execute(f"INSERT INTO profits ({COLUMNS}) SELECT {COLUMNS} FROM profits_partitioned")
+    op.drop_table('profits_partitioned')
@@ -0,0 +1,37 @@
+"""Архив исходных записей Profits, замененных при сжатии старых месяцев
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 05:20:29.695122
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('profits_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('stockn', sa.Integer(), nullable=True),
+    sa.Column('date', sa.Date(), nullable=True),
+    sa.Column('cumulative_amount', sa.Float(), nullable=True),
+    sa.Column('change_amount', sa.Float(), nullable=True),
+    sa.Column('import_id', sa.String(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_profits_archive_import_id'), 'profits_archive', ['import_id'], unique=False)
+    op.create_index('ix_profits_archive_stockn_date', 'profits_archive', ['stockn', 'date'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_profits_archive_stockn_date', table_name='profits_archive')
+    op.drop_index(op.f('ix_profits_archive_import_id'), table_name='profits_archive')
+    op.drop_table('profits_archive')
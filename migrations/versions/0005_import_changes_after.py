@@ -0,0 +1,27 @@
+"""Значения, записанные импортом, в журнале изменений Cars
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 09:12:41.208315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # В старой базе без import_changes таблицу создает create_all по текущей модели, уже со столбцом after
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('import_changes')}
+    if 'after' not in columns:
+        op.add_column('import_changes', sa.Column('after', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('import_changes', 'after')
@@ -0,0 +1,81 @@
+import streamlit as st
+import pandas as pd
+from database.db import pool_stats
+from database.frame_store import store_stats
+from services.cache import cache_stats, clear_cache
+
+
+def render_frame_store():
+    """Состояние общего хранилища DataFrame Cars и Profits."""
+    st.subheader("Хранилище данных")
+    stats = store_stats()
+    if stats['versions'] is None:
+        st.info("Хранилище еще не загружено: оно загружается при первом открытии главной страницы.")
+        return
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Память", f"{stats['memory_mb']} МБ")
+    col2.metric("Строк Cars / Profits", f"{stats['rows']['cars']:,} / {stats['rows']['profits']:,}")
+    col3.metric("Загрузок / обращений", f"{stats['loads']} / {stats['hits']}")
+    col4.metric("Последняя загрузка", f"{stats['load_seconds']} с")
+    st.caption(
+        f"Версии данных (cars, profits): {stats['versions']}, загружено {stats['loaded_at']:%Y-%m-%d %H:%M:%S}. "
+        f"Фоновое обновление {'работает' if stats['prewarm_running'] else 'не запущено'}."
+    )
+
+
+def render_caches():
+    """Счетчики кешей вычислений и загрузчиков."""
+    st.subheader("Кеши")
+    stats = cache_stats()
+    if not stats:
+        st.info("Кеши еще не созданы.")
+        return
+
+    df = pd.DataFrame(stats)
+    df['Занято, МБ'] = (df['bytes'] / 2 ** 20).round(2)
+    df['Бюджет, МБ'] = (df['max_bytes'] / 2 ** 20).round(1)
+    requests = df['hits'] + df['misses']
+    df['Попадания, %'] = (df['hits'] / requests.where(requests > 0) * 100).round(1).fillna(0)
+    df = df.rename(columns={
+        'name': 'Кеш', 'entries': 'Элементов', 'ttl': 'TTL, с', 'hits': 'Попадания', 'misses': 'Промахи',
+        'evictions': 'Вытеснено', 'expirations': 'Истекло', 'rejected': 'Не поместилось',
+    })
+    st.dataframe(df[[
+        'Кеш', 'Элементов', 'Занято, МБ', 'Бюджет, МБ', 'TTL, с', 'Попадания', 'Промахи',
+        'Попадания, %', 'Вытеснено', 'Истекло', 'Не поместилось',
+    ]], hide_index=True, use_container_width=True)
+
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        selected = st.selectbox("Кеш", ["Все кеши"] + df['Кеш'].tolist())
+    with col2:
+        st.write("")
+        if st.button("Очистить"):
+            clear_cache(None if selected == "Все кеши" else selected)
+            st.rerun()
+
+
+def render_pools():
+    """Состояние пулов соединений с базой."""
+    st.subheader("Пулы соединений")
+    df = pd.DataFrame(pool_stats()).rename(columns={
+        'name': 'Пул', 'size': 'Размер', 'checked_out': 'Выдано', 'idle': 'Свободно', 'overflow': 'Сверх размера',
+        'checkouts': 'Выдач', 'avg_wait_ms': 'Среднее ожидание, мс', 'max_wait_ms': 'Макс. ожидание, мс',
+        'timeouts': 'Отказов по таймауту',
+    })
+    st.dataframe(df[[
+        'Пул', 'Размер', 'Выдано', 'Свободно', 'Сверх размера', 'Выдач',
+        'Среднее ожидание, мс', 'Макс. ожидание, мс', 'Отказов по таймауту',
+    ]], hide_index=True, use_container_width=True)
+
+
+def main():
+    st.title("Кеши и память")
+    render_frame_store()
+    render_caches()
+    render_pools()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import streamlit as st
+import pandas as pd
+from services.compaction import compact_profits, compaction_cutoff
+from config import PROFITS_COMPACTION_HORIZON_DAYS
+
+def main():
+    st.title("Сжатие истории Profits")
+    st.write(
+        "Записи Profits старше горизонта сжимаются до одной записи на машину в месяц: остается последний "
+        "снимок месяца с суммой change_amount за месяц, исходные записи переносятся в profits_archive."
+    )
+
+    horizon_days = st.number_input(
+        "Хранить без сжатия, дней", min_value=31, value=PROFITS_COMPACTION_HORIZON_DAYS, step=30
+    )
+    st.caption(f"Будут сжаты месяцы раньше {compaction_cutoff(int(horizon_days)):%m.%Y}.")
+
+    if st.button("Сжать"):
+        with st.spinner("Сжатие..."):
+            result = compact_profits(int(horizon_days))
+        if result.get("error"):
+            st.error(f"Ошибка при сжатии: {result['error']}")
+        st.success(
+            f"Сжато месяцев: {len(result['months'])}. Перенесено в архив: {result['rows_archived']} записей, "
+            f"удалено из Profits: {result['rows_deleted']}. "
+            f"Освобождено: {result['bytes_reclaimed'] / 2 ** 20:.1f} МБ "
+            f"(архив вырос на {result['archive_bytes_added'] / 2 ** 20:.1f} МБ)."
+        )
+        if result['months']:
+            df = pd.DataFrame(result['months'])
+            df['До, МБ'] = (df['bytes_before'] / 2 ** 20).round(2)
+            df['После, МБ'] = (df['bytes_after'] / 2 ** 20).round(2)
+            df = df.rename(columns={
+                'month': 'Месяц', 'partition': 'Секция', 'rows_archived': 'В архив',
+                'rows_deleted': 'Удалено', 'cars': 'Машин',
+            })
+            st.dataframe(df[['Месяц', 'Секция', 'Машин', 'В архив', 'Удалено', 'До, МБ', 'После, МБ']],
+                         hide_index=True, use_container_width=True)
+
+if __name__ == "__main__":
+    main()
@@ -18,7 +18,16 @@ def main():
     if st.button("Удалить данные"):
         if selected_import_id:
             result = delete_data_by_import_id(selected_import_id)
-            st.success(f"Удалено записей: Cars - {result['cars_deleted']}, Profits - {result['profits_deleted']}")
+            st.success(
+                f"Удалено записей: Cars - {result['cars_deleted']}, Profits - {result['profits_deleted']}. "
+                f"Восстановлено машин: {result['cars_restored']}, снимков Profits из архива: {result['profits_unarchived']}. "
+                f"Пересчитано машин: {result['cars_recalculated']}, исправлено change_amount: {result['profits_rechained']}"
+            )
+            if result['fields_skipped']:
+                st.warning(
+                    "Не восстановлены поля, измененные после этого импорта: "
+                    + ", ".join(f"{item['stockn']}.{item['field']}" for item in result['fields_skipped'])
+                )
         else:
             st.error("Пожалуйста, выберите import_id")
 
@@ -1,12 +1,191 @@
 import streamlit as st
+import pandas as pd
 from datetime import date
-from services.import_service import import_data_from_excel
+from services.import_jobs import submit_import_job, get_recent_jobs, has_active_jobs, resume_pending_jobs
+from services.batch_import import import_backfill, parse_date_from_file_name
+from services.import_preview import preview_import, apply_import_plan
+
+# Названия этапов импорта для отображения прогресса
+PHASE_LABELS = {
+    'parse': 'Чтение и проверка файла',
+    'cars': 'Запись в Cars',
+    'profits': 'Запись в Profits',
+    'recompute': 'Пересчет profit и xs',
+    'apply': 'Запись файлов',
+}
+
+STATUS_LABELS = {
+    'queued': 'В очереди',
+    'running': 'Выполняется',
+    'done': 'Завершен',
+    'failed': 'Ошибка',
+}
+
+def render_rejection_report(report):
+    """Отображение отчета об отклоненных значениях по столбцам файла."""
+    if not report:
+        return
+    st.warning("Некоторые значения не удалось распознать и они не были записаны:")
+    st.dataframe(pd.DataFrame([
+        {
+            'Столбец': column,
+            'Отклонено': entry.get('rejected', 0),
+            'Строк без stockn': entry.get('missing', 0),
+            'Примеры': ', '.join(entry.get('examples', [])),
+        }
+        for column, entry in report.items()
+    ]))
+
+def render_job(job):
+    """Отображение состояния одной задачи импорта."""
+    title = f"#{job.id} {job.file_name or ''} на {job.snapshot_date} — {STATUS_LABELS.get(job.status, job.status)}"
+    with st.expander(title, expanded=job.status in ('queued', 'running')):
+        if job.status in ('queued', 'running'):
+            phase = PHASE_LABELS.get(job.phase, 'Ожидание')
+            st.progress(float(job.progress or 0.0), text=f"{phase}. {job.message or ''}")
+        elif job.status == 'failed':
+            st.error(f"Ошибка при импорте: {job.message}")
+            if (job.result or {}).get('resumable'):
+                st.info("Часть файла уже записана. Загрузите тот же файл на ту же дату, чтобы продолжить импорт.")
+        elif (job.result or {}).get('duplicate_of'):
+            st.info(f"Этот файл уже был импортирован на эту дату ({job.result['duplicate_of']}), импорт пропущен.")
+        else:
+            result = job.result or {}
+            # Выводим детализированную информацию по каждой таблице
+            st.success(
+                f"Импорт завершен успешно!\n"
+                f"Добавлено в Cars: {result.get('cars_added', 0)} строк, Обновлено в Cars: {result.get('cars_updated', 0)} строк, "
+                f"без изменений: {result.get('cars_unchanged', 0)}.\n"
+                f"Добавлено в Profits: {result.get('profits_added', 0)} строк."
+            )
+            if result.get('resumed_from'):
+                st.caption(f"Импорт продолжен со строки {result['resumed_from']}.")
+            render_rejection_report(result.get('rejected'))
+
+@st.fragment(run_every=2)
+def render_jobs():
+    """Список последних задач импорта; фрагмент обновляется каждые 2 секунды без перезапуска страницы."""
+    jobs = get_recent_jobs()
+    if not jobs:
+        return
+    st.subheader("Задачи импорта")
+    for job in jobs:
+        render_job(job)
+
+def render_backfill():
+    """Пакетный импорт нескольких файлов за разные даты (дата берется из имени файла)."""
+    uploaded_files = st.file_uploader(
+        "Загрузите файлы выгрузок за несколько дат", type=["xlsx", "csv", "parquet"], accept_multiple_files=True
+    )
+    if not uploaded_files:
+        return
+
+    # Таблица файлов с датами, которые можно исправить вручную
+    files_table = st.data_editor(
+        pd.DataFrame({
+            'Файл': [f.name for f in uploaded_files],
+            'Дата снимка': [parse_date_from_file_name(f.name) for f in uploaded_files],
+        }),
+        column_config={
+            'Файл': st.column_config.TextColumn(disabled=True),
+            'Дата снимка': st.column_config.DateColumn(format="YYYY-MM-DD", required=True),
+        },
+        hide_index=True,
+    )
+
+    force = st.checkbox("Импортировать повторно файлы, которые уже загружались", key="backfill_force")
+
+    if st.button("Импортировать все файлы"):
+        if files_table['Дата снимка'].isna().any():
+            st.error("Укажите дату снимка для всех файлов.")
+            return
+
+        files = [
+            {'content': f.getvalue(), 'file_name': f.name, 'snapshot_date': snapshot_date}
+            for f, snapshot_date in zip(uploaded_files, files_table['Дата снимка'])
+        ]
+        with st.status("Пакетный импорт...") as status:
+            bar = st.progress(0.0)
+
+            def progress(phase, done, total):
+                bar.progress(done / total, text=f"{PHASE_LABELS.get(phase, phase)}: {done} из {total}")
+
+            result = import_backfill(files, progress=progress, force=force)
+            status.update(label="Пакетный импорт завершен", state="error" if result.get('error') else "complete")
+
+        if result.get('error'):
+            st.error(f"Ошибка при импорте: {result['error']}")
+            return
+
+        st.success(
+            f"Импортировано файлов: {len(result['files'])}.\n"
+            f"Добавлено в Cars: {result['cars_added']} строк, Обновлено в Cars: {result['cars_updated']} строк, "
+            f"без изменений: {result['cars_unchanged']}.\n"
+            f"Добавлено в Profits: {result['profits_added']} строк, пересчитано change_amount: {result['profits_rechained']}."
+        )
+        st.dataframe(pd.DataFrame([
+            {key: item.get(key) for key in ('file_name', 'snapshot_date', 'cars_added', 'cars_updated', 'profits_added', 'duplicate_of')}
+            for item in result['files']
+        ]))
+        for item in result['files']:
+            render_rejection_report(item['rejected'])
+
+def render_preview(preview):
+    """Отображение результатов пробного импорта и кнопки применения плана."""
+    summary = preview['summary']
+    st.subheader(f"Предпросмотр: {preview['file_name']} на {preview['selected_date']}")
+    if preview.get('duplicate_of'):
+        st.warning(f"Этот файл уже был импортирован на эту дату ({preview['duplicate_of']}).")
+
+    columns = st.columns(5)
+    columns[0].metric("Новые машины", summary['cars_added'])
+    columns[1].metric("Изменятся", summary['cars_updated'])
+    columns[2].metric("Без изменений", summary['cars_unchanged'])
+    columns[3].metric("Новые записи Profits", summary['profits_added'])
+    columns[4].metric("Cumulative уменьшился", summary['profits_decreased'])
+    if summary['profits_existing']:
+        st.caption(f"Записей Profits на эту дату уже есть: {summary['profits_existing']} (будут пропущены).")
+
+    samples = preview['samples']
+    if summary['fields_changed']:
+        st.write("Изменяемые поля:", summary['fields_changed'])
+        st.dataframe(samples['changed_fields'].astype(str), hide_index=True)
+    if not samples['new_cars'].empty:
+        st.write("Новые машины (пример):")
+        st.dataframe(samples['new_cars'], hide_index=True)
+    if not samples['decreased'].empty:
+        st.write("Машины, у которых cumulative_amount уменьшился:")
+        st.dataframe(samples['decreased'], hide_index=True)
+    render_rejection_report(preview['rejected'])
+
+    apply_column, cancel_column = st.columns(2)
+    if apply_column.button("Применить"):
+        result = apply_import_plan(preview)
+        del st.session_state['import_preview']
+        if result.get('error'):
+            st.error(f"Ошибка при импорте: {result['error']}")
+        else:
+            st.success(
+                f"Импорт завершен успешно!\n"
+                f"Добавлено в Cars: {result['cars_added']} строк, Обновлено в Cars: {result['cars_updated']} строк.\n"
+                f"Добавлено в Profits: {result['profits_added']} строк."
+            )
+    if cancel_column.button("Отменить предпросмотр"):
+        del st.session_state['import_preview']
+        st.rerun()
 
 def main():
     st.title("Импорт данных")
 
-    # Поле для загрузки файла Excel
-    uploaded_file = st.file_uploader("Загрузите файл Excel", type=["xlsx"])
+    if st.toggle("Пакетный импорт за несколько дат"):
+        render_backfill()
+        return
+
+    # Запускаем задачи, прерванные перезапуском сервера
+    resume_pending_jobs()
+
+    # Поле для загрузки файла (Excel, CSV или Parquet)
+    uploaded_file = st.file_uploader("Загрузите файл Excel, CSV или Parquet", type=["xlsx", "csv", "parquet"])
 
     # Поле для выбора даты
     selected_date = st.date_input("Выберите дату для записи в таблицу Profits", value=date.today())
@@ -14,21 +193,38 @@ def main():
     # Поле для галочки, если импортируем только color, mileage, engine
     color_mileage_engine = st.checkbox("Импортировать только color, mileage, engine")
 
+    # Повторный импорт файла, который уже загружался на эту дату
+    force = st.checkbox("Импортировать повторно, даже если файл уже загружался")
+
+    # Пробный импорт: показывает изменения без записи в базу
+    if st.button("Предпросмотр"):
+        if uploaded_file:
+            with st.spinner("Вычисляем изменения..."):
+                preview = preview_import(uploaded_file, selected_date, color_mileage_engine, uploaded_file.name)
+            if preview.get('error'):
+                st.error(f"Ошибка при предпросмотре: {preview['error']}")
+            else:
+                st.session_state['import_preview'] = preview
+        else:
+            st.error("Пожалуйста, загрузите файл для импорта.")
+
+    if 'import_preview' in st.session_state:
+        render_preview(st.session_state['import_preview'])
+
     # Кнопка для запуска импорта
     if st.button("Импортировать данные"):
         if uploaded_file:
-            # Выполняем импорт данных, передавая все параметры
-            result = import_data_from_excel(uploaded_file, selected_date.strftime("%Y-%m-%d"), color_mileage_engine)
-
-            # Выводим детализированную информацию по каждой таблице
-            st.success(
-                f"Импорт завершен успешно!\n"
-                f"Добавлено в Cars: {result['cars_added']} строк, Обновлено в Cars: {result['cars_updated']} строк.\n"
-                f"Добавлено в Profits: {result['profits_added']} строк."
+            if has_active_jobs():
+                st.info("Предыдущий импорт еще выполняется, новый будет запущен после него.")
+            # Импорт выполняется в фоне, страница остается доступной
+            job_id = submit_import_job(
+                uploaded_file.getvalue(), uploaded_file.name, selected_date, color_mileage_engine, force
             )
-
+            st.toast(f"Импорт поставлен в очередь (задача #{job_id})")
         else:
             st.error("Пожалуйста, загрузите файл для импорта.")
 
+    render_jobs()
+
 if __name__ == "__main__":
     main()
@@ -1,8 +1,9 @@
 import streamlit as st
 from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, JsCode
-from sqlalchemy.orm import Session
-from database.db import SessionLocal
+from database.db import session_scope
 from services.table_service import fetch_cars_data
+from database.versions import get_versions
+from services.cache import bounded_cache
 from services.calculate import (
     calculate_stock_count, calculate_total_cost, calculate_total_profit,
     calculate_average_xs, calculate_average_until_payback, get_profit_dynamics_bulk
@@ -72,13 +73,15 @@ def render_filters(df: pd.DataFrame):
     }
 
 
+@bounded_cache(max_bytes=256 * 2 ** 20)
+def load_cars(cars_version):
+    """Данные Cars, кешируемые до следующего изменения таблицы (ключ — версия cars)."""
+    return fetch_cars_data()
+
 def render_stock_table():
     """Отображение таблицы Stock № с настроенными колонками и скрытыми полями."""
-    # Создаем сессию базы данных
-    session = SessionLocal()
-
     # Получаем данные из таблицы Cars
-    df = fetch_cars_data(session)
+    df = load_cars(get_versions('cars'))
 
     # Сортировка по 'stockn' в порядке убывания
     df = df.sort_values(by='stockn', ascending=False)
@@ -106,7 +109,8 @@ def render_stock_table():
 
     # Добавляем столбец с динамикой прибыли
     stockn_list = df['stockn'].tolist()
-    dynamics_dict = get_profit_dynamics_bulk(session, stockn_list)
+    with session_scope() as session:
+        dynamics_dict = get_profit_dynamics_bulk(session, stockn_list)
     df['dinamic'] = df['stockn'].map(dynamics_dict).fillna('Нет данных')
 
     # Упорядочиваем столбцы в нужном порядке
@@ -160,9 +164,6 @@ def render_stock_table():
     # Выводим сводные данные
     render_summary(filtered_df)
 
-    # Закрываем сессию
-    session.close()
-
 def render_summary(filtered_df):
     """Отображение сводных данных под таблицей с учетом фильтрации."""
     st.subheader("Сводные данные")
@@ -1,22 +1,20 @@
 import streamlit as st
 from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, JsCode
-from sqlalchemy.orm import Session
-from database.db import SessionLocal
+from database.db import session_scope
 from database.models import Cars, Profits
+from database.loader import load_table
+from database.versions import bump_version
+from services.calculate import refresh_latest_profits, recalculate_profit_and_xs
 import pandas as pd
 
 # Функции для работы с таблицами
 
-def fetch_data(table_model):
-    """Получение всех данных из таблицы с сортировкой по убыванию stockn."""
-    session: Session = SessionLocal()
+def fetch_data(table_model, columns):
+    """Получение выбранных столбцов таблицы в DataFrame с сортировкой по убыванию stockn."""
     try:
-        data = session.query(table_model).order_by(table_model.stockn.desc()).all()
-        return data
+        return load_table(table_model, columns, order_by=table_model.stockn.desc())
     except Exception as e:
         st.error(f"Ошибка при получении данных: {e}")
-    finally:
-        session.close()
 
 def sanitize_value(value):
     """Преобразование NaN в None для сохранения в базе данных."""
@@ -32,41 +30,46 @@ def has_changes(updated_row, original_row):
 
 def update_data(table_model, updated_rows, original_rows):
     """Обновление данных в базе для измененных строк."""
-    session: Session = SessionLocal()
     try:
-        # Создаем словарь исходных строк по 'id'
-        original_rows_by_id = {row['id']: row for row in original_rows}
-
-        for updated_row in updated_rows:
-            row_id = updated_row.get('id')
-            original_row = original_rows_by_id.get(row_id)
-            if original_row and has_changes(updated_row, original_row):
-                record = session.query(table_model).filter_by(id=row_id).first()
-                if record:
-                    for key, value in updated_row.items():
-                        if key != 'id':  # Не изменяем 'id'
-                            setattr(record, key, sanitize_value(value))
-        session.commit()
+        with session_scope() as session:
+            # Создаем словарь исходных строк по 'id'
+            original_rows_by_id = {row['id']: row for row in original_rows}
+            changed_stocknums = set()
+
+            for updated_row in updated_rows:
+                row_id = updated_row.get('id')
+                original_row = original_rows_by_id.get(row_id)
+                if original_row and has_changes(updated_row, original_row):
+                    record = session.query(table_model).filter_by(id=row_id).first()
+                    if record:
+                        for key, value in updated_row.items():
+                            if key != 'id':  # Не изменяем 'id'
+                                setattr(record, key, sanitize_value(value))
+                        if table_model is Cars:
+                            # Ручная правка: следующий импорт должен перезаписать строку
+                            record.fingerprint = None
+                            record.cme_fingerprint = None
+                        changed_stocknums.add(record.stockn)
+
+            # Пересчитываем последние записи Profits и profit/xs только для измененных машин
+            if changed_stocknums:
+                session.flush()
+                if table_model is Profits:
+                    refresh_latest_profits(session, changed_stocknums)
+                recalculate_profit_and_xs(session, changed_stocknums)
+                # profit и xs в Cars зависят от Profits
+                bump_version(session, 'cars', table_model.__tablename__)
     except Exception as e:
-        session.rollback()
         st.error(f"Ошибка при обновлении данных: {e}")
-    finally:
-        session.close()
 
 def render_table(table_model, table_name, column_order):
     """Отображение таблицы с возможностью редактирования и сохранения изменений в базу данных."""
-    data = fetch_data(table_model)
+    df = fetch_data(table_model, column_order)
 
-    if not data:
+    if df is None or df.empty:
         st.warning(f"Таблица {table_name} пуста или данные не найдены.")
         return
 
-    rows = [record.__dict__ for record in data]
-    for row in rows:
-        row.pop('_sa_instance_state', None)
-
-    df = pd.DataFrame(rows)
-    df = df[column_order]
     original_rows = df.to_dict(orient='records')
 
     # Создание GridOptionsBuilder из DataFrame
@@ -0,0 +1,206 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from config import ANALYTICS_BACKEND
+from database.frame_store import get_frames, frame_token, CARS_FILL_VALUES, PROFITS_FILL_VALUES
+from database.loader import CARS_COLUMNS, PROFITS_COLUMNS
+from database.parquet_mirror import find_mirror, write_mirror
+from database.schema import CARS_SCHEMA, PROFITS_SCHEMA
+from database.versions import get_versions, on_version_commit
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# Движки расчета агрегатов: функции services/calculate.py сами выбирают движок по BACKEND,
+# поэтому их вызовы не зависят от того, где идет расчет
+BACKENDS = ('pandas', 'duckdb')
+BACKEND = ANALYTICS_BACKEND if ANALYTICS_BACKEND in BACKENDS else 'pandas'
+if ANALYTICS_BACKEND not in BACKENDS:
+    logging.warning(f"Неизвестный ANALYTICS_BACKEND={ANALYTICS_BACKEND!r}, используется pandas")
+elif BACKEND == 'duckdb' and duckdb is None:
+    logging.warning("ANALYTICS_BACKEND=duckdb, но пакет duckdb не установлен: агрегаты считаются в pandas")
+
+_local = threading.local()
+_refresh_lock = threading.Lock()
+_refresh_pending = False
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='analytics')
+
+# Столбцы, типы и значения пустых полей входят в версию копии: копия, записанная для другой схемы
+# кадров, не подойдет
+_TABLE_LAYOUTS = {
+    'cars': (CARS_COLUMNS, CARS_SCHEMA, CARS_FILL_VALUES),
+    'profits': (PROFITS_COLUMNS, PROFITS_SCHEMA, PROFITS_FILL_VALUES),
+}
+
+
+def duckdb_enabled() -> bool:
+    return BACKEND == 'duckdb' and duckdb is not None
+
+
+def _mirror_version(name: str, version: int) -> tuple:
+    return (version, *_TABLE_LAYOUTS[name])
+
+
+def _connection():
+    """Соединение DuckDB в памяти, свое для каждого потока (соединение не рассчитано на параллельные запросы)."""
+    connection = getattr(_local, 'connection', None)
+    if connection is None:
+        connection = _local.connection = duckdb.connect()
+    return connection
+
+
+def _query(sql: str, params: list, **frames) -> pd.DataFrame:
+    """
+    Выполняет запрос DuckDB. Вместо {имя} в sql подставляется источник данных кадра frames[имя]:
+    Parquet-копия таблицы, если кадр выдан хранилищем и копия его версии уже записана,
+    иначе сам DataFrame (DuckDB читает его столбцы без копирования).
+    """
+    connection = _connection()
+    sources, registered = {}, []
+    try:
+        for alias, df in frames.items():
+            token = frame_token(df)
+            path = find_mirror(token[0], _mirror_version(*token)) if token else None
+            if path:
+                sources[alias] = "read_parquet('{}')".format(path.replace("'", "''"))
+            else:
+                view = f"{alias}_frame"
+                connection.register(view, df)
+                registered.append(view)
+                sources[alias] = view
+        return connection.execute(sql.format(**sources), params).df()
+    finally:
+        for view in registered:
+            connection.unregister(view)
+
+
+def monthly_income(profits_df: pd.DataFrame, start_date) -> pd.DataFrame:
+    """Сумма change_amount по месяцам с start_date, месяцы по убыванию (как get_monthly_income)."""
+    return _query(
+        """
+        SELECT strftime(month, '%m/%y') AS month_str, change_amount
+        FROM (
+            SELECT date_trunc('month', CAST(date AS TIMESTAMP)) AS month,
+                   sum(coalesce(change_amount, 0)) AS change_amount
+            FROM {profits}
+            WHERE date IS NOT NULL AND date >= ?
+            GROUP BY 1
+        )
+        ORDER BY month DESC
+        """,
+        [pd.Timestamp(start_date).to_pydatetime()],
+        profits=profits_df,
+    )
+
+
+def monthly_car_counts(cars_df: pd.DataFrame, start_date) -> pd.DataFrame:
+    """Число покупок и инвентаризаций по месяцам с start_date, месяцы по убыванию (как get_monthly_car_counts)."""
+    return _query(
+        """
+        WITH purchases AS (
+            SELECT date_trunc('month', CAST(purchesdate AS TIMESTAMP)) AS month, count(*) AS purchases
+            FROM {cars} WHERE purchesdate >= ? GROUP BY 1
+        ), inventories AS (
+            SELECT date_trunc('month', CAST(inventoried AS TIMESTAMP)) AS month, count(*) AS inventories
+            FROM {cars} WHERE inventoried >= ? GROUP BY 1
+        )
+        SELECT
+            strftime(coalesce(purchases.month, inventories.month), '%m/%y') AS month_str,
+            coalesce(purchases.purchases, 0) AS "Количество покупок",
+            coalesce(inventories.inventories, 0) AS "Количество инвентаризаций"
+        FROM purchases FULL OUTER JOIN inventories ON purchases.month = inventories.month
+        ORDER BY coalesce(purchases.month, inventories.month) DESC
+        """,
+        [pd.Timestamp(start_date).to_pydatetime()] * 2,
+        cars=cars_df,
+    )
+
+
+def low_sales_stocknums(profits_df: pd.DataFrame, threshold) -> pd.Series:
+    """stockn с суммой change_amount за последние 4 даты снимков не больше threshold."""
+    return _query(
+        """
+        WITH sales AS (
+            SELECT stockn, date, coalesce(change_amount, 0) AS change_amount FROM {profits}
+            WHERE date IS NOT NULL
+        ), last_dates AS (
+            SELECT DISTINCT date FROM sales ORDER BY date DESC LIMIT 4
+        )
+        SELECT stockn FROM sales
+        WHERE stockn IS NOT NULL AND date IN (SELECT date FROM last_dates)
+        GROUP BY stockn
+        HAVING sum(change_amount) <= ?
+        """,
+        [threshold],
+        profits=profits_df,
+    )['stockn']
+
+
+def daily_average_changes(cars_df: pd.DataFrame, profits_df: pd.DataFrame, make, model,
+                          date_from, date_to) -> pd.DataFrame:
+    """Средний change_amount за каждую дату: по всем машинам, по марке и по модели (как get_daily_average_changes)."""
+    return _query(
+        """
+        SELECT
+            profits.date,
+            avg(profits.change_amount) AS avg_change_all,
+            avg(profits.change_amount) FILTER (WHERE cars.make = ?) AS avg_change_make,
+            avg(profits.change_amount) FILTER (WHERE cars.model = ?) AS avg_change_model
+        FROM {profits} AS profits
+        LEFT JOIN (SELECT stockn, make, model FROM {cars}) AS cars ON cars.stockn = profits.stockn
+        WHERE profits.date BETWEEN ? AND ?
+        GROUP BY profits.date
+        ORDER BY profits.date
+        """,
+        [str(make), str(model), pd.Timestamp(date_from).to_pydatetime(), pd.Timestamp(date_to).to_pydatetime()],
+        cars=cars_df,
+        profits=profits_df,
+    )
+
+
+def refresh_mirror(versions: tuple = None) -> dict:
+    """
+    Записывает Parquet-копии cars и profits для версий данных versions (по умолчанию текущих)
+    из кадров хранилища, поэтому копия совпадает с тем, что считает pandas.
+
+    :return: Пути записанных копий
+    """
+    versions = versions or get_versions('cars', 'profits')
+    cars_df, profits_df = get_frames(versions)
+    return {
+        'cars': write_mirror('cars', _mirror_version('cars', versions[0]), cars_df),
+        'profits': write_mirror('profits', _mirror_version('profits', versions[1]), profits_df),
+    }
+
+
+def _refresh_job():
+    global _refresh_pending
+    with _refresh_lock:
+        _refresh_pending = False
+    try:
+        refresh_mirror()
+    except Exception as e:
+        logging.error(f"Ошибка при обновлении Parquet-копии для аналитики: {e}")
+
+
+def schedule_mirror_refresh(tables=None):
+    """Ставит обновление Parquet-копии в фоновую очередь (повторные вызовы, пока оно ждет, ничего не добавляют)."""
+    global _refresh_pending
+    if not duckdb_enabled():
+        return
+    if tables is not None and not {'cars', 'profits'} & set(tables):
+        return
+    with _refresh_lock:
+        if _refresh_pending:
+            return
+        _refresh_pending = True
+    _executor.submit(_refresh_job)
+
+
+# Копия обновляется после каждого импорта, удаления и редактирования, изменивших cars или profits
+on_version_commit(schedule_mirror_refresh)
@@ -0,0 +1,191 @@
+import re
+import time
+import hashlib
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+from sqlalchemy import select, func
+
+from database.db import session_scope, engine, disable_statement_timeout
+from database.partitions import prepare_profits_partitions
+from database.versions import bump_version
+from services.calculate import rechain_change_amounts, refresh_latest_profits, recalculate_profit_and_xs
+from services.import_ledger import register_import, find_duplicate_import
+from services.import_normalize import parse_import_file
+from services.import_readers import DEFAULT_CHUNK_ROWS
+from services.import_service import apply_import_chunk
+from services.import_jobs import IMPORT_LOCK_KEY
+
+# Даты в именах файлов выгрузок: 2024-11-01, 2024_11_01, 20241101, 01.11.2024
+FILE_NAME_DATE_PATTERNS = [
+    (re.compile(r'(?<!\d)(\d{4})[-_.](\d{2})[-_.](\d{2})(?!\d)'), ('year', 'month', 'day')),
+    (re.compile(r'(?<!\d)(\d{2})[-_.](\d{2})[-_.](\d{4})(?!\d)'), ('day', 'month', 'year')),
+    (re.compile(r'(?<!\d)(\d{4})(\d{2})(\d{2})(?!\d)'), ('year', 'month', 'day')),
+]
+
+
+def parse_date_from_file_name(file_name: str):
+    """Определяет дату снимка по имени файла. Возвращает date или None."""
+    for pattern, order in FILE_NAME_DATE_PATTERNS:
+        match = pattern.search(file_name or '')
+        if not match:
+            continue
+        parts = dict(zip(order, map(int, match.groups())))
+        try:
+            return date(parts['year'], parts['month'], parts['day'])
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_files(files: list, chunk_rows: int, max_workers) -> list:
+    """Разбирает файлы параллельно в пуле процессов (порядок результатов совпадает с files)."""
+    if len(files) == 1 or max_workers == 1:
+        return [parse_import_file(f['content'], f['file_name'], False, chunk_rows) for f in files]
+
+    # spawn: дочерние процессы не наследуют соединения с базой и потоки Streamlit
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(parse_import_file, f['content'], f['file_name'], False, chunk_rows) for f in files]
+        return [future.result() for future in futures]
+
+
+def import_backfill(files: list, chunk_rows: int = DEFAULT_CHUNK_ROWS, max_workers: int = None,
+                    progress=None, force: bool = False) -> dict:
+    """
+    Пакетный импорт нескольких инвентарных файлов за разные даты.
+
+    files: список словарей {'content': bytes, 'file_name': str, 'snapshot_date': date или None};
+    если дата не указана, она определяется по имени файла.
+
+    Файлы читаются и нормализуются параллельно в пуле процессов, затем применяются
+    в одной транзакции в порядке дат снимков, чтобы change_amount считался от предыдущей даты.
+    Записи Profits, которые оказались позже добавленных дат, перецепляются одним запросом,
+    profit и xs пересчитываются один раз в конце. Каждый файл получает свой import_id.
+
+    Файлы, уже импортированные на ту же дату (по sha256 содержимого), пропускаются,
+    если не задан force=True. Если в это время выполняется другой импорт (блокировка
+    IMPORT_LOCK_KEY занята), пакет не применяется и возвращается ошибка.
+
+    progress: необязательная функция progress(phase, files_done, files_total).
+    """
+    if not files:
+        return {"files": [], "cars_added": 0, "cars_updated": 0, "profits_added": 0, "error": "Нет файлов."}
+
+    for f in files:
+        f['snapshot_date'] = f.get('snapshot_date') or parse_date_from_file_name(f['file_name'])
+        if f['snapshot_date'] is None:
+            return {"files": [], "cars_added": 0, "cars_updated": 0, "profits_added": 0,
+                    "error": f"Не удалось определить дату для файла {f['file_name']}."}
+        if isinstance(f['snapshot_date'], datetime):
+            f['snapshot_date'] = f['snapshot_date'].date()
+
+    files = sorted(files, key=lambda f: f['snapshot_date'])
+    dates = [f['snapshot_date'] for f in files]
+    if len(set(dates)) != len(dates):
+        return {"files": [], "cars_added": 0, "cars_updated": 0, "profits_added": 0,
+                "error": "Несколько файлов имеют одинаковую дату снимка."}
+
+    if progress:
+        progress('parse', 0, len(files))
+    try:
+        parsed = _parse_files(files, chunk_rows, max_workers)
+    except Exception as e:
+        logging.error(f"Ошибка при разборе файлов пакетного импорта: {e}")
+        return {"files": [], "cars_added": 0, "cars_updated": 0, "profits_added": 0, "error": str(e)}
+
+    batch_id = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    summary = []
+    affected_stocknums = set()
+    cars_unchanged = 0
+
+    try:
+        # Секции месяцев создаем до транзакции пакета, чтобы не держать блокировку profits
+        prepare_profits_partitions(engine, dates)
+
+        with session_scope() as session:
+            # Не применяем пакет параллельно с фоновым импортом и применением предпросмотра
+            if not session.execute(select(func.pg_try_advisory_xact_lock(IMPORT_LOCK_KEY))).scalar():
+                return {"files": [], "cars_added": 0, "cars_updated": 0, "profits_added": 0,
+                        "error": "Выполняется другой импорт, повторите позже."}
+            disable_statement_timeout(session)
+
+            for number, (f, result) in enumerate(zip(files, parsed), start=1):
+                if progress:
+                    progress('apply', number - 1, len(files))
+                import_id = f"{batch_id} #{number}"
+                file_hash = hashlib.sha256(f['content']).hexdigest()
+                duplicate_of = None if force else find_duplicate_import(
+                    session, file_hash, 'inventory', f['snapshot_date']
+                )
+                if duplicate_of:
+                    logging.info(f"Пакетный импорт: {f['file_name']} уже импортирован ({duplicate_of}), пропущен.")
+                    summary.append({
+                        "import_id": None,
+                        "file_name": f['file_name'],
+                        "snapshot_date": f['snapshot_date'],
+                        "rejected": {},
+                        "duplicate_of": duplicate_of,
+                        "cars_added": 0, "cars_updated": 0, "profits_added": 0,
+                    })
+                    continue
+
+                typed = result['typed']
+                if result['rows_read'] == 0 or typed.empty:
+                    raise ValueError(f"Файл {f['file_name']} пустой.")
+
+                started = time.perf_counter()
+                counts = {"cars_added": 0, "cars_updated": 0, "profits_added": 0}
+                for start in range(0, len(typed), chunk_rows):
+                    chunk_result = apply_import_chunk(
+                        session, typed.iloc[start:start + chunk_rows], import_id, f['snapshot_date'], False
+                    )
+                    for key in counts:
+                        counts[key] += chunk_result[key]
+                    cars_unchanged += chunk_result["cars_unchanged"]
+                    affected_stocknums.update(chunk_result["stocknums"])
+
+                register_import(
+                    session,
+                    import_id,
+                    file_name=f['file_name'],
+                    file_hash=file_hash,
+                    import_type='inventory',
+                    snapshot_date=f['snapshot_date'],
+                    parse_seconds=result['parse_seconds'],
+                    write_seconds=round(time.perf_counter() - started, 3),
+                    **counts,
+                )
+                summary.append({
+                    "import_id": import_id,
+                    "file_name": f['file_name'],
+                    "snapshot_date": f['snapshot_date'],
+                    "rejected": result['rejected'],
+                    **counts,
+                })
+                logging.info(f"Пакетный импорт: {f['file_name']} на {f['snapshot_date']} применен ({counts}).")
+
+            if progress:
+                progress('recompute', len(files), len(files))
+
+            # Записи Profits позже самой ранней даты пакета могли получить новых предшественников
+            rechained = rechain_change_amounts(session, affected_stocknums, since=dates[0]) if affected_stocknums else 0
+            if rechained:
+                refresh_latest_profits(session, affected_stocknums)
+            recalculate_profit_and_xs(session, affected_stocknums)
+
+            bump_version(session, 'cars', 'profits', 'imports')
+
+            return {
+                "files": summary,
+                "cars_added": sum(item["cars_added"] for item in summary),
+                "cars_updated": sum(item["cars_updated"] for item in summary),
+                "cars_unchanged": cars_unchanged,
+                "profits_added": sum(item["profits_added"] for item in summary),
+                "profits_rechained": rechained,
+            }
+
+    except Exception as e:
+        logging.error(f"Ошибка при пакетном импорте: {e}")
+        return {"files": [], "cars_added": 0, "cars_updated": 0, "profits_added": 0, "error": str(e)}
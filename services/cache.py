@@ -0,0 +1,167 @@
+import sys
+import hashlib
+import logging
+import threading
+from functools import wraps
+
+import pandas as pd
+from cachetools import TTLCache
+
+from database.frame_store import frame_token, freeze_frame
+
+# Бюджет и время жизни кеша по умолчанию
+DEFAULT_MAX_BYTES = 64 * 2 ** 20
+DEFAULT_TTL_SECONDS = 600
+
+# Все кеши процесса по имени (для страницы администрирования)
+_caches = {}
+_missing = object()
+
+
+class BoundedCache(TTLCache):
+    """
+    TTLCache с бюджетом в байтах (размер элемента считает sizeof) и счетчиками.
+    При нехватке бюджета вытесняются давно не использованные элементы (LRU),
+    элементы старше ttl удаляются при следующем обращении.
+    """
+
+    def __init__(self, name: str, max_bytes: int, ttl: float):
+        super().__init__(maxsize=max_bytes, ttl=ttl, getsizeof=sizeof)
+        self.name = name
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejected = 0
+
+    def popitem(self):
+        # Вызывается cachetools, когда новый элемент не помещается в бюджет
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+    def clear(self):
+        # MutableMapping.clear удаляет элементы через popitem: это не вытеснения
+        evictions = self.evictions
+        super().clear()
+        self.evictions = evictions
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        self.expirations += len(expired)
+        return expired
+
+    def stats(self) -> dict:
+        with self.lock:
+            self.expire()
+            return {
+                'name': self.name,
+                'entries': len(self),
+                'bytes': self.currsize,
+                'max_bytes': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'rejected': self.rejected,
+            }
+
+
+def sizeof(value) -> int:
+    """Примерный размер значения в байтах (для DataFrame и Series — memory_usage(deep=True))."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(k) + sizeof(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(sizeof(item) for item in value)
+    return sys.getsizeof(value)
+
+
+def _key_part(value):
+    """
+    Часть ключа кеша для аргумента. Кадры из хранилища (get_frames) описываются версией данных,
+    остальные DataFrame и Series — хешем содержимого вместе с индексом.
+    """
+    if isinstance(value, pd.DataFrame):
+        token = frame_token(value)
+        if token is not None:
+            return ('frame',) + token
+        return ('df', tuple(map(str, value.columns)), tuple(map(str, value.dtypes)),
+                int(pd.util.hash_pandas_object(value, index=True).sum()))
+    if isinstance(value, (pd.Series, pd.Index)):
+        return ('series', str(value.dtype), int(pd.util.hash_pandas_object(value).sum()))
+    if isinstance(value, dict):
+        return ('dict',) + tuple(sorted((k, _key_part(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = sorted(value, key=repr) if isinstance(value, (set, frozenset)) else value
+        return (type(value).__name__,) + tuple(_key_part(item) for item in items)
+    return value
+
+
+def _make_key(args: tuple, kwargs: dict) -> str:
+    key = (tuple(_key_part(arg) for arg in args), tuple(sorted((k, _key_part(v)) for k, v in kwargs.items())))
+    return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+
+
+def bounded_cache(name: str = None, max_bytes: int = DEFAULT_MAX_BYTES, ttl: float = DEFAULT_TTL_SECONDS):
+    """
+    Декоратор кеширования результатов функции с бюджетом памяти, вытеснением LRU и временем жизни.
+
+    Кеш общий для всех сессий процесса, поэтому DataFrame и Series из кеша отдаются
+    поверхностными копиями, а их данные доступны только для чтения (freeze_frame).
+    Результат больше всего бюджета не сохраняется (счетчик rejected).
+
+    :param name: Имя кеша на странице администрирования (по умолчанию модуль.функция)
+    :param max_bytes: Бюджет кеша в байтах
+    :param ttl: Время жизни элемента в секундах
+    """
+    def decorator(func):
+        cache = BoundedCache(name or f"{func.__module__}.{func.__qualname__}", max_bytes, ttl)
+        _caches[cache.name] = cache
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = _make_key(args, kwargs)
+            with cache.lock:
+                value = cache.get(key, _missing)
+                if value is not _missing:
+                    cache.hits += 1
+                else:
+                    cache.misses += 1
+            if value is _missing:
+                value = func(*args, **kwargs)
+                if isinstance(value, (pd.DataFrame, pd.Series)):
+                    freeze_frame(value)
+                with cache.lock:
+                    try:
+                        cache[key] = value
+                    except ValueError:
+                        # Значение больше всего бюджета кеша
+                        cache.rejected += 1
+                        logging.info(f"Кеш {cache.name}: результат не помещается в бюджет {cache.maxsize} байт")
+            if isinstance(value, (pd.DataFrame, pd.Series)):
+                return value.copy(deep=False)
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+def cache_stats() -> list:
+    """Счетчики всех кешей процесса."""
+    return [cache.stats() for cache in _caches.values()]
+
+
+def clear_cache(name: str = None):
+    """Очищает кеш по имени или все кеши (счетчики сохраняются)."""
+    for cache in _caches.values():
+        if name is None or cache.name == name:
+            with cache.lock:
+                cache.clear()
@@ -1,7 +1,12 @@
+import time
+import logging
 from datetime import date
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from database.models import Cars, Profits
+from sqlalchemy import func, select, update, delete, exists, cast, case, or_, Numeric
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from database.models import Cars, Profits, CarLatestProfit
+from services.cache import bounded_cache
+from services import analytics
 import pandas as pd
 
 # Функции расчета для одной машины
@@ -13,44 +18,191 @@ def calculate_payback(breakevendate, inventoried_date):
 
 def calculate_profit(session, stockn, cost):
     if cost is None or pd.isna(cost):
-        print(f"Cost is missing for stockn: {stockn}")
+        logging.warning(f"Cost is missing for stockn: {stockn}")
         return None
 
-    last_cumulative_amount = (
-        session.query(Profits.cumulative_amount)
-        .filter(Profits.stockn == stockn)
-        .order_by(Profits.date.desc())
-        .first()
-    )
+    latest = session.get(CarLatestProfit, stockn)
 
-    if last_cumulative_amount is None or pd.isna(last_cumulative_amount[0]):
-        print(f"Cumulative amount is missing for stockn: {stockn}")
+    if latest is None or latest.cumulative_amount is None or pd.isna(latest.cumulative_amount):
+        logging.warning(f"Cumulative amount is missing for stockn: {stockn}")
         return None
 
-    profit = int(last_cumulative_amount[0] - cost)
-    print(f"Calculated profit for stockn {stockn}: {profit}")
+    profit = int(latest.cumulative_amount - cost)
+    logging.debug(f"Calculated profit for stockn {stockn}: {profit}")
     return profit
 
 def calculate_xs(session, stockn, cost):
     if cost is None or pd.isna(cost):
-        print(f"Cost is missing for stockn: {stockn}")
+        logging.warning(f"Cost is missing for stockn: {stockn}")
         return None
 
-    last_cumulative_amount = (
-        session.query(Profits.cumulative_amount)
-        .filter(Profits.stockn == stockn)
-        .order_by(Profits.date.desc())
-        .first()
-    )
+    latest = session.get(CarLatestProfit, stockn)
 
-    if last_cumulative_amount is None or pd.isna(last_cumulative_amount[0]):
-        print(f"Cumulative amount is missing for stockn: {stockn}")
+    if latest is None or latest.cumulative_amount is None or pd.isna(latest.cumulative_amount):
+        logging.warning(f"Cumulative amount is missing for stockn: {stockn}")
         return None
 
-    xs = round(last_cumulative_amount[0] / cost, 2)
-    print(f"Calculated xs for stockn {stockn}: {xs}")
+    xs = round(latest.cumulative_amount / cost, 2)
+    logging.debug(f"Calculated xs for stockn {stockn}: {xs}")
     return xs
 
+def latest_profits_query(stocknums=None, before_date=None):
+    """
+    Запрос последней записи Profits для каждого stockn (DISTINCT ON).
+    Можно ограничить набором stockn и/или датами строго раньше before_date.
+    """
+    query = (
+        select(Profits.stockn, Profits.date, Profits.cumulative_amount, Profits.change_amount)
+        .distinct(Profits.stockn)
+        .order_by(Profits.stockn, Profits.date.desc())
+    )
+    if stocknums is not None:
+        query = query.where(Profits.stockn.in_(stocknums))
+    if before_date is not None:
+        query = query.where(Profits.date < before_date)
+    return query
+
+# Поддержка таблицы car_latest_profit
+def apply_latest_profits(session, rows):
+    """
+    Инкрементально обновляет car_latest_profit новыми записями Profits (список словарей
+    со stockn, date, cumulative_amount, change_amount). Запись заменяется,
+    только если ее дата не раньше текущей последней даты.
+    """
+    if not rows:
+        return
+    table = CarLatestProfit.__table__
+    statement = pg_insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.stockn],
+        set_={
+            'date': statement.excluded.date,
+            'cumulative_amount': statement.excluded.cumulative_amount,
+            'change_amount': statement.excluded.change_amount,
+        },
+        where=statement.excluded.date >= table.c.date,
+    )
+    session.execute(statement, [
+        {key: row[key] for key in ('stockn', 'date', 'cumulative_amount', 'change_amount')}
+        for row in rows
+    ])
+
+def refresh_latest_profits(session, stocknums=None) -> int:
+    """
+    Пересчитывает car_latest_profit из Profits для всех stockn или только для stocknums.
+    Используется после удаления и ручного редактирования записей Profits.
+
+    :return: Количество измененных строк car_latest_profit
+    """
+    if stocknums is not None:
+        stocknums = list(stocknums)
+        if not stocknums:
+            return 0
+
+    table = CarLatestProfit.__table__
+    columns = ['stockn', 'date', 'cumulative_amount', 'change_amount']
+    statement = pg_insert(table).from_select(columns, latest_profits_query(stocknums))
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.stockn],
+        set_={column: statement.excluded[column] for column in columns[1:]},
+        where=or_(*[table.c[column].is_distinct_from(statement.excluded[column]) for column in columns[1:]]),
+    )
+    changed = session.execute(statement).rowcount
+
+    # Удаляем stockn, для которых в Profits не осталось записей
+    stale = delete(CarLatestProfit).where(~exists().where(Profits.stockn == CarLatestProfit.stockn))
+    if stocknums is not None:
+        stale = stale.where(CarLatestProfit.stockn.in_(stocknums))
+    changed += session.execute(stale.execution_options(synchronize_session=False)).rowcount
+    return changed
+
+def rechain_change_amounts(session, stocknums=None, since=None) -> int:
+    """
+    Пересчитывает change_amount как разницу с предыдущим cumulative_amount того же stockn
+    одним UPDATE с оконной функцией LAG для stocknums (None — для всех машин).
+    Если задан since, обновляются только записи с датой позже since
+    (предыдущие значения при этом учитываются).
+
+    :return: Количество исправленных записей Profits
+    """
+    if stocknums is not None:
+        stocknums = list(stocknums)
+        if not stocknums:
+            return 0
+
+    chain = select(
+        Profits.id,
+        Profits.date,
+        Profits.cumulative_amount,
+        func.lag(Profits.cumulative_amount)
+        .over(partition_by=Profits.stockn, order_by=Profits.date)
+        .label('previous_amount')
+    )
+    if stocknums is not None:
+        chain = chain.where(Profits.stockn.in_(stocknums))
+    chain = chain.subquery()
+    new_change = case(
+        (chain.c.cumulative_amount.is_(None), 0),
+        (chain.c.previous_amount.is_(None), chain.c.cumulative_amount),
+        else_=chain.c.cumulative_amount - chain.c.previous_amount
+    )
+
+    query = (
+        update(Profits)
+        .where(Profits.id == chain.c.id, Profits.date == chain.c.date)
+        .where(Profits.change_amount.is_distinct_from(new_change))
+        .values(change_amount=new_change)
+        .execution_options(synchronize_session=False)
+    )
+    if since is not None:
+        query = query.where(Profits.date > since)
+    return session.execute(query).rowcount
+
+# Пакетный пересчет profit и xs
+def recalculate_profit_and_xs(session, stocknums=None) -> dict:
+    """
+    Пересчитывает profit и xs для всех машин (или только для stocknums) одним
+    UPDATE ... FROM по таблице car_latest_profit.
+    Машинам без записей в Profits profit и xs сбрасываются в None.
+
+    :return: Словарь с количеством обновленных и очищенных машин и временем выполнения
+    """
+    started = time.perf_counter()
+    if stocknums is not None:
+        stocknums = list(stocknums)
+        if not stocknums:
+            return {"cars_updated": 0, "cars_cleared": 0, "seconds": 0.0}
+
+    latest = CarLatestProfit.__table__
+    new_profit = func.trunc(latest.c.cumulative_amount - Cars.cost)
+    new_xs = func.round(cast(latest.c.cumulative_amount / func.nullif(Cars.cost, 0), Numeric), 2)
+
+    update_query = (
+        update(Cars)
+        .where(Cars.stockn == latest.c.stockn)
+        .where(or_(Cars.profit.is_distinct_from(new_profit), Cars.xs.is_distinct_from(new_xs)))
+        .values(profit=new_profit, xs=new_xs)
+        .execution_options(synchronize_session=False)
+    )
+    if stocknums is not None:
+        update_query = update_query.where(latest.c.stockn.in_(stocknums))
+    cars_updated = session.execute(update_query).rowcount
+
+    clear_query = (
+        update(Cars)
+        .where(~exists().where(CarLatestProfit.stockn == Cars.stockn))
+        .where(or_(Cars.profit.isnot(None), Cars.xs.isnot(None)))
+        .values(profit=None, xs=None)
+        .execution_options(synchronize_session=False)
+    )
+    if stocknums is not None:
+        clear_query = clear_query.where(Cars.stockn.in_(stocknums))
+    cars_cleared = session.execute(clear_query).rowcount
+
+    seconds = round(time.perf_counter() - started, 3)
+    logging.info(f"Profit и xs пересчитаны: обновлено {cars_updated}, очищено {cars_cleared} за {seconds} с")
+    return {"cars_updated": cars_updated, "cars_cleared": cars_cleared, "seconds": seconds}
+
 # Агрегационные функции
 def get_min_max_avg_sum(session, field, make=None, model=None, status=["active"]):
     query = session.query(
@@ -149,9 +301,16 @@ def calculate_change_amount(session, profit_id, stockn, new_cumulative_amount, n
         return new_cumulative_amount
 
 # Без значимых продаж
+@bounded_cache()
 def get_cars_without_significant_sales(profits_df, cars_df, exclude_stocks=None, threshold=200):
-    # Убираем NaN из 'date' и 'change_amount'
-    profits_df = profits_df.dropna(subset=['date', 'change_amount'])
+    if analytics.duckdb_enabled():
+        low_sales_stocks = analytics.low_sales_stocknums(profits_df, threshold)
+        if exclude_stocks is not None:
+            low_sales_stocks = low_sales_stocks[~low_sales_stocks.isin(exclude_stocks)]
+        return cars_df[cars_df['stockn'].isin(low_sales_stocks)]
+
+    # Убираем NaN из 'date'; пустой change_amount считается нулем
+    profits_df = profits_df.dropna(subset=['date'])
 
     # Преобразуем 'change_amount' в числовой формат
     profits_df['change_amount'] = pd.to_numeric(profits_df['change_amount'], errors='coerce').fillna(0.0)
@@ -177,35 +336,30 @@ def get_cars_without_significant_sales(profits_df, cars_df, exclude_stocks=None,
 
     return result_df
 
+@bounded_cache()
 def get_unprofitable_old_cars(cars_df, exclude_stocks, days_threshold=60, xs_threshold=1.5):
     # Убираем NaN из 'inventoried'
     cars_df = cars_df.dropna(subset=['inventoried'])
 
-    # Вычисляем возраст машины в днях
-    cars_df['age_days'] = (pd.Timestamp('today') - cars_df['inventoried']).dt.days
-
-    # Заменяем NaN в 'xs' на 0
-    cars_df['xs'] = cars_df['xs'].fillna(0.0)
+    # Возраст машины в днях и xs без NaN считаются отдельно: переданный DataFrame общий и не изменяется
+    age_days = (pd.Timestamp('today') - cars_df['inventoried']).dt.days
+    xs = cars_df['xs'].fillna(0.0)
 
     # Фильтруем машины по условиям
-    filtered_cars = cars_df[
-        (cars_df['age_days'] > days_threshold) &
-        (cars_df['xs'] < xs_threshold) &
-        (~cars_df['stockn'].isin(exclude_stocks))
-    ]
+    mask = (age_days > days_threshold) & (xs < xs_threshold) & (~cars_df['stockn'].isin(exclude_stocks))
+    filtered_cars = cars_df[mask].assign(age_days=age_days[mask], xs=xs[mask])
 
     return filtered_cars
 
 # Лучшие покупки
+@bounded_cache()
 def get_best_purchases(cars_df, xs_threshold=2, profit_threshold=5000):
-    # Заменяем NaN в 'xs' и 'profit' на 0
-    cars_df['xs'] = cars_df['xs'].fillna(0.0)
-    cars_df['profit'] = cars_df['profit'].fillna(0.0)
-
-    filtered_cars = cars_df[
-        (cars_df['xs'] > xs_threshold) |
-        (cars_df['profit'] > profit_threshold)
-        ]
+    # Заменяем NaN в 'xs' и 'profit' на 0 (без изменения переданного DataFrame)
+    xs = cars_df['xs'].fillna(0.0)
+    profit = cars_df['profit'].fillna(0.0)
+
+    mask = (xs > xs_threshold) | (profit > profit_threshold)
+    filtered_cars = cars_df[mask].assign(xs=xs[mask], profit=profit[mask])
     return filtered_cars
 
 # Общие сведения на App.py
@@ -229,9 +383,14 @@ def calculate_summary_statistics(df):
     return summary
 
 # Доходы по месяцам
+@bounded_cache()
 def get_monthly_income(profits_df, start_date='2024-09-01'):
-    # Убираем NaN из 'date' и 'change_amount'
-    profits_df = profits_df.dropna(subset=['date', 'change_amount'])
+    if analytics.duckdb_enabled():
+        return analytics.monthly_income(profits_df, start_date)
+
+    # Убираем NaN из 'date'; пустой change_amount считается нулем
+    profits_df = profits_df.dropna(subset=['date'])
+    profits_df['change_amount'] = profits_df['change_amount'].fillna(0.0)
 
     # Фильтруем данные по дате
     profits_df = profits_df[profits_df['date'] >= pd.to_datetime(start_date)]
@@ -251,25 +410,27 @@ def get_monthly_income(profits_df, start_date='2024-09-01'):
     return monthly_income[['month_str', 'change_amount']]
 
 # Покупки по месяцам
+@bounded_cache()
 def get_monthly_car_counts(cars_df, start_date='2022-05-01'):
-    # Преобразуем столбцы дат в datetime, если это еще не сделано
-    cars_df['purchesdate'] = pd.to_datetime(cars_df['purchesdate'], errors='coerce')
-    cars_df['inventoried'] = pd.to_datetime(cars_df['inventoried'], errors='coerce')
+    if analytics.duckdb_enabled():
+        return analytics.monthly_car_counts(cars_df, start_date)
+
+    # Преобразуем столбцы дат в datetime, если это еще не сделано (в локальные Series, не в переданный DataFrame)
+    purchesdate = pd.to_datetime(cars_df['purchesdate'], errors='coerce')
+    inventoried = pd.to_datetime(cars_df['inventoried'], errors='coerce')
 
     # Фильтруем даты после start_date
     start_date = pd.to_datetime(start_date)
-    purch_mask = cars_df['purchesdate'] >= start_date
-    inv_mask = cars_df['inventoried'] >= start_date
+    purch_mask = purchesdate >= start_date
+    inv_mask = inventoried >= start_date
 
     # Считаем количество покупок по месяцам
-    purchase_df = cars_df.loc[purch_mask].copy()
-    purchase_df['purchase_month'] = purchase_df['purchesdate'].dt.to_period('M')
-    purchase_counts = purchase_df.groupby('purchase_month').size().reset_index(name='Количество покупок')
+    purchase_months = purchesdate[purch_mask].dt.to_period('M').rename('purchase_month')
+    purchase_counts = purchase_months.to_frame().groupby('purchase_month').size().reset_index(name='Количество покупок')
 
     # Считаем количество инвентаризаций по месяцам
-    inventory_df = cars_df.loc[inv_mask].copy()
-    inventory_df['inventory_month'] = inventory_df['inventoried'].dt.to_period('M')
-    inventory_counts = inventory_df.groupby('inventory_month').size().reset_index(name='Количество инвентаризаций')
+    inventory_months = inventoried[inv_mask].dt.to_period('M').rename('inventory_month')
+    inventory_counts = inventory_months.to_frame().groupby('inventory_month').size().reset_index(name='Количество инвентаризаций')
 
     # Объединяем данные по месяцам
     monthly_counts = pd.merge(
@@ -295,3 +456,29 @@ def get_monthly_car_counts(cars_df, start_date='2022-05-01'):
     monthly_counts = monthly_counts.sort_values('month', ascending=False)
 
     return monthly_counts[['month_str', 'Количество покупок', 'Количество инвентаризаций']]
+
+# Средние изменения прибыли по датам для статистики машины
+@bounded_cache()
+def get_daily_average_changes(cars_df, profits_df, make, model, date_from, date_to):
+    """
+    Средний change_amount за каждую дату с date_from по date_to: по всем машинам,
+    по марке make и по модели model. Пустой change_amount в кадрах хранилища остается NaN
+    и в среднее не входит, как в avg() Postgres и DuckDB.
+    """
+    if analytics.duckdb_enabled():
+        return analytics.daily_average_changes(cars_df, profits_df, make, model, date_from, date_to)
+
+    # Записи Profits за период с маркой и моделью машины
+    profits_df = profits_df[profits_df['date'].between(pd.Timestamp(date_from), pd.Timestamp(date_to))]
+    profits_df = profits_df[['date', 'stockn', 'change_amount']].merge(
+        cars_df[['stockn', 'make', 'model']], on='stockn', how='left'
+    )
+
+    # Среднее по марке и модели считается только по записям этих машин (остальные NaN пропускаются)
+    averages = pd.DataFrame({
+        'date': profits_df['date'],
+        'avg_change_all': profits_df['change_amount'],
+        'avg_change_make': profits_df['change_amount'].where(profits_df['make'] == make),
+        'avg_change_model': profits_df['change_amount'].where(profits_df['model'] == model),
+    })
+    return averages.groupby('date').mean().reset_index().sort_values('date')
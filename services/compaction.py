@@ -0,0 +1,194 @@
+import time
+import logging
+from datetime import date, timedelta
+from sqlalchemy import select, update, delete, insert, func, and_, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from database.db import engine, session_scope
+from database.models import Profits, ProfitsArchive
+from database.partitions import list_partitions, partition_month, month_start, next_month
+from database.versions import bump_version
+from services.calculate import refresh_latest_profits
+from config import PROFITS_COMPACTION_HORIZON_DAYS
+
+
+def compaction_cutoff(horizon_days: int = None, today: date = None) -> date:
+    """
+    Первый месяц, который не сжимается: месяц даты «сегодня минус горизонт».
+    Сжимаются только месяцы целиком раньше него.
+    """
+    horizon_days = PROFITS_COMPACTION_HORIZON_DAYS if horizon_days is None else horizon_days
+    return month_start((today or date.today()) - timedelta(days=horizon_days))
+
+
+def _relation_size(connection, name: str) -> int:
+    """Размер таблицы вместе с индексами, байт."""
+    return connection.execute(text(f"SELECT pg_total_relation_size('{name}')")).scalar()
+
+
+def compact_month(session: Session, month: date) -> dict:
+    """
+    Сжимает записи Profits месяца month до одной записи на машину в транзакции session.
+
+    Для каждого stockn с несколькими снимками в месяце остается последний снимок: его
+    cumulative_amount — итог месяца, а change_amount заменяется суммой change_amount
+    всех снимков месяца, поэтому доход по месяцам и цепочка следующего месяца не меняются.
+    Все исходные записи таких машин переносятся в profits_archive.
+    Все условия ограничены месяцем, поэтому запросы читают одну секцию.
+
+    :return: Количество перенесенных в архив и удаленных записей и stockn с измененной записью
+    """
+    in_month = and_(Profits.date >= month, Profits.date < next_month(month))
+    ranked = (
+        select(
+            Profits.id,
+            Profits.date,
+            func.row_number().over(partition_by=Profits.stockn, order_by=Profits.date.desc()).label('position'),
+            func.count().over(partition_by=Profits.stockn).label('snapshots'),
+            func.sum(func.coalesce(Profits.change_amount, 0)).over(partition_by=Profits.stockn).label('month_change'),
+        )
+        .where(in_month)
+        .subquery()
+    )
+    matches = and_(Profits.id == ranked.c.id, Profits.date == ranked.c.date, ranked.c.snapshots > 1, in_month)
+
+    archived = session.execute(
+        insert(ProfitsArchive).from_select(
+            ['id', 'stockn', 'date', 'cumulative_amount', 'change_amount', 'import_id', 'archived_at'],
+            select(Profits.id, Profits.stockn, Profits.date, Profits.cumulative_amount,
+                   Profits.change_amount, Profits.import_id, func.now())
+            .join(ranked, and_(Profits.id == ranked.c.id, Profits.date == ranked.c.date))
+            .where(ranked.c.snapshots > 1, in_month)
+        )
+    ).rowcount
+
+    compacted_stocknums = session.execute(
+        update(Profits)
+        .where(matches, ranked.c.position == 1)
+        .values(change_amount=ranked.c.month_change)
+        .returning(Profits.stockn)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+
+    deleted = session.execute(
+        delete(Profits)
+        .where(matches, ranked.c.position > 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    return {'rows_archived': archived, 'rows_deleted': deleted, 'stocknums': compacted_stocknums}
+
+
+def restore_archived_snapshots(session: Session, import_id: str) -> int:
+    """
+    Отменяет сжатие месяцев, в которых есть архивные записи импорта import_id, в транзакции session.
+
+    Для каждой пары (stockn, месяц) с такой записью сжатая запись Profits (ее id есть в архиве)
+    заменяется всеми исходными снимками машины за месяц из profits_archive (с прежними id
+    и change_amount), и эти снимки удаляются из архива. Снимки, добавленные в месяц после сжатия,
+    остаются; если такой снимок занял дату архивной записи, архивная запись не возвращается. После этого записи импорта можно удалить как обычно:
+    снимки других импортов за тот же месяц не теряются, а цепочка change_amount восстанавливается
+    перецеплением. Месяц снова сожмется при следующем запуске compact_profits.
+
+    :return: Количество записей, возвращенных в Profits
+    """
+    archived = session.execute(
+        select(ProfitsArchive.stockn, ProfitsArchive.date).where(ProfitsArchive.import_id == import_id)
+    ).all()
+    stocknums_by_month = {}
+    for row in archived:
+        stocknums_by_month.setdefault(month_start(row.date), set()).add(row.stockn)
+
+    restored = 0
+    for month, stocknums in sorted(stocknums_by_month.items()):
+        stocknums = list(stocknums)
+        in_archive = and_(ProfitsArchive.stockn.in_(stocknums),
+                          ProfitsArchive.date >= month, ProfitsArchive.date < next_month(month))
+        # Удаляем только оставшиеся после сжатия записи: их id совпадают с архивными
+        session.execute(
+            delete(Profits)
+            .where(Profits.id.in_(select(ProfitsArchive.id).where(in_archive)),
+                   Profits.date >= month, Profits.date < next_month(month))
+            .execution_options(synchronize_session=False)
+        )
+        restored += session.execute(
+            pg_insert(Profits).from_select(
+                ['id', 'stockn', 'date', 'cumulative_amount', 'change_amount', 'import_id'],
+                select(ProfitsArchive.id, ProfitsArchive.stockn, ProfitsArchive.date,
+                       ProfitsArchive.cumulative_amount, ProfitsArchive.change_amount, ProfitsArchive.import_id)
+                .where(in_archive)
+            ).on_conflict_do_nothing(constraint='_stockn_date_uc')
+        ).rowcount
+        session.execute(delete(ProfitsArchive).where(in_archive).execution_options(synchronize_session=False))
+    return restored
+
+
+def compact_profits(horizon_days: int = None, vacuum: bool = True) -> dict:
+    """
+    Сжимает месячные секции Profits старше горизонта (по умолчанию
+    config.PROFITS_COMPACTION_HORIZON_DAYS): по одной транзакции на месяц, затем
+    VACUUM FULL сжатой секции, чтобы вернуть место на диске. Повторный запуск
+    для уже сжатых месяцев ничего не меняет.
+
+    :param horizon_days: Сколько последних дней хранить без сжатия
+    :param vacuum: Переписать сжатые секции (VACUUM FULL блокирует только эту секцию)
+    :return: Итоги по месяцам и освобожденное место
+    """
+    started = time.perf_counter()
+    cutoff = compaction_cutoff(horizon_days)
+    result = {"cutoff": cutoff, "months": [], "rows_archived": 0, "rows_deleted": 0,
+              "bytes_reclaimed": 0, "archive_bytes_added": 0}
+
+    with engine.connect() as connection:
+        partitions = [name for name in list_partitions(connection) if partition_month(name) < cutoff]
+        archive_before = _relation_size(connection, ProfitsArchive.__tablename__)
+
+    for name in partitions:
+        month = partition_month(name)
+        try:
+            with session_scope() as session:
+                bytes_before = _relation_size(session.connection(), name)
+                counts = compact_month(session, month)
+                if counts['rows_deleted']:
+                    # Изменилась последняя запись машины, если ее последний снимок в этом месяце
+                    refresh_latest_profits(session, counts['stocknums'])
+                    bump_version(session, 'profits')
+        except Exception as e:
+            logging.error(f"Ошибка при сжатии Profits за {month:%Y-%m}: {e}")
+            result["error"] = str(e)
+            break
+
+        if not counts['rows_deleted']:
+            continue
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            if vacuum:
+                # Переписывание большой секции может занять больше DB_STATEMENT_TIMEOUT_MS;
+                # RESET возвращает значение соединения из пула
+                connection.execute(text("SET statement_timeout = 0"))
+                try:
+                    connection.execute(text(f"VACUUM (FULL, ANALYZE) {name}"))
+                finally:
+                    connection.execute(text("RESET statement_timeout"))
+            bytes_after = _relation_size(connection, name)
+
+        result["months"].append({
+            "month": month,
+            "partition": name,
+            "rows_archived": counts['rows_archived'],
+            "rows_deleted": counts['rows_deleted'],
+            "cars": len(counts['stocknums']),
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+        })
+        result["rows_archived"] += counts['rows_archived']
+        result["rows_deleted"] += counts['rows_deleted']
+        result["bytes_reclaimed"] += bytes_before - bytes_after
+
+    with engine.connect() as connection:
+        result["archive_bytes_added"] = _relation_size(connection, ProfitsArchive.__tablename__) - archive_before
+
+    logging.info(
+        f"Сжатие Profits до {cutoff}: месяцев {len(result['months'])}, удалено записей {result['rows_deleted']}, "
+        f"освобождено {result['bytes_reclaimed'] / 2 ** 20:.1f} МБ за {time.perf_counter() - started:.2f} с"
+    )
+    return result
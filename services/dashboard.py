@@ -0,0 +1,227 @@
+import io
+import time
+import logging
+import threading
+from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from database.db import session_scope
+from database.frame_store import get_frames
+from database.models import DashboardSnapshot
+from database.versions import get_versions, on_version_commit
+from services.cache import bounded_cache
+from services.calculate import (
+    get_cars_without_significant_sales,
+    get_unprofitable_old_cars,
+    get_best_purchases,
+    calculate_summary_statistics,
+    get_monthly_income,
+    get_monthly_car_counts,
+    get_profit_dynamics_bulk,
+)
+
+# Столбцы таблиц вкладок главной страницы
+DASHBOARD_COLUMNS = ['stockn', 'make', 'model', 'year', 'color', 'cost', 'profit', 'xs', 'dinamic', 'age']
+
+# Разделы снимка: три таблицы вкладок (со сводными показателями) и два ряда графиков
+TABLE_SECTIONS = ('no_sales', 'unprofitable', 'best')
+CHART_SECTIONS = ('monthly_income', 'monthly_counts')
+
+_build_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_refresh_pending = False
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dashboard')
+
+
+def dashboard_key(versions: tuple = None) -> str:
+    """
+    Ключ актуальности снимка: версии cars и profits и дата расчета
+    (возраст машин в таблице «старше 60 дней» зависит от текущей даты).
+    """
+    cars_version, profits_version = versions or get_versions('cars', 'profits')
+    return f"cars:{cars_version}|profits:{profits_version}|{date.today().isoformat()}"
+
+
+def _to_ipc(df: pd.DataFrame) -> bytes:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = io.BytesIO()
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def _from_ipc(content: bytes) -> pd.DataFrame:
+    return pa.ipc.open_file(pa.BufferReader(content)).read_all().to_pandas()
+
+
+def build_dashboard(versions: tuple) -> dict:
+    """
+    Рассчитывает все разделы главной страницы по DataFrame хранилища.
+    Динамика продаж для трех таблиц загружается одним запросом.
+    """
+    cars_df, profits_df = get_frames(versions)
+
+    unprofitable = get_unprofitable_old_cars(cars_df, [])
+    # Машины из таблицы «Неокупившиеся» исключаются из таблицы «Без значимых продаж»
+    exclude_stocks = unprofitable['stockn'].tolist()
+    tables = {
+        'no_sales': get_cars_without_significant_sales(profits_df, cars_df, exclude_stocks=exclude_stocks),
+        'unprofitable': unprofitable,
+        'best': get_best_purchases(cars_df),
+    }
+
+    stockn_list = sorted({stockn for df in tables.values() for stockn in df['stockn'].tolist()})
+    with session_scope() as session:
+        dynamics_dict = get_profit_dynamics_bulk(session, stockn_list) if stockn_list else {}
+
+    sections = {}
+    for section, df in tables.items():
+        df = df.assign(dinamic=df['stockn'].map(dynamics_dict).fillna('Нет данных'))[DASHBOARD_COLUMNS]
+        sections[section] = {'frame': df, 'metrics': calculate_summary_statistics(df)}
+    sections['monthly_income'] = {'frame': get_monthly_income(profits_df), 'metrics': None}
+    sections['monthly_counts'] = {'frame': get_monthly_car_counts(cars_df), 'metrics': None}
+    return sections
+
+
+def refresh_dashboard_snapshot(versions: tuple = None) -> str:
+    """
+    Пересчитывает снимок главной страницы и сохраняет его в dashboard_snapshot одной транзакцией.
+    Версии читаются до расчета: если данные изменятся во время расчета, снимок получит
+    старый ключ и будет пересчитан при следующем обращении.
+    """
+    versions = versions or get_versions('cars', 'profits')
+    key = dashboard_key(versions)
+    started = time.perf_counter()
+    sections = build_dashboard(versions)
+
+    now = datetime.now()
+    rows = [
+        {'section': section, 'data_key': key, 'frame': _to_ipc(value['frame']),
+         'metrics': value['metrics'], 'built_at': now}
+        for section, value in sections.items()
+    ]
+    table = DashboardSnapshot.__table__
+    statement = pg_insert(table).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.section],
+        set_={column: statement.excluded[column] for column in ('data_key', 'frame', 'metrics', 'built_at')},
+    )
+    with session_scope() as session:
+        session.execute(statement)
+
+    logging.info(f"Снимок главной страницы пересчитан ({key}) за {time.perf_counter() - started:.2f} с")
+    return key
+
+
+def _stored_key():
+    """Ключ сохраненного снимка или None, если снимка нет или его разделы построены для разных ключей."""
+    with session_scope() as session:
+        rows = session.execute(select(DashboardSnapshot.section, DashboardSnapshot.data_key)).all()
+    keys = {row.data_key for row in rows}
+    if {row.section for row in rows} != set(TABLE_SECTIONS + CHART_SECTIONS) or len(keys) != 1:
+        return None
+    return keys.pop()
+
+
+class _SnapshotMissing(LookupError):
+    """В dashboard_snapshot нет полного снимка для ключа (результат не кешируется)."""
+
+
+def _select_sections(rows) -> dict:
+    """
+    Разделы снимка из строк dashboard_snapshot (section, frame, metrics) одного ключа
+    или None, если каких-то разделов TABLE_SECTIONS + CHART_SECTIONS нет.
+    """
+    rows = {row.section: row for row in rows}
+    if set(rows) != set(TABLE_SECTIONS + CHART_SECTIONS):
+        return None
+    return {section: {'frame': _from_ipc(row.frame), 'metrics': row.metrics} for section, row in rows.items()}
+
+
+@bounded_cache(max_bytes=32 * 2 ** 20)
+def _load_sections(key: str) -> dict:
+    """
+    Разделы сохраненного снимка для ключа key. Если другой процесс уже заменил снимок
+    (или еще не дописал его), возникает _SnapshotMissing и в кеш ничего не попадает.
+    """
+    with session_scope() as session:
+        rows = session.execute(
+            select(DashboardSnapshot.section, DashboardSnapshot.frame, DashboardSnapshot.metrics)
+            .where(DashboardSnapshot.data_key == key)
+        ).all()
+    sections = _select_sections(rows)
+    if sections is None:
+        raise _SnapshotMissing(key)
+    return sections
+
+
+def _stored_sections(key: str):
+    """Разделы сохраненного снимка для ключа key или None, если его нужно пересчитать."""
+    try:
+        return _load_sections(key)
+    except _SnapshotMissing:
+        return None
+
+
+def get_dashboard() -> dict:
+    """
+    Снимок главной страницы для текущих данных: {раздел: {'frame': DataFrame, 'metrics': dict или None}}.
+    Обычно он уже построен фоновым пересчетом после изменения данных; если нет —
+    строится здесь (один поток процесса, остальные ждут его).
+    """
+    versions = get_versions('cars', 'profits')
+    key = dashboard_key(versions)
+    sections = _stored_sections(key)
+    if sections is None:
+        with _build_lock:
+            # Снимок мог построить другой поток, пока этот ждал блокировку
+            sections = _stored_sections(key)
+            if sections is None:
+                refresh_dashboard_snapshot(versions)
+                sections = _stored_sections(key)
+        if sections is None:
+            # Другой процесс успел сохранить снимок для новых данных: считаем разделы без сохранения
+            sections = build_dashboard(versions)
+
+    # Разделы из кеша общие для всех сессий: отдаем поверхностные копии DataFrame
+    return {
+        section: {'frame': value['frame'].copy(deep=False), 'metrics': value['metrics']}
+        for section, value in sections.items()
+    }
+
+
+def _refresh_job():
+    global _refresh_pending
+    with _refresh_lock:
+        _refresh_pending = False
+    try:
+        with _build_lock:
+            versions = get_versions('cars', 'profits')
+            if _stored_key() != dashboard_key(versions):
+                refresh_dashboard_snapshot(versions)
+    except Exception as e:
+        logging.error(f"Ошибка при пересчете снимка главной страницы: {e}")
+
+
+def schedule_dashboard_refresh(tables=None):
+    """
+    Ставит пересчет снимка в фоновую очередь процесса. Пока пересчет ждет в очереди,
+    повторные вызовы ничего не добавляют (несколько фиксаций подряд дают один пересчет).
+    """
+    global _refresh_pending
+    if tables is not None and not {'cars', 'profits'} & set(tables):
+        return
+    with _refresh_lock:
+        if _refresh_pending:
+            return
+        _refresh_pending = True
+    _executor.submit(_refresh_job)
+
+
+# Снимок пересчитывается после каждого импорта, удаления и редактирования, изменивших cars или profits
+on_version_commit(schedule_dashboard_refresh)
@@ -1,85 +1,116 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from database.models import Cars, Profits
-from database.db import SessionLocal
-from services.calculate import calculate_profit, calculate_xs, calculate_payback
+from sqlalchemy import select, update, delete
+from database.models import Cars, Profits, ProfitsStaging, Imports
+from database.db import session_scope, disable_statement_timeout
+from database.versions import bump_version
+from services.calculate import recalculate_profit_and_xs, refresh_latest_profits, rechain_change_amounts
+from services.import_ledger import list_imports, undo_cars_journal
+from services.compaction import restore_archived_snapshots
 
 def get_all_import_ids() -> list:
     """
-    Возвращает список всех уникальных import_id из таблиц Cars и Profits.
+    Возвращает список всех import_id из реестра imports.
 
-    :return: Список уникальных import_id
+    :return: Список import_id
     """
-    session: Session = SessionLocal()
-
     try:
-        # Получаем уникальные import_id из всех таблиц
-        cars_import_ids = session.query(Cars.import_id).distinct().all()
-        profits_import_ids = session.query(Profits.import_id).distinct().all()
-
-        # Объединяем результаты в один список и удаляем дубликаты
-        all_import_ids = set(
-            [id[0] for id in cars_import_ids] +
-            [id[0] for id in profits_import_ids]
-        )
-
-        return sorted(list(all_import_ids))
+        with session_scope() as session:
+            return list_imports(session)
 
     except Exception as e:
         print(f"Ошибка при получении import_id: {e}")
         return []
 
-    finally:
-        session.close()
-
 def delete_data_by_import_id(import_id: str) -> dict:
     """
-    Удаляет все данные, связанные с заданным import_id, из таблиц Cars и Profits.
-    Если удаляемый import_id является последним, пересчитывает значения в Cars.
+    Удаляет все данные, связанные с заданным import_id, из таблиц Cars и Profits,
+    и восстанавливает поля Cars, перезаписанные импортом, по журналу изменений
+    (кроме полей, которые позже изменил другой импорт или редактирование: они в 'fields_skipped').
+    Пересчет выполняется только для затронутых stockn: change_amount последующих
+    записей Profits, car_latest_profit, а также profit и xs в Cars.
+    Если снимки импорта попали в сжатый месяц, сначала из profits_archive восстанавливаются
+    все снимки этих машин за месяц, чтобы вместе с импортом не пропали снимки других импортов.
 
     :param import_id: Идентификатор импорта
-    :return: Словарь с количеством удалённых строк из каждой таблицы
+    :return: Словарь с количеством удалённых и пересчитанных строк
     """
-    session: Session = SessionLocal()
-
     try:
-        # Определяем, является ли удаляемый import_id последним
-        latest_import_id = session.query(Profits.import_id).order_by(Profits.date.desc()).first()
-        is_latest_import = (latest_import_id and latest_import_id[0] == import_id)
-
-        # Удаляем записи из таблицы Cars
-        deleted_cars = session.query(Cars).filter(Cars.import_id == import_id).delete()
-
-        # Удаляем записи из таблицы Profits
-        deleted_profits = session.query(Profits).filter(Profits.import_id == import_id).delete()
-
-        # Применяем изменения
-        session.commit()
-
-        # Если удалён последний импорт, пересчитываем значения в таблице Cars
-        if is_latest_import:
-            recalculate_cars_data(session)
-
-        return {
-            "cars_deleted": deleted_cars,
-            "profits_deleted": deleted_profits
-        }
+        with session_scope() as session:
+            # Пересчет цепочек и последних записей после удаления большого импорта идет дольше DB_STATEMENT_TIMEOUT_MS
+            disable_statement_timeout(session)
+
+            # Восстанавливаем значения машин, обновленных этим импортом
+            restored_stocknums, skipped_fields = undo_cars_journal(session, import_id)
+
+            # Удаляем записи из таблицы Cars
+            deleted_cars = session.execute(
+                delete(Cars)
+                .where(Cars.import_id == import_id)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+
+            # Возвращаем из архива снимки сжатых месяцев, в которых есть записи импорта
+            restored_profits = restore_archived_snapshots(session, import_id)
+
+            # Удаляем записи из таблицы Profits и запоминаем затронутые stockn и даты.
+            # Все записи импорта имеют его дату снимка: удаление затрагивает одну месячную секцию
+            # (у импортов, зарегистрированных задним числом, даты нет — просматриваются все секции)
+            delete_profits = delete(Profits).where(Profits.import_id == import_id)
+            snapshot_date = session.execute(select(Imports.snapshot_date).where(Imports.id == import_id)).scalar()
+            if snapshot_date is not None:
+                delete_profits = delete_profits.where(Profits.date == snapshot_date)
+            deleted_rows = session.execute(
+                delete_profits
+                .returning(Profits.stockn, Profits.date)
+                .execution_options(synchronize_session=False)
+            ).all()
+            deleted_profits = len(deleted_rows)
+
+            affected_stocknums = {row.stockn for row in deleted_rows}
+            rechained = 0
+            if affected_stocknums:
+                # Восстанавливаем цепочку change_amount для записей после удаленного снимка
+                deleted_dates = [row.date for row in deleted_rows if row.date is not None]
+                earliest_date = min(deleted_dates) if deleted_dates else None
+                rechained = rechain_change_amounts(session, affected_stocknums, since=earliest_date)
+                refresh_latest_profits(session, affected_stocknums)
+
+            # Пересчитываем profit и xs только для затронутых и восстановленных машин
+            affected_stocknums.update(restored_stocknums)
+            recalculate_profit_and_xs(session, affected_stocknums)
+
+            # Удаляем записи Profits незавершенного импорта и сам импорт из реестра
+            session.execute(delete(ProfitsStaging).where(ProfitsStaging.import_id == import_id))
+            session.execute(delete(Imports).where(Imports.id == import_id))
+            bump_version(session, 'cars', 'profits', 'imports')
+
+            return {
+                "cars_deleted": deleted_cars,
+                "profits_deleted": deleted_profits,
+                "cars_restored": len(restored_stocknums),
+                "profits_rechained": rechained,
+                "profits_unarchived": restored_profits,
+                "cars_recalculated": len(affected_stocknums),
+                # Поля, измененные после этого импорта, не восстанавливаются
+                "fields_skipped": skipped_fields
+            }
 
     except Exception as e:
-        session.rollback()
         print(f"Ошибка при удалении данных: {e}")
-        return {"cars_deleted": 0, "profits_deleted": 0}
-    finally:
-        session.close()
+        return {"cars_deleted": 0, "profits_deleted": 0, "cars_restored": 0, "profits_rechained": 0,
+                "profits_unarchived": 0, "cars_recalculated": 0, "fields_skipped": []}
 
-def recalculate_cars_data(session: Session):
+def recalculate_cars_data(session: Session) -> dict:
     """
     Пересчитывает значения profit, xs и payback в таблице Cars на основе оставшихся данных в Profits.
+    Выполняется набором UPDATE-запросов без загрузки машин в память.
     """
-    cars = session.query(Cars).all()
-    for car in cars:
-        # Рассчитываем значения на основе оставшихся записей в Profits
-        car.profit = calculate_profit(session, car.stockn, car.cost) if car.cost else None
-        car.xs = calculate_xs(session, car.stockn, car.cost) if car.cost else None
-        car.payback = calculate_payback(car.breakevendate, car.inventoried) if car.inventoried and car.breakevendate else None
+    result = recalculate_profit_and_xs(session)
+    session.execute(
+        update(Cars)
+        .values(payback=Cars.breakevendate - Cars.inventoried)
+        .execution_options(synchronize_session=False)
+    )
+    bump_version(session, 'cars')
     session.commit()
+    return result
@@ -0,0 +1,182 @@
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import select, update, func, or_, text
+
+from database.db import session_scope, engine
+from database.models import ImportJobs
+from services.import_service import import_data_from_excel, DEFAULT_COMMIT_ROWS
+
+# Ключ рекомендательной блокировки PostgreSQL: импорты в одну базу выполняются по одному,
+# даже если Streamlit запущен в нескольких процессах
+IMPORT_LOCK_KEY = 10300
+
+# Один рабочий поток на процесс: задачи процесса выполняются по очереди
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='import-job')
+_resumed = False
+
+
+def _update_job(job_id: int, **fields):
+    """Сохраняет состояние задачи отдельной короткой транзакцией, чтобы страница сразу его видела."""
+    with session_scope() as session:
+        session.execute(update(ImportJobs).where(ImportJobs.id == job_id).values(**fields))
+
+
+def _claim_job(job_id: int):
+    """Переводит задачу из очереди в работу. Возвращает задачу или None, если ее уже взяли."""
+    with session_scope() as session:
+        return session.execute(
+            update(ImportJobs)
+            .where(ImportJobs.id == job_id, ImportJobs.status == 'queued')
+            .values(status='running', phase='parse', progress=0.0, started_at=datetime.now())
+            .returning(ImportJobs.file_name, ImportJobs.content, ImportJobs.snapshot_date,
+                       ImportJobs.color_mileage_engine, ImportJobs.force)
+        ).first()
+
+
+def _make_progress(job_id: int):
+    """Функция progress(phase, rows_done, rows_total) для import_data_from_excel."""
+    def progress(phase, rows_done, rows_total):
+        fields = {'phase': phase}
+        if rows_done is not None and rows_total:
+            fields['progress'] = min(rows_done / rows_total, 1.0)
+            fields['message'] = f"Обработано строк: {rows_done} из {rows_total}"
+        if phase == 'recompute':
+            fields['progress'] = 1.0
+        _update_job(job_id, **fields)
+    return progress
+
+
+def _execute_job(job_id: int):
+    """Выполняет задачу из очереди (вызывается под блокировкой IMPORT_LOCK_KEY)."""
+    job = _claim_job(job_id)
+    if job is None:
+        return
+
+    result = import_data_from_excel(
+        io.BytesIO(job.content),
+        job.snapshot_date.strftime('%Y-%m-%d'),
+        bool(job.color_mileage_engine),
+        file_name=job.file_name,
+        progress=_make_progress(job_id),
+        force=bool(job.force),
+        commit_rows=DEFAULT_COMMIT_ROWS,
+    )
+    _update_job(
+        job_id,
+        status='failed' if result.get('error') else 'done',
+        message=result.get('error'),
+        import_id=result.get('import_id'),
+        result=result,
+        content=None,
+        finished_at=datetime.now(),
+    )
+
+
+def _run_job(job_id: int):
+    """
+    Выполняет задачу импорта под рекомендательной блокировкой базы данных.
+    Импорт фиксируется пакетами по DEFAULT_COMMIT_ROWS строк, поэтому задача,
+    прерванная перезапуском, продолжается с контрольной точки.
+    Ошибка на любом шаге, включая ожидание блокировки, отмечает задачу как failed.
+    """
+    try:
+        with engine.connect() as lock_connection:
+            # Задача может ждать импорт другого процесса дольше DB_STATEMENT_TIMEOUT_MS, поэтому
+            # ожидание блокировки не ограничено. Блокировка сеансовая: транзакция фиксируется сразу
+            # после ее получения, и соединение не остается «idle in transaction» на время импорта
+            with lock_connection.begin():
+                lock_connection.execute(text("SET LOCAL statement_timeout = 0"))
+                lock_connection.execute(select(func.pg_advisory_lock(IMPORT_LOCK_KEY)))
+            try:
+                _execute_job(job_id)
+            finally:
+                lock_connection.execute(select(func.pg_advisory_unlock(IMPORT_LOCK_KEY)))
+                lock_connection.commit()
+    except Exception as e:
+        logging.error(f"Ошибка в задаче импорта {job_id}: {e}")
+        _update_job(job_id, status='failed', message=str(e), content=None, finished_at=datetime.now())
+
+
+def submit_import_job(content: bytes, file_name: str, selected_date, color_mileage_engine: bool = False,
+                      force: bool = False) -> int:
+    """
+    Ставит импорт в очередь: сохраняет файл и параметры в import_jobs и запускает
+    выполнение в фоновом потоке. Возвращает id задачи.
+    """
+    resume_pending_jobs()
+    with session_scope() as session:
+        job = ImportJobs(
+            status='queued',
+            phase=None,
+            progress=0.0,
+            file_name=file_name,
+            content=content,
+            snapshot_date=selected_date,
+            color_mileage_engine=color_mileage_engine,
+            force=force,
+            created_at=datetime.now(),
+        )
+        session.add(job)
+        session.flush()
+        job_id = job.id
+
+    _executor.submit(_run_job, job_id)
+    return job_id
+
+
+def resume_pending_jobs():
+    """
+    Один раз на процесс возвращает в очередь задачи, прерванные перезапуском сервера
+    (транзакция такой задачи уже откатилась), и запускает все задачи из очереди.
+    """
+    global _resumed
+    if _resumed:
+        return
+    _resumed = True
+
+    with engine.connect() as connection:
+        # Если блокировку удалось взять, ни один процесс сейчас не выполняет импорт
+        if not connection.execute(select(func.pg_try_advisory_lock(IMPORT_LOCK_KEY))).scalar():
+            return
+        try:
+            with session_scope() as session:
+                session.execute(
+                    update(ImportJobs)
+                    .where(ImportJobs.status == 'running')
+                    .values(status='queued', phase=None, progress=0.0, message='Возобновлено после перезапуска')
+                )
+                queued = session.execute(
+                    select(ImportJobs.id).where(ImportJobs.status == 'queued').order_by(ImportJobs.id)
+                ).scalars().all()
+        finally:
+            connection.execute(select(func.pg_advisory_unlock(IMPORT_LOCK_KEY)))
+            connection.commit()
+
+    for job_id in queued:
+        _executor.submit(_run_job, job_id)
+
+
+def get_recent_jobs(limit: int = 10) -> list:
+    """Возвращает последние задачи импорта (без содержимого файлов)."""
+    with session_scope() as session:
+        return session.execute(
+            select(
+                ImportJobs.id, ImportJobs.status, ImportJobs.phase, ImportJobs.progress,
+                ImportJobs.message, ImportJobs.file_name, ImportJobs.snapshot_date,
+                ImportJobs.result, ImportJobs.created_at, ImportJobs.finished_at
+            )
+            .order_by(ImportJobs.id.desc())
+            .limit(limit)
+        ).all()
+
+
+def has_active_jobs() -> bool:
+    """Есть ли задачи в очереди или в работе."""
+    with session_scope() as session:
+        return bool(session.execute(
+            select(func.count()).select_from(ImportJobs)
+            .where(or_(ImportJobs.status == 'queued', ImportJobs.status == 'running'))
+        ).scalar())
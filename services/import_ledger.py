@@ -0,0 +1,226 @@
+from datetime import date, datetime
+import pandas as pd
+from sqlalchemy import select, insert, update, delete, union
+from sqlalchemy.orm import Session
+from database.models import Cars, Profits, Imports, ImportChanges
+
+# Поля Cars с датами (в журнале хранятся в формате ISO)
+DATE_FIELDS = {'inventoried', 'breakevendate', 'dismantled', 'purchesdate'}
+
+# Нет записанного значения: запись журнала сделана до появления 'after'
+_missing = object()
+
+
+def _to_json_value(value):
+    """Приводит значение к виду, который можно сохранить в JSON."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()[:10]
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def _from_json_value(field, value):
+    """Восстанавливает значение поля Cars из журнала."""
+    if value is not None and field in DATE_FIELDS:
+        return date.fromisoformat(value)
+    return value
+
+
+def register_import(session: Session, import_id: str, **fields):
+    """Добавляет запись об импорте в реестр imports (по умолчанию со статусом 'done')."""
+    fields.setdefault('status', 'done')
+    session.execute(insert(Imports).values(id=import_id, imported_at=datetime.now(), **fields))
+
+
+def find_unfinished_import(session: Session, file_hash: str, import_type: str, snapshot_date=None):
+    """
+    Ищет прерванный импорт того же файла с промежуточными коммитами (status='running').
+    Возвращает запись реестра с контрольной точкой rows_done или None.
+    """
+    query = (
+        select(Imports)
+        .where(Imports.file_hash == file_hash, Imports.import_type == import_type, Imports.status == 'running')
+        .order_by(Imports.imported_at.desc())
+        .limit(1)
+    )
+    if snapshot_date is not None:
+        query = query.where(Imports.snapshot_date == snapshot_date)
+    return session.execute(query).scalar()
+
+
+def checkpoint_import(session: Session, import_id: str, **fields):
+    """Обновляет контрольную точку и счетчики импорта в реестре."""
+    session.execute(update(Imports).where(Imports.id == import_id).values(**fields))
+
+
+def import_stocknums(session: Session, import_id: str) -> list:
+    """stockn машин, добавленных или измененных импортом (по Cars и журналу изменений)."""
+    return list(session.execute(
+        union(
+            select(Cars.stockn).where(Cars.import_id == import_id),
+            select(ImportChanges.stockn).where(ImportChanges.import_id == import_id)
+        )
+    ).scalars())
+
+
+def build_cars_journal(updates: pd.DataFrame, existing: pd.DataFrame, fields: list, import_id: str) -> list:
+    """
+    Сравнивает новые значения обновляемых машин с текущими и возвращает записи журнала
+    с прежними ('before') и записанными импортом ('after') значениями только тех полей,
+    которые действительно меняются.
+    """
+    if updates.empty:
+        return []
+
+    before = existing.set_index('id').loc[updates['id'], fields].reset_index(drop=True)
+    after = updates[fields].reset_index(drop=True)
+
+    changed = pd.DataFrame({
+        field: ~(
+            after[field].eq(before[field]).fillna(False).astype(bool)
+            | (after[field].isna() & before[field].isna())
+        )
+        for field in fields
+    })
+    changed_rows = changed.any(axis=1)
+    if not changed_rows.any():
+        return []
+
+    journal = []
+    ids = updates['id'].reset_index(drop=True)[changed_rows].tolist()
+    stocknums = updates['stockn'].reset_index(drop=True)[changed_rows].tolist()
+    for car_id, stockn, mask, values, new_values in zip(
+        ids,
+        stocknums,
+        changed[changed_rows].to_dict(orient='records'),
+        before[changed_rows].astype(object).to_dict(orient='records'),
+        after[changed_rows].astype(object).to_dict(orient='records')
+    ):
+        fields_changed = [field for field, is_changed in mask.items() if is_changed]
+        journal.append({
+            'import_id': import_id,
+            'car_id': car_id,
+            'stockn': stockn,
+            'before': {field: _to_json_value(values[field]) for field in fields_changed},
+            'after': {field: _to_json_value(new_values[field]) for field in fields_changed},
+        })
+    return journal
+
+
+def write_cars_journal(session: Session, journal: list):
+    """Пакетно сохраняет записи журнала изменений."""
+    if journal:
+        session.execute(insert(ImportChanges), journal)
+
+
+def undo_cars_journal(session: Session, import_id: str) -> tuple:
+    """
+    Восстанавливает поля Cars, перезаписанные импортом, по журналу изменений
+    и удаляет журнал этого импорта.
+
+    Поле восстанавливается, только если в нем все еще значение, записанное этим импортом:
+    если позже его изменил другой импорт или редактирование, поле остается как есть
+    и попадает в список пропущенных. У записей журнала без 'after' (сделанных до его
+    появления) поля восстанавливаются без проверки.
+
+    :return: stockn затронутых машин и список пропущенных полей {'stockn', 'field'}
+    """
+    entries = session.execute(
+        select(ImportChanges.car_id, ImportChanges.stockn, ImportChanges.before, ImportChanges.after)
+        .where(ImportChanges.import_id == import_id)
+        .order_by(ImportChanges.id.desc())
+    ).all()
+
+    # Для каждого поля: значение до первой записи импорта и значение после последней
+    # (записи идут от последней к первой)
+    planned = {}
+    for entry in entries:
+        fields = planned.setdefault(entry.car_id, {'stockn': entry.stockn, 'fields': {}})['fields']
+        for field, value in (entry.before or {}).items():
+            if field in fields:
+                written = fields[field][1]
+            else:
+                written = _missing if entry.after is None else entry.after.get(field, _missing)
+            fields[field] = (_from_json_value(field, value), written)
+
+    rows, skipped = [], []
+    if planned:
+        current = {
+            car.id: car for car in session.execute(
+                select(Cars).where(Cars.id.in_(list(planned)))
+            ).scalars()
+        }
+        for car_id, plan in planned.items():
+            car = current.get(car_id)
+            if car is None:
+                continue
+            row = {'id': car_id}
+            for field, (before, written) in plan['fields'].items():
+                if written is _missing or _to_json_value(getattr(car, field)) == written:
+                    row[field] = before
+                else:
+                    skipped.append({'stockn': plan['stockn'], 'field': field})
+            if len(row) > 1:
+                rows.append(row)
+        if rows:
+            session.execute(update(Cars), rows)
+            # Пересчитываем производные поля по восстановленным датам
+            session.execute(
+                update(Cars)
+                .where(Cars.id.in_([row['id'] for row in rows]))
+                .values(
+                    age=date.today() - Cars.inventoried,
+                    payback=Cars.breakevendate - Cars.inventoried,
+                    # Восстановленные значения не совпадают с последним файлом
+                    fingerprint=None,
+                    cme_fingerprint=None
+                )
+                .execution_options(synchronize_session=False)
+            )
+
+    session.execute(delete(ImportChanges).where(ImportChanges.import_id == import_id))
+    return sorted({entry.stockn for entry in entries}), skipped
+
+
+def find_duplicate_import(session: Session, file_hash: str, import_type: str, snapshot_date=None):
+    """
+    Ищет в реестре завершенный импорт того же файла (по sha256 содержимого)
+    того же типа и на ту же дату снимка. Возвращает его import_id или None.
+    """
+    query = (
+        select(Imports.id)
+        .where(Imports.file_hash == file_hash, Imports.import_type == import_type, Imports.status == 'done')
+        .order_by(Imports.imported_at.desc())
+        .limit(1)
+    )
+    if snapshot_date is not None:
+        query = query.where(Imports.snapshot_date == snapshot_date)
+    return session.execute(query).scalar()
+
+
+def list_imports(session: Session) -> list:
+    """Возвращает import_id из реестра imports в порядке возрастания."""
+    return list(session.execute(select(Imports.id).order_by(Imports.id)).scalars())
+
+
+def backfill_import_registry(session: Session) -> int:
+    """
+    Добавляет в реестр импорты, созданные до его появления (однократный проход по Cars и Profits).
+
+    :return: Количество добавленных записей
+    """
+    known = set(list_imports(session))
+    import_ids = session.execute(
+        union(
+            select(Cars.import_id).where(Cars.import_id.isnot(None)),
+            select(Profits.import_id).where(Profits.import_id.isnot(None))
+        )
+    ).scalars().all()
+
+    missing = [import_id for import_id in import_ids if import_id not in known]
+    if missing:
+        session.execute(insert(Imports), [{'id': import_id, 'status': 'legacy'} for import_id in missing])
+    return len(missing)
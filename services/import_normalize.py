@@ -0,0 +1,242 @@
+import time
+import pandas as pd
+from services.import_readers import read_import_chunks, DEFAULT_CHUNK_ROWS
+
+# Столбцы инвентарного файла (после приведения к нижнему регистру) -> поля типизированного DataFrame
+INVENTORY_COLUMNS = {
+    'vstockno': 'stockn',
+    'manufacturer': 'make',
+    'modelname': 'model',
+    'modelyear': 'year',
+    'cost': 'cost',
+    'inventoried': 'inventoried',
+    'purchesdate': 'purchesdate',
+    'breakevendate': 'breakevendate',
+    'dismantled': 'dismantled',
+    'color': 'color',
+    'engine': 'engine',
+    'sales': 'sales',
+}
+
+# Столбцы второго типа файла (color, mileage, engine) -> поля типизированного DataFrame
+COLOR_MILEAGE_ENGINE_COLUMNS = {
+    'Stock #': 'stockn',
+    'Color': 'color',
+    'Engine': 'engine',
+}
+
+DATE_FIELDS = ['inventoried', 'purchesdate', 'breakevendate', 'dismantled']
+INTEGER_FIELDS = ['stockn', 'year']
+FLOAT_FIELDS = ['cost', 'sales']
+STRING_FIELDS = ['make', 'model', 'color', 'engine']
+
+# Сколько примеров отклоненных значений сохранять в отчете по каждому столбцу
+REPORT_EXAMPLES = 5
+
+
+class ImportValidationError(ValueError):
+    """Файл импорта не может быть обработан (например, нет обязательного столбца)."""
+
+
+def _empty(index) -> pd.Series:
+    return pd.Series(None, index=index, dtype=object)
+
+
+def _is_blank(raw: pd.Series) -> pd.Series:
+    """Пустые значения: NaN/None и строки из одних пробелов."""
+    return raw.isna() | raw.astype('string').str.strip().eq('').fillna(False)
+
+
+def _reject(report: dict, column: str, raw: pd.Series, rejected: pd.Series):
+    """Добавляет в отчет значения, которые не удалось преобразовать."""
+    count = int(rejected.sum())
+    if count:
+        report[column] = {
+            'rejected': count,
+            'examples': raw[rejected].astype(str).unique()[:REPORT_EXAMPLES].tolist(),
+        }
+
+
+def clean_milage(raw: pd.Series) -> pd.Series:
+    """
+    Пробег числом (float). Числа берутся как есть, из строк удаляются все нецифровые символы
+    ('12,345 mi' -> 12345). Числа не переводятся в строку: 12345.0 дало бы '123450'.
+    """
+    if pd.api.types.is_numeric_dtype(raw):
+        return pd.to_numeric(raw, errors='coerce').astype('float64')
+
+    is_text = raw.map(lambda value: isinstance(value, str)).astype(bool)
+    milage = pd.to_numeric(raw.mask(is_text), errors='coerce').astype('float64')
+    if is_text.any():
+        digits = raw[is_text].astype('string').str.replace(r'\D', '', regex=True)
+        milage[is_text] = pd.to_numeric(digits.replace('', pd.NA), errors='coerce').astype('float64')
+    return milage
+
+
+def _location_part(raw: pd.Series) -> pd.Series:
+    """Строка для части location: целые числа без '.0' (10.0 -> '10'), остальное как есть."""
+    numeric = pd.to_numeric(raw, errors='coerce')
+    is_integer = numeric.notna() & (numeric % 1 == 0)
+    text = raw.astype('string').str.strip()
+    text = text.mask(is_integer, numeric.where(is_integer).astype('Int64').astype('string'))
+    return text.fillna('')
+
+
+def create_location(bin_values: pd.Series, xcoord_values: pd.Series) -> pd.Series:
+    """Создает location вида 'bin.xcoord' (или одна из частей, если другая пустая)."""
+    bin_part = _location_part(bin_values)
+    xcoord_part = _location_part(xcoord_values)
+    both = bin_part.ne('') & xcoord_part.ne('')
+    location = (bin_part + '.' + xcoord_part).where(both, bin_part + xcoord_part)
+    return location.replace('', pd.NA).astype(object).where(lambda s: s.notna(), None)
+
+
+def _parse_dates(raw: pd.Series) -> pd.Series:
+    """
+    Преобразует столбец в datetime64 (день первым). Значения, которые не подошли
+    под формат, определенный по первым строкам, разбираются повторно по отдельности.
+    """
+    parsed = pd.to_datetime(raw, errors='coerce', dayfirst=True)
+    retry = parsed.isna() & ~_is_blank(raw)
+    if retry.any():
+        parsed[retry] = pd.to_datetime(raw[retry], errors='coerce', dayfirst=True, format='mixed')
+    return parsed
+
+
+def _stockn_column(color_mileage_engine: bool) -> str:
+    return 'Stock #' if color_mileage_engine else 'vstockno'
+
+
+def _no_valid_rows_error(color_mileage_engine: bool) -> ImportValidationError:
+    return ImportValidationError(
+        f"Ни в одной строке файла нет корректного значения '{_stockn_column(color_mileage_engine)}'."
+    )
+
+
+def normalize_import_frame(raw: pd.DataFrame, color_mileage_engine: bool = False) -> tuple:
+    """
+    Преобразует сырой лист файла импорта в типизированный DataFrame за один проход:
+    числа, даты, пробег и location приводятся векторными операциями pandas.
+
+    Блок может остаться пустым (например, только строки итогов в конце файла): файл целиком
+    проверяют validate_import_file и parse_import_file.
+
+    :return: (DataFrame с полями stockn, make, model, ..., отчет об отклоненных значениях)
+    """
+    report = {}
+    stockn_column = _stockn_column(color_mileage_engine)
+    if not color_mileage_engine:
+        # Приводим названия столбцов к нижнему регистру и удаляем пробелы
+        raw = raw.rename(columns=lambda c: str(c).strip().lower())
+        raw = raw.rename(columns={'purchasedate': 'purchesdate'})
+        columns = INVENTORY_COLUMNS
+        milage_column = 'odo reading'
+    else:
+        columns = COLOR_MILEAGE_ENGINE_COLUMNS
+        milage_column = 'Odo Reading'
+
+    if stockn_column not in raw.columns:
+        raise ImportValidationError(
+            f"В файле нет обязательного столбца '{stockn_column}'. Найдены столбцы: {raw.columns.tolist()}"
+        )
+
+    typed = pd.DataFrame(index=raw.index)
+    for source, field in columns.items():
+        values = raw[source] if source in raw.columns else _empty(raw.index)
+        blank = _is_blank(values)
+
+        if field in INTEGER_FIELDS or field in FLOAT_FIELDS:
+            converted = pd.to_numeric(values.where(~blank), errors='coerce')
+            if field in INTEGER_FIELDS:
+                fractional = converted.notna() & (converted % 1 != 0)
+                converted = converted.where(~fractional).round().astype('Int64')
+            else:
+                converted = converted.astype('float64')
+        elif field in DATE_FIELDS:
+            converted = _parse_dates(values.where(~blank))
+        else:
+            converted = values.where(~blank).astype(object).where(lambda s: s.notna(), None)
+
+        _reject(report, source, values, converted.isna() & ~blank)
+        typed[field] = converted
+
+    milage = raw[milage_column] if milage_column in raw.columns else _empty(raw.index)
+    typed['milage'] = clean_milage(milage)
+    _reject(report, milage_column, milage, typed['milage'].isna() & ~_is_blank(milage))
+
+    if not color_mileage_engine:
+        typed['location'] = create_location(
+            raw['bin'] if 'bin' in raw.columns else _empty(raw.index),
+            raw['xcoord'] if 'xcoord' in raw.columns else _empty(raw.index),
+        )
+
+    # Строки без stockn не могут быть сопоставлены с машинами
+    missing_stockn = typed['stockn'].isna()
+    if missing_stockn.any():
+        report.setdefault(stockn_column, {'rejected': 0, 'examples': []})
+        report[stockn_column]['missing'] = int(missing_stockn.sum())
+        typed = typed[~missing_stockn]
+
+    typed['stockn'] = typed['stockn'].astype('int64')
+    return typed.reset_index(drop=True), report
+
+
+def merge_reports(total: dict, report: dict) -> dict:
+    """Объединяет отчеты об отклоненных значениях нескольких блоков файла."""
+    for column, entry in report.items():
+        current = total.setdefault(column, {'rejected': 0, 'examples': []})
+        current['rejected'] += entry.get('rejected', 0)
+        if 'missing' in entry:
+            current['missing'] = current.get('missing', 0) + entry['missing']
+        for example in entry.get('examples', []):
+            if example not in current['examples'] and len(current['examples']) < REPORT_EXAMPLES:
+                current['examples'].append(example)
+    return total
+
+
+def validate_import_file(content: bytes, file_name: str, color_mileage_engine: bool = False,
+                         chunk_rows: int = DEFAULT_CHUNK_ROWS):
+    """
+    Проверяет файл до записи в базу: заголовки по первому блоку и наличие хотя бы одной строки
+    с корректным stockn. Обычно достаточно первого блока; следующие блоки читаются, только если
+    в предыдущих корректных строк нет. Пустой файл ошибкой не считается.
+
+    :raises ImportValidationError: нет обязательного столбца или ни одной корректной строки
+    """
+    rows_read = 0
+    for chunk in read_import_chunks(content, file_name, chunk_rows):
+        rows_read += len(chunk)
+        typed, _ = normalize_import_frame(chunk, color_mileage_engine)
+        if not typed.empty:
+            return
+    if rows_read:
+        raise _no_valid_rows_error(color_mileage_engine)
+
+
+def parse_import_file(content: bytes, file_name: str, color_mileage_engine: bool = False,
+                      chunk_rows: int = DEFAULT_CHUNK_ROWS) -> dict:
+    """
+    Читает и нормализует файл импорта целиком. Не обращается к базе данных,
+    поэтому может выполняться в отдельном процессе (пакетный импорт).
+
+    :return: Словарь с типизированным DataFrame, отчетом, числом строк и временем разбора
+    """
+    started = time.perf_counter()
+    frames = []
+    report = {}
+    rows_read = 0
+    for chunk in read_import_chunks(content, file_name, chunk_rows):
+        rows_read += len(chunk)
+        typed, chunk_report = normalize_import_frame(chunk, color_mileage_engine)
+        merge_reports(report, chunk_report)
+        frames.append(typed)
+
+    typed = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if rows_read and typed.empty:
+        raise _no_valid_rows_error(color_mileage_engine)
+    return {
+        'typed': typed,
+        'rejected': report,
+        'rows_read': rows_read,
+        'parse_seconds': round(time.perf_counter() - started, 3),
+    }
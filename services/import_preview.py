@@ -0,0 +1,190 @@
+import time
+import hashlib
+import logging
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import select, func
+
+from database.db import session_scope, engine, disable_statement_timeout
+from database.partitions import prepare_profits_partitions
+from database.versions import bump_version, get_versions
+from database.models import Profits
+from services.calculate import recalculate_profit_and_xs
+from services.import_jobs import IMPORT_LOCK_KEY
+from services.import_ledger import register_import, find_duplicate_import
+from services.import_normalize import parse_import_file
+from services.import_readers import DEFAULT_CHUNK_ROWS
+from services.import_service import plan_import_chunk, write_import_chunk, read_file_bytes
+
+# Сколько строк показывать в примерах предпросмотра
+PREVIEW_SAMPLE_ROWS = 20
+
+
+# Таблицы, по версиям которых проверяется, что план не устарел: их меняют импорты, удаление,
+# редактирование в таблицах, контрольные точки импорта по частям, update_db и сжатие
+PLAN_TABLES = ('cars', 'profits')
+
+
+def _summarize(plan: dict, existing_profits: int) -> dict:
+    """Итоговые счетчики плана импорта."""
+    fields_changed = {}
+    for entry in plan['journal']:
+        for field in entry['before']:
+            fields_changed[field] = fields_changed.get(field, 0) + 1
+
+    snapshot = plan['snapshot']
+    return {
+        'cars_added': len(plan['inserts']),
+        'cars_updated': len(plan['updates']),
+        'cars_unchanged': plan['unchanged'],
+        'fields_changed': fields_changed,
+        'profits_added': 0 if snapshot is None else len(snapshot),
+        'profits_existing': existing_profits,
+        'profits_decreased': 0 if snapshot is None else int((snapshot['change_amount'] < 0).sum()),
+    }
+
+
+def _samples(plan: dict) -> dict:
+    """Примеры изменений для отображения: новые машины, измененные поля, уменьшения cumulative_amount."""
+    inserts = plan['inserts']
+    new_cars = inserts[[c for c in ['stockn', 'make', 'model', 'year', 'cost', 'inventoried'] if c in inserts.columns]]
+
+    after = plan['updates'].set_index('id')
+    changes = [
+        {'stockn': entry['stockn'], 'Поле': field, 'Было': before, 'Станет': after.at[entry['car_id'], field]}
+        for entry in plan['journal'][:PREVIEW_SAMPLE_ROWS]
+        for field, before in entry['before'].items()
+    ]
+
+    samples = {
+        'new_cars': new_cars.head(PREVIEW_SAMPLE_ROWS),
+        'changed_fields': pd.DataFrame(changes, columns=['stockn', 'Поле', 'Было', 'Станет']),
+        'decreased': pd.DataFrame(),
+    }
+    snapshot = plan['snapshot']
+    if snapshot is not None:
+        decreased = snapshot[snapshot['change_amount'] < 0]
+        samples['decreased'] = pd.DataFrame({
+            'stockn': decreased['stockn'],
+            'Было': decreased['cumulative_amount'] - decreased['change_amount'],
+            'Станет': decreased['cumulative_amount'],
+        }).head(PREVIEW_SAMPLE_ROWS)
+    return samples
+
+
+def preview_import(file, selected_date, color_mileage_engine: bool = False, file_name: str = None,
+                   chunk_rows: int = DEFAULT_CHUNK_ROWS) -> dict:
+    """
+    Пробный импорт: вычисляет все изменения файла без записи в базу.
+    Нормализованный лист объединяется с машинами и последними записями Profits,
+    загруженными пакетными запросами, поэтому запросов на отдельные строки нет.
+
+    :return: Словарь с планом ('plan'), счетчиками ('summary'), примерами ('samples')
+             и отчетом об отклоненных значениях; план применяется функцией apply_import_plan
+    """
+    try:
+        # Версии берутся до чтения данных: любая запись после этого сделает план устаревшим
+        versions = get_versions(*PLAN_TABLES)
+        with session_scope() as session:
+            content = read_file_bytes(file)
+            file_name = file_name or getattr(file, 'name', str(file))
+            if isinstance(selected_date, str):
+                selected_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
+
+            parsed = parse_import_file(content, file_name, color_mileage_engine, chunk_rows)
+            if parsed['rows_read'] == 0:
+                return {"error": "Файл пустой."}
+
+            file_hash = hashlib.sha256(content).hexdigest()
+            import_type = 'color_mileage_engine' if color_mileage_engine else 'inventory'
+            import_id = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            plan = plan_import_chunk(session, parsed['typed'], import_id, selected_date, color_mileage_engine)
+
+            # Записи Profits на эту дату, которые уже есть в базе, добавлены не будут
+            existing_profits = 0
+            snapshot = plan['snapshot']
+            if snapshot is not None and not snapshot.empty:
+                existing = set(session.execute(
+                    select(Profits.stockn)
+                    .where(Profits.date == selected_date, Profits.stockn.in_(snapshot['stockn'].tolist()))
+                ).scalars())
+                existing_profits = len(existing)
+                plan['snapshot'] = snapshot[~snapshot['stockn'].isin(existing)]
+
+            return {
+                "import_id": import_id,
+                "file_name": file_name,
+                "file_hash": file_hash,
+                "import_type": import_type,
+                "selected_date": selected_date,
+                "color_mileage_engine": color_mileage_engine,
+                "duplicate_of": find_duplicate_import(
+                    session, file_hash, import_type, None if color_mileage_engine else selected_date
+                ),
+                "versions": versions,
+                "parse_seconds": parsed['parse_seconds'],
+                "plan": plan,
+                "summary": _summarize(plan, existing_profits),
+                "samples": _samples(plan),
+                "rejected": parsed['rejected'],
+            }
+
+    except Exception as e:
+        logging.error(f"Ошибка при предпросмотре импорта: {e}")
+        return {"error": str(e)}
+
+
+def apply_import_plan(preview: dict) -> dict:
+    """
+    Применяет план, вычисленный preview_import, без повторного чтения файла и сравнения.
+    Если после предпросмотра изменились версии данных cars или profits (импорт, удаление,
+    редактирование, сжатие), план и журнал изменений считаются устаревшими и не применяются.
+    """
+    try:
+        if not preview['color_mileage_engine']:
+            # Секцию месяца создаем до транзакции импорта, чтобы не держать блокировку profits
+            prepare_profits_partitions(engine, [preview['selected_date']])
+
+        with session_scope() as session:
+            # Не применяем план параллельно с фоновым импортом
+            if not session.execute(select(func.pg_try_advisory_xact_lock(IMPORT_LOCK_KEY))).scalar():
+                return {"cars_added": 0, "cars_updated": 0, "profits_added": 0,
+                        "error": "Выполняется другой импорт, повторите позже."}
+            disable_statement_timeout(session)
+            if get_versions(*PLAN_TABLES) != preview['versions']:
+                return {"cars_added": 0, "cars_updated": 0, "profits_added": 0,
+                        "error": "После предпросмотра данные изменились, выполните предпросмотр заново."}
+
+            started = time.perf_counter()
+            result = write_import_chunk(session, preview['plan'])
+            if not preview['color_mileage_engine']:
+                recalculate_profit_and_xs(session, result['stocknums'])
+
+            register_import(
+                session,
+                preview['import_id'],
+                file_name=preview['file_name'],
+                file_hash=preview['file_hash'],
+                import_type=preview['import_type'],
+                snapshot_date=None if preview['color_mileage_engine'] else preview['selected_date'],
+                cars_added=result['cars_added'],
+                cars_updated=result['cars_updated'],
+                profits_added=result['profits_added'],
+                parse_seconds=preview['parse_seconds'],
+                write_seconds=round(time.perf_counter() - started, 3),
+            )
+            bump_version(session, 'cars', 'imports', *([] if preview['color_mileage_engine'] else ['profits']))
+
+            return {
+                "import_id": preview['import_id'],
+                "cars_added": result['cars_added'],
+                "cars_updated": result['cars_updated'],
+                "cars_unchanged": result['cars_unchanged'],
+                "profits_added": result['profits_added'],
+                "rejected": preview['rejected'],
+            }
+
+    except Exception as e:
+        logging.error(f"Ошибка при применении плана импорта: {e}")
+        return {"cars_added": 0, "cars_updated": 0, "profits_added": 0, "error": str(e)}
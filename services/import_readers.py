@@ -0,0 +1,115 @@
+import io
+import os
+from itertools import islice
+import pandas as pd
+
+# Количество строк в одном блоке при потоковом чтении файла импорта
+DEFAULT_CHUNK_ROWS = 5000
+
+# Поддерживаемые форматы файлов импорта
+SUPPORTED_FORMATS = ('xlsx', 'csv', 'parquet')
+
+
+def detect_format(file_name: str) -> str:
+    """Определяет формат файла импорта по расширению (по умолчанию xlsx)."""
+    extension = os.path.splitext(file_name or '')[1].lower().lstrip('.')
+    if extension in ('csv', 'txt'):
+        return 'csv'
+    if extension in ('parquet', 'pq'):
+        return 'parquet'
+    return 'xlsx'
+
+
+def _header_names(values) -> list:
+    """Имена столбцов из первой строки листа (пустые заголовки как в pandas: 'Unnamed: N')."""
+    return [str(value) if value is not None else f"Unnamed: {i}" for i, value in enumerate(values)]
+
+
+def _read_xlsx_openpyxl(content: bytes, chunk_rows: int):
+    """Потоковое чтение листа Excel через openpyxl в режиме read_only."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = _header_names(header)
+
+        while True:
+            block = list(islice(rows, chunk_rows))
+            if not block:
+                break
+            # Пропускаем полностью пустые строки в конце листа
+            block = [row for row in block if any(value is not None for value in row)]
+            if block:
+                yield pd.DataFrame(block, columns=columns)
+    finally:
+        workbook.close()
+
+
+def _read_xlsx_pandas(content: bytes, chunk_rows: int, engine=None):
+    """Чтение всего листа через pd.read_excel и разбиение на блоки (engine: openpyxl или calamine)."""
+    df = pd.read_excel(io.BytesIO(content), engine=engine)
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].reset_index(drop=True)
+
+
+def _read_csv(content: bytes, chunk_rows: int):
+    """Чтение CSV блоками через pd.read_csv(chunksize=...)."""
+    with pd.read_csv(io.BytesIO(content), chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            yield chunk.reset_index(drop=True)
+
+
+def _read_parquet(content: bytes, chunk_rows: int):
+    """Чтение Parquet пакетами строк через pyarrow."""
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(io.BytesIO(content))
+    for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+        yield batch.to_pandas()
+
+
+# Движки чтения xlsx: потоковый openpyxl и чтение целиком через pandas
+XLSX_ENGINES = {
+    'openpyxl-stream': _read_xlsx_openpyxl,
+    'pandas': lambda content, chunk_rows: _read_xlsx_pandas(content, chunk_rows),
+    'calamine': lambda content, chunk_rows: _read_xlsx_pandas(content, chunk_rows, engine='calamine'),
+}
+
+
+def estimate_rows(content: bytes, file_name: str = None) -> int:
+    """Быстрая оценка количества строк данных в файле (для отображения прогресса)."""
+    file_format = detect_format(file_name)
+    if file_format == 'csv':
+        return max(content.count(b'\n') - 1, 0)
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(io.BytesIO(content)).metadata.num_rows
+
+    from openpyxl import load_workbook
+    workbook = load_workbook(io.BytesIO(content), read_only=True)
+    try:
+        return max((workbook.active.max_row or 1) - 1, 0)
+    finally:
+        workbook.close()
+
+
+def read_import_chunks(content: bytes, file_name: str = None, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                       engine: str = 'openpyxl-stream'):
+    """
+    Читает файл импорта блоками по chunk_rows строк и возвращает генератор DataFrame.
+    Формат определяется по имени файла: xlsx, csv или parquet.
+    Для xlsx можно выбрать движок: 'openpyxl-stream' (по умолчанию), 'pandas' или 'calamine'.
+    """
+    file_format = detect_format(file_name)
+    if file_format == 'csv':
+        return _read_csv(content, chunk_rows)
+    if file_format == 'parquet':
+        return _read_parquet(content, chunk_rows)
+
+    if engine not in XLSX_ENGINES:
+        raise ValueError(f"Неизвестный движок чтения Excel: {engine}")
+    return XLSX_ENGINES[engine](content, chunk_rows)
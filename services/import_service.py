@@ -1,294 +1,578 @@
+import time
+import hashlib
+import logging
+from datetime import date, datetime
+
 import pandas as pd
-import streamlit as st
-import re
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
-from database.models import Cars, Profits
-from database.db import SessionLocal
-from datetime import datetime
-from services.calculate import calculate_age, calculate_payback, calculate_profit, calculate_xs
-import logging
+
+from database.models import Cars, Profits, ProfitsStaging, Imports
+from database.partitions import ensure_profits_partitions, prepare_profits_partitions
+from database.db import session_scope, engine, disable_statement_timeout
+from database.versions import bump_version
+from services.calculate import latest_profits_query, apply_latest_profits, recalculate_profit_and_xs
+from services.import_ledger import (
+    register_import, build_cars_journal, write_cars_journal, find_duplicate_import,
+    find_unfinished_import, checkpoint_import, import_stocknums
+)
+from services.import_readers import read_import_chunks, estimate_rows, DEFAULT_CHUNK_ROWS
+from services.import_normalize import normalize_import_frame, merge_reports, validate_import_file
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 
-def clean_milage(milage_value: str) -> str:
-    """Удаляет все нецифровые символы из пробега."""
-    return re.sub(r'\D', '', milage_value) if milage_value else None
+# Поля Cars, которые обновляются из первого типа файла (только непустые значения)
+CAR_UPDATE_FIELDS = ['make', 'model', 'year', 'cost', 'inventoried', 'purchesdate', 'breakevendate', 'dismantled']
+
+# Поля Cars, которые обновляются из второго типа файла
+COLOR_MILEAGE_ENGINE_FIELDS = ['color', 'milage', 'engine']
+
+# Поля Cars, которые заполняются только при добавлении нового автомобиля
+CAR_INSERT_ONLY_FIELDS = ['color', 'milage', 'engine', 'location']
+
+# Размер пакета строк между промежуточными коммитами для фоновых импортов
+DEFAULT_COMMIT_ROWS = 20000
+
+# Поля Cars с датами
+DATE_FIELDS = ['inventoried', 'purchesdate', 'breakevendate', 'dismantled']
+
+# Столбец Cars с хешем полей из файла для каждого типа файла
+FINGERPRINT_COLUMNS = {False: 'fingerprint', True: 'cme_fingerprint'}
+
+MIN_CAR_STOCKN = 10300
+MIN_PROFIT_STOCKN = 10400
+
+
+def _frame_to_records(df: pd.DataFrame) -> list:
+    """Преобразует DataFrame в список словарей, заменяя NaN/NaT на None."""
+    return df.astype(object).where(df.notna(), None).to_dict(orient='records')
+
 
-def calculate_change_amount_for_import(session, stockn, new_import_date, new_cumulative_amount, import_id):
+def _to_date(series: pd.Series) -> pd.Series:
+    """Приводит столбец к датам (datetime.date), пустые значения остаются NaT."""
+    return pd.to_datetime(series, errors='coerce').dt.date
+
+
+def _prepare_incoming_cars(typed: pd.DataFrame, color_mileage_engine: bool) -> pd.DataFrame:
     """
-    Рассчитывает и добавляет новую запись в таблицу Profits для заданного stockn и даты импорта.
-    Если запись уже существует для stockn и даты, она не будет обновляться.
-    Если cumulative_amount отсутствует, change_amount устанавливается в 0.
+    Оставляет в нормализованном DataFrame поля модели Cars (по одной строке на stockn).
+    Строки со stockn меньше MIN_CAR_STOCKN отбрасываются.
+    Если stockn встречается несколько раз, для каждого поля берется последнее непустое значение.
     """
-    from sqlalchemy import func
-
-    # Проверяем, существует ли запись для данного stockn и даты
-    existing_record = (
-        session.query(Profits)
-        .filter(
-            Profits.stockn == stockn,
-            func.date(Profits.date) == new_import_date
-        )
-        .first()
+    if not color_mileage_engine:
+        fields = CAR_UPDATE_FIELDS + CAR_INSERT_ONLY_FIELDS
+    else:
+        fields = COLOR_MILEAGE_ENGINE_FIELDS
+    cars = typed[['stockn'] + fields]
+
+    skipped = cars['stockn'] < MIN_CAR_STOCKN
+    if skipped.any():
+        logging.info(f"Пропущено {int(skipped.sum())} строк со stockn меньше {MIN_CAR_STOCKN}.")
+    cars = cars[~skipped]
+
+    # GroupBy.last берет последнее непустое значение каждого поля
+    return cars.groupby('stockn', sort=False).last().reset_index()
+
+
+def _row_fingerprints(cars: pd.DataFrame, fields: list) -> pd.Series:
+    """Хеш значений полей каждой строки (16 hex-символов) для определения неизмененных машин."""
+    hashes = pd.util.hash_pandas_object(cars[fields].astype(str), index=False)
+    return hashes.map(lambda value: format(value, '016x'))
+
+
+def _load_fingerprints(session: Session, stocknums: list, column: str) -> pd.DataFrame:
+    """Загружает сохраненные хеши строк Cars для заданных stockn (первая запись на stockn)."""
+    query = (
+        select(Cars.stockn, getattr(Cars, column).label('stored_fingerprint'))
+        .where(Cars.stockn.in_(stocknums))
+        .order_by(Cars.id)
     )
+    stored = pd.read_sql(query, session.connection())
+    stored['stockn'] = stored['stockn'].astype('int64')
+    return stored.drop_duplicates(subset='stockn', keep='first')
 
-    if existing_record:
-        logging.info(f"Запись уже существует для stockn {stockn} на дату {new_import_date}. Пропускаем.")
-        return False  # Новая запись не добавлена
 
-    # Рассчитываем change_amount
-    if new_cumulative_amount is None:
-        change_amount = 0
-    else:
-        # Находим предыдущий cumulative_amount для данного stockn
-        previous_profit = (
-            session.query(Profits.cumulative_amount)
-            .filter(
-                Profits.stockn == stockn,
-                Profits.date < new_import_date
-            )
-            .order_by(Profits.date.desc())
-            .first()
-        )
-        if previous_profit:
-            previous_cumulative_amount = previous_profit[0]
-            change_amount = new_cumulative_amount - previous_cumulative_amount
-        else:
-            change_amount = new_cumulative_amount
-
-    # Создаем новую запись и устанавливаем import_id
-    new_profit = Profits(
-        stockn=stockn,
-        date=new_import_date,
-        cumulative_amount=new_cumulative_amount,
-        change_amount=change_amount,
-        import_id=import_id  # Устанавливаем import_id
+def _load_existing_cars(session: Session, stocknums: list, columns: list) -> pd.DataFrame:
+    """Загружает одним запросом существующие записи Cars для заданных stockn."""
+    if not stocknums:
+        return pd.DataFrame(columns=['id', 'stockn', 'status'] + columns).astype({'stockn': 'int64'})
+
+    query = (
+        select(Cars.id, Cars.stockn, Cars.status, *[getattr(Cars, column) for column in columns])
+        .where(Cars.stockn.in_(stocknums))
+        .order_by(Cars.id)
     )
-    session.add(new_profit)
-    logging.info(f"Добавлена новая запись для stockn {stockn} на дату {new_import_date}: change_amount {change_amount}")
-    return True  # Новая запись добавлена
+    existing = pd.read_sql(query, session.connection())
+    existing['stockn'] = existing['stockn'].astype('int64')
+    for column in DATE_FIELDS:
+        if column in existing.columns:
+            existing[column] = pd.to_datetime(existing[column], errors='coerce')
 
-import pandas as pd
-import re
-from sqlalchemy.orm import Session
-from database.models import Cars, Profits
-from database.db import SessionLocal
-from datetime import datetime
-from services.calculate import calculate_age, calculate_payback, calculate_profit, calculate_xs
-import logging
-import streamlit as st  # Добавляем импорт streamlit для очистки кеша
+    # Если в Cars несколько записей с одним stockn, обновляем первую (как делал .first())
+    return existing.drop_duplicates(subset='stockn', keep='first')
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
 
-def import_data_from_excel(file, selected_date: str, color_mileage_engine: bool = False) -> dict:
-    session: Session = SessionLocal()
-    cars_added = 0
-    cars_updated = 0
-    profits_added = 0
+def _calculate_age_and_payback(cars: pd.DataFrame) -> pd.DataFrame:
+    """Векторный пересчет age и payback по датам inventoried и breakevendate."""
+    inventoried = pd.to_datetime(cars['inventoried'], errors='coerce')
+    breakevendate = pd.to_datetime(cars['breakevendate'], errors='coerce')
+    cars['age'] = (pd.Timestamp(date.today()) - inventoried).dt.days.astype('Int64')
+    cars['payback'] = (breakevendate - inventoried).dt.days.astype('Int64')
+    return cars
 
-    try:
-        import_id = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        df = pd.read_excel(file).where(pd.notnull, None)
 
-        # Проверяем названия столбцов
-        print("Названия столбцов в DataFrame:", df.columns.tolist())
+def plan_cars_upsert(incoming: pd.DataFrame, existing: pd.DataFrame, import_id: str,
+                     color_mileage_engine: bool) -> tuple:
+    """
+    Сопоставляет строки файла с существующими машинами по stockn и возвращает
+    два DataFrame: новые машины для вставки и изменения существующих (с id) для обновления.
+    """
+    merged = incoming.merge(existing, on='stockn', how='left', suffixes=('', '_old'), indicator=True)
+    is_new = merged['_merge'] == 'left_only'
+
+    if color_mileage_engine:
+        # Для второго типа файла новые машины не добавляются
+        updates = merged.loc[~is_new, ['stockn']].copy()
+        updates['id'] = merged.loc[~is_new, 'id'].astype('int64')
+        for field in COLOR_MILEAGE_ENGINE_FIELDS:
+            new_values = merged.loc[~is_new, field]
+            updates[field] = new_values.where(new_values.notna(), merged.loc[~is_new, f'{field}_old'])
+        if 'cme_fingerprint' in merged.columns:
+            updates['cme_fingerprint'] = merged.loc[~is_new, 'cme_fingerprint']
+        return incoming.iloc[0:0], updates
+
+    # Новые машины
+    fingerprint = ['fingerprint'] if 'fingerprint' in merged.columns else []
+    inserts = merged.loc[is_new, ['stockn'] + CAR_UPDATE_FIELDS + CAR_INSERT_ONLY_FIELDS + fingerprint].copy()
+    inserts['status'] = inserts['dismantled'].notna().map({True: 'scrap', False: 'active'})
+    inserts['import_id'] = import_id
+    inserts = _calculate_age_and_payback(inserts)
+
+    # Существующие машины: непустые значения из файла заменяют текущие
+    current = merged.loc[~is_new]
+    updates = current[['id', 'stockn']].copy()
+    updates['id'] = updates['id'].astype('int64')
+    for field in CAR_UPDATE_FIELDS:
+        updates[field] = current[field].where(current[field].notna(), current[f'{field}_old'])
+    updates['status'] = current['status'].where(current['dismantled'].isna(), 'scrap')
+    for column in fingerprint:
+        updates[column] = current[column]
+    updates = _calculate_age_and_payback(updates)
+
+    return inserts, updates
+
+
+def write_cars_upsert(session: Session, inserts: pd.DataFrame, updates: pd.DataFrame):
+    """Записывает новые и обновленные машины пакетными INSERT/UPDATE (executemany)."""
+    inserts = inserts.copy()
+    updates = updates.copy()
+    for column in DATE_FIELDS:
+        for frame in (inserts, updates):
+            if column in frame.columns:
+                frame[column] = _to_date(frame[column])
+
+    if not inserts.empty:
+        session.execute(insert(Cars), _frame_to_records(inserts))
+    if not updates.empty:
+        # ORM bulk UPDATE по первичному ключу id
+        session.execute(update(Cars), _frame_to_records(updates.drop(columns=['stockn'])))
+
+
+def plan_profits_snapshot(session: Session, typed: pd.DataFrame, snapshot_date, import_id: str) -> pd.DataFrame:
+    """
+    Строит снимок Profits на дату snapshot_date для всех stockn из файла.
+    Предыдущий cumulative_amount для всех stockn берется одним запросом (DISTINCT ON),
+    change_amount считается как разница столбцов.
+    Если cumulative_amount отсутствует, change_amount устанавливается в 0.
+    """
+    snapshot = typed[['stockn', 'sales']].rename(columns={'sales': 'cumulative_amount'})
+    snapshot = snapshot[snapshot['stockn'] >= MIN_PROFIT_STOCKN]
+    # Для повторяющегося stockn сохраняется первая строка файла
+    snapshot = snapshot.drop_duplicates(subset='stockn', keep='first')
+
+    if snapshot.empty:
+        return snapshot.assign(date=snapshot_date, change_amount=0.0, import_id=import_id)
+
+    previous = pd.read_sql(
+        latest_profits_query(snapshot['stockn'].tolist(), before_date=snapshot_date),
+        session.connection()
+    )[['stockn', 'cumulative_amount']].rename(columns={'cumulative_amount': 'previous_amount'})
+    previous['stockn'] = previous['stockn'].astype('int64')
+
+    snapshot = snapshot.merge(previous, on='stockn', how='left')
+    snapshot['change_amount'] = (
+        (snapshot['cumulative_amount'] - snapshot['previous_amount'].fillna(0.0))
+        .where(snapshot['cumulative_amount'].notna(), 0.0)
+    )
+    snapshot['date'] = snapshot_date
+    snapshot['import_id'] = import_id
 
-        if not color_mileage_engine:
-            # Обработка первого типа файла
-            # Приводим названия столбцов к нижнему регистру и удаляем пробелы
-            df.columns = df.columns.str.strip().str.lower()
-
-            # Переименовываем столбец 'purchasedate' в 'purchesdate' для консистентности
-            if 'purchasedate' in df.columns:
-                df.rename(columns={'purchasedate': 'purchesdate'}, inplace=True)
-        else:
-            # Обработка второго типа файла
-            # Оставляем названия столбцов без изменений
-            pass
+    return snapshot[['stockn', 'date', 'cumulative_amount', 'change_amount', 'import_id']]
 
-        # Преобразуем selected_date в объект date, если это строка
-        if isinstance(selected_date, str):
-            selected_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
 
-        # Преобразуем значения столбцов с датами и заменяем NaT на None
-        if not color_mileage_engine:
-            date_columns = ['inventoried', 'breakevendate', 'dismantled', 'purchesdate']
-        else:
-            date_columns = []
+def write_profits_snapshot(session: Session, snapshot: pd.DataFrame) -> list:
+    """
+    Пакетно добавляет записи Profits (секции месяцев создаются заранее prepare_profits_partitions,
+    недостающие создаются в той же транзакции).
+    Существующие записи для (stockn, date) пропускаются за счет ON CONFLICT DO NOTHING по _stockn_date_uc.
+    Возвращает список stockn, для которых запись была добавлена.
+    """
+    if snapshot.empty:
+        return []
+
+    ensure_profits_partitions(session, snapshot['date'].drop_duplicates().tolist())
+    profits_table = Profits.__table__
+    statement = (
+        pg_insert(profits_table)
+        .on_conflict_do_nothing(constraint='_stockn_date_uc')
+        .returning(profits_table.c.stockn)
+    )
+    result = session.execute(statement, _frame_to_records(snapshot))
+    return [row.stockn for row in result]
 
-        for column in date_columns:
-            if column in df.columns:
-                df[column] = pd.to_datetime(df[column], errors='coerce', dayfirst=True).dt.date
-                df[column] = df[column].apply(lambda x: x if pd.notnull(x) else None)
 
-        if df.empty:
-            logging.error("Файл Excel пустой или содержит некорректные данные.")
-            return {"cars_added": 0, "cars_updated": 0, "profits_added": 0}
+def stage_profits_snapshot(session: Session, snapshot: pd.DataFrame):
+    """Сохраняет записи снимка Profits в profits_staging (без изменения Profits)."""
+    if not snapshot.empty:
+        session.execute(insert(ProfitsStaging), _frame_to_records(snapshot))
 
-        # Словарь для хранения обновленных автомобилей
-        updated_cars = {}
 
-        for _, row in df.iterrows():
-            if not color_mileage_engine:
-                # Первый тип файла
-                stockn = int(row.get('vstockno', 0))
-            else:
-                # Второй тип файла
-                stockn = int(row.get('Stock #', 0))
-
-            if stockn < 10300:
-                logging.info(f"Пропущен stockn={stockn}, так как он меньше 10300.")
-                continue
-
-            car = session.query(Cars).filter(Cars.stockn == stockn).first()
-            if not car:
-                if not color_mileage_engine:
-                    # Добавление нового автомобиля в таблицу Cars, если его нет и это первый тип файла
-                    car = Cars(
-                        stockn=stockn,
-                        color=row.get('color'),
-                        milage=clean_milage(row.get('odo reading')),
-                        engine=row.get('engine'),
-                        import_id=import_id,
-                    )
-                    # Заполнение дополнительных полей для первого типа файла
-                    car.make = row.get('manufacturer')
-                    car.model = row.get('modelname')
-                    car.year = row.get('modelyear')
-                    car.location = create_location(row.get('bin'), row.get('xcoord'))
-                    car.cost = row.get('cost')
-                    car.inventoried = row.get('inventoried')
-                    car.purchesdate = row.get('purchesdate')
-                    car.breakevendate = row.get('breakevendate')
-                    car.dismantled = row.get('dismantled')
-                    car.status = 'scrap' if car.dismantled else 'active'
-                    car.age = calculate_age(car.inventoried) if car.inventoried else None
-                    car.payback = calculate_payback(car.breakevendate, car.inventoried) if car.breakevendate and car.inventoried else None
-
-                    session.add(car)
-                    cars_added += 1
-                else:
-                    # Если автомобиль не найден и это второй тип файла, пропускаем обработку
-                    continue
-            else:
-                # Обновление существующего автомобиля
-                if not color_mileage_engine:
-                    # Обновление всех полей для первого типа файла
-                    if row.get('manufacturer') is not None:
-                        car.make = row.get('manufacturer')
-                    if row.get('modelname') is not None:
-                        car.model = row.get('modelname')
-                    if row.get('modelyear') is not None:
-                        car.year = row.get('modelyear')
-                    if row.get('cost') is not None:
-                        car.cost = row.get('cost')
-                    if row.get('inventoried') is not None:
-                        car.inventoried = row.get('inventoried')
-                    if row.get('purchesdate') is not None:
-                        car.purchesdate = row.get('purchesdate')
-                    if row.get('breakevendate') is not None:
-                        car.breakevendate = row.get('breakevendate')
-                    if row.get('dismantled') is not None:
-                        car.dismantled = row.get('dismantled')
-                        car.status = 'scrap' if car.dismantled else 'active'
-                    # Пересчитываем age и payback после обновления дат
-                    car.age = calculate_age(car.inventoried) if car.inventoried else None
-                    car.payback = calculate_payback(car.breakevendate, car.inventoried) if car.breakevendate and car.inventoried else None
-                    cars_updated += 1
-                else:
-                    # Обновление только полей color, milage, engine для второго типа файла
-                    if row.get('Color') is not None:
-                        car.color = row.get('Color')
-                    if row.get('Odo Reading') is not None:
-                        car.milage = clean_milage(row.get('Odo Reading'))
-                    if row.get('Engine') is not None:
-                        car.engine = row.get('Engine')
-                    cars_updated += 1
-
-            # Сохраняем обновленный автомобиль для последующего расчета
-            if not color_mileage_engine:
-                updated_cars[stockn] = car
+def finalize_staged_profits(session: Session, import_id: str) -> list:
+    """
+    Переносит записи импорта из profits_staging в Profits одним INSERT ... SELECT
+    (для повторяющегося stockn берется первая запись, существующие (stockn, date)
+    пропускаются), обновляет car_latest_profit и очищает staging.
+    Возвращает список stockn, для которых запись была добавлена.
+    """
+    staged = (
+        select(ProfitsStaging.stockn, ProfitsStaging.date, ProfitsStaging.cumulative_amount,
+               ProfitsStaging.change_amount, ProfitsStaging.import_id)
+        .where(ProfitsStaging.import_id == import_id)
+        .distinct(ProfitsStaging.stockn)
+        .order_by(ProfitsStaging.stockn, ProfitsStaging.id)
+    )
+    ensure_profits_partitions(session, session.execute(
+        select(ProfitsStaging.date).where(ProfitsStaging.import_id == import_id).distinct()
+    ).scalars())
+    profits_table = Profits.__table__
+    statement = (
+        pg_insert(profits_table)
+        .from_select(['stockn', 'date', 'cumulative_amount', 'change_amount', 'import_id'], staged)
+        .on_conflict_do_nothing(constraint='_stockn_date_uc')
+        .returning(profits_table.c.stockn, profits_table.c.date,
+                   profits_table.c.cumulative_amount, profits_table.c.change_amount)
+    )
+    added = [dict(row._mapping) for row in session.execute(statement)]
+    apply_latest_profits(session, added)
 
-        # Обработка данных для Profits (только если color_mileage_engine=False)
-        if not color_mileage_engine:
-            for _, row in df.iterrows():
-                stockn = int(row.get('vstockno', 0))
-                if stockn < 10400:
-                    continue
-                cumulative_amount = row.get('sales')
-                new_profit_added = calculate_change_amount_for_import(
-                    session,
-                    stockn,
-                    selected_date,
-                    cumulative_amount,
-                    import_id  # Передаем import_id в функцию
-                )
-                if new_profit_added:
-                    profits_added += 1
+    session.execute(delete(ProfitsStaging).where(ProfitsStaging.import_id == import_id))
+    return [row['stockn'] for row in added]
 
-            # Сбрасываем изменения в сессии, чтобы новые записи Profits были видны
-            session.flush()
 
-            # Рассчитываем profit и xs для обновленных автомобилей
-            for stockn, car in updated_cars.items():
-                car.profit = calculate_profit(session, stockn, car.cost)
-                car.xs = calculate_xs(session, stockn, car.cost)
+def read_file_bytes(file) -> bytes:
+    """Возвращает содержимое загруженного файла (UploadedFile, файлового объекта или пути)."""
+    if hasattr(file, 'getvalue'):
+        return file.getvalue()
+    if hasattr(file, 'read'):
+        return file.read()
+    with open(file, 'rb') as f:
+        return f.read()
 
-        # Сохранение всех изменений
-        session.commit()
 
-        # Очистка кеша после успешного импорта
-        st.cache_data.clear()
+def plan_import_chunk(session: Session, typed: pd.DataFrame, import_id: str, selected_date,
+                      color_mileage_engine: bool) -> dict:
+    """
+    Вычисляет изменения одного нормализованного блока без записи в базу:
+    новые машины, обновления существующих, журнал прежних значений и снимок Profits.
+    Все сравнения выполняются объединением DataFrame с данными, загруженными пакетными запросами.
 
-        return {"cars_added": cars_added, "cars_updated": cars_updated, "profits_added": profits_added}
+    :return: Словарь с DataFrame 'inserts', 'updates', 'snapshot', списком 'journal'
+             и количеством неизмененных машин 'unchanged'
+    """
+    incoming = _prepare_incoming_cars(typed, color_mileage_engine)
+    existing_columns = COLOR_MILEAGE_ENGINE_FIELDS if color_mileage_engine else CAR_UPDATE_FIELDS
+
+    # Машины, у которых хеш полей совпадает с сохраненным при прошлом импорте, не перезаписываем
+    fingerprint_column = FINGERPRINT_COLUMNS[color_mileage_engine]
+    incoming[fingerprint_column] = _row_fingerprints(incoming, existing_columns)
+    stored = _load_fingerprints(session, incoming['stockn'].tolist(), fingerprint_column)
+    compared = incoming[['stockn', fingerprint_column]].merge(stored, on='stockn', how='left')
+    unchanged = (compared[fingerprint_column] == compared['stored_fingerprint']).to_numpy()
+    incoming = incoming[~unchanged]
+
+    # Загружаем остальные затронутые машины одним запросом и определяем вставки/обновления
+    existing = _load_existing_cars(session, incoming['stockn'].tolist(), existing_columns)
+    inserts, updates = plan_cars_upsert(incoming, existing, import_id, color_mileage_engine)
+
+    # Прежние значения изменяемых полей для отмены импорта
+    journal_fields = COLOR_MILEAGE_ENGINE_FIELDS if color_mileage_engine else CAR_UPDATE_FIELDS + ['status']
+
+    return {
+        "inserts": inserts,
+        "updates": updates,
+        "journal": build_cars_journal(updates, existing, journal_fields, import_id),
+        "unchanged": int(unchanged.sum()),
+        # Снимок Profits (только если color_mileage_engine=False)
+        "snapshot": None if color_mileage_engine else plan_profits_snapshot(session, typed, selected_date, import_id),
+    }
+
+
+def write_import_chunk(session: Session, plan: dict, progress=None, stage_profits: bool = False) -> dict:
+    """
+    Записывает изменения, вычисленные plan_import_chunk: журнал, Cars и снимок Profits.
+    При stage_profits=True записи Profits сохраняются в profits_staging
+    (перенос выполняет finalize_staged_profits).
 
-    except Exception as e:
-        session.rollback()
-        logging.error(f"Ошибка при импорте данных: {e}")
-        return {"cars_added": 0, "cars_updated": 0, "profits_added": 0}
-    finally:
-        session.close()
+    :return: Словарь со счетчиками и списком затронутых stockn
+    """
+    inserts, updates = plan["inserts"], plan["updates"]
+    write_cars_journal(session, plan["journal"])
+    write_cars_upsert(session, inserts, updates)
+    result = {
+        "cars_added": len(inserts),
+        "cars_updated": len(updates),
+        "cars_unchanged": plan["unchanged"],
+        "profits_added": 0,
+        "stocknums": pd.concat([inserts['stockn'], updates['stockn']]).tolist(),
+    }
+
+    snapshot = plan["snapshot"]
+    if snapshot is not None:
+        if progress:
+            progress('profits', None, None)
+        if stage_profits:
+            stage_profits_snapshot(session, snapshot)
+            return result
+        added_stocknums = write_profits_snapshot(session, snapshot)
+        result["profits_added"] = len(added_stocknums)
+        # profit и xs зависят и от новых записей Profits неизмененных машин
+        result["stocknums"].extend(added_stocknums)
+
+        # Обновляем последние записи Profits только для добавленных stockn
+        apply_latest_profits(
+            session,
+            _frame_to_records(snapshot[snapshot['stockn'].isin(added_stocknums)])
+        )
 
-def clean_milage(milage_value: str) -> str:
-    """Удаляет все нецифровые символы из пробега."""
-    return re.sub(r'\D', '', milage_value) if milage_value else None
+    return result
 
-def create_location(bin_value, xcoord_value) -> str:
-    """Создает строку location на основе bin и xcoord, убирая .0, если значение целое."""
 
-    # Если значение bin или xcoord является числом с десятичной частью ".0", удаляем её
-    if pd.notna(bin_value):
-        bin_value = str(bin_value).rstrip('.0')
-    else:
-        bin_value = ''
+def apply_import_chunk(session: Session, typed: pd.DataFrame, import_id: str, selected_date,
+                       color_mileage_engine: bool, progress=None, stage_profits: bool = False) -> dict:
+    """
+    Применяет один нормализованный блок файла импорта: добавляет и обновляет Cars
+    (с журналом изменений) и добавляет записи Profits на дату selected_date.
 
-    if pd.notna(xcoord_value):
-        xcoord_value = str(xcoord_value).rstrip('.0')
-    else:
-        xcoord_value = ''
+    :return: Словарь со счетчиками и списком затронутых stockn
+    """
+    if progress:
+        progress('cars', None, None)
+    plan = plan_import_chunk(session, typed, import_id, selected_date, color_mileage_engine)
+    return write_import_chunk(session, plan, progress, stage_profits)
 
-    # Собираем location
-    if bin_value and xcoord_value:
-        return f"{bin_value}.{xcoord_value}"
-    return bin_value or xcoord_value
 
-def create_location(bin_value, xcoord_value) -> str:
-    """Создает строку location на основе bin и xcoord, убирая .0, если значение целое."""
+def import_data_from_excel(file, selected_date: str, color_mileage_engine: bool = False,
+                           chunk_rows: int = DEFAULT_CHUNK_ROWS, file_name: str = None,
+                           progress=None, force: bool = False, commit_rows: int = None) -> dict:
+    """
+    Импортирует файл (xlsx, csv или parquet), читая его блоками по chunk_rows строк.
+    Каждый блок сначала нормализуется (типы, даты, пробег, location), затем проходит
+    конвейер Cars/Profits, поэтому расход памяти ограничен размером блока.
+    profit и xs пересчитываются один раз в конце.
+    В результат добавляется отчет об отклоненных значениях по столбцам ('rejected').
+
+    progress: необязательная функция progress(phase, rows_done, rows_total) для отображения
+    хода импорта по фазам 'parse', 'cars', 'profits', 'recompute'.
+
+    Если этот же файл (по sha256) уже импортирован на ту же дату, импорт пропускается
+    и в результате возвращается 'duplicate_of'; force=True отключает эту проверку.
+    Машины, поля которых не изменились с прошлого импорта, не перезаписываются ('cars_unchanged').
+
+    commit_rows: если задано, изменения Cars фиксируются каждые commit_rows строк вместе
+    с контрольной точкой в реестре imports, а записи Profits копятся в profits_staging и
+    переносятся в Profits одной транзакцией в конце. Повторный запуск того же файла на ту же
+    дату после сбоя продолжает импорт с контрольной точки ('resumed_from').
+    """
+    cars_added = 0
+    cars_updated = 0
+    cars_unchanged = 0
+    profits_added = 0
+    import_id = None
 
-    # Если значение bin или xcoord является числом с десятичной частью ".0", удаляем её
-    if pd.notna(bin_value):
-        bin_value = str(bin_value).rstrip('.0')
-    else:
-        bin_value = ''
+    try:
+        # Преобразуем selected_date в объект date, если это строка
+        if isinstance(selected_date, str):
+            selected_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
+        content = read_file_bytes(file)
+        file_name = file_name or getattr(file, 'name', str(file))
+        # Заголовки и наличие корректных строк проверяются до любой работы с базой
+        validate_import_file(content, file_name, color_mileage_engine, chunk_rows)
 
-    if pd.notna(xcoord_value):
-        xcoord_value = str(xcoord_value).rstrip('.0')
-    else:
-        xcoord_value = ''
+        if not color_mileage_engine:
+            # Секцию месяца создаем до транзакции импорта, чтобы не держать блокировку profits
+            prepare_profits_partitions(engine, [selected_date])
+
+        with session_scope() as session:
+            # Импорт большого файла идет дольше DB_STATEMENT_TIMEOUT_MS
+            disable_statement_timeout(session)
+            file_hash = hashlib.sha256(content).hexdigest()
+
+            import_type = 'color_mileage_engine' if color_mileage_engine else 'inventory'
+            snapshot_date = None if color_mileage_engine else selected_date
+            duplicate_of = None if force else find_duplicate_import(session, file_hash, import_type, snapshot_date)
+            if duplicate_of:
+                logging.info(f"Файл {file_name} уже импортирован ({duplicate_of}), импорт пропущен.")
+                return {"cars_added": 0, "cars_updated": 0, "cars_unchanged": 0, "profits_added": 0,
+                        "duplicate_of": duplicate_of}
+
+            rows_done = 0
+            checkpointed = 0
+            unfinished = find_unfinished_import(session, file_hash, import_type, snapshot_date) if commit_rows else None
+            if unfinished is not None:
+                # Продолжаем прерванный импорт с контрольной точки
+                import_id = unfinished.id
+                rows_done = unfinished.rows_done or 0
+                checkpointed = rows_done
+                cars_added = unfinished.cars_added or 0
+                cars_updated = unfinished.cars_updated or 0
+                logging.info(f"Импорт {import_id} продолжается со строки {rows_done}.")
+            else:
+                import_id = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                if commit_rows:
+                    register_import(
+                        session, import_id, status='running', rows_done=0, file_name=file_name,
+                        file_hash=file_hash, import_type=import_type, snapshot_date=snapshot_date
+                    )
+                    session.commit()
+
+            parse_seconds = 0.0
+            write_seconds = 0.0
+            rows_read = 0
+            rows_since_commit = 0
+            affected_stocknums = set()
+            report = {}
+            rows_total = estimate_rows(content, file_name) if progress else None
+
+            chunks = read_import_chunks(content, file_name, chunk_rows)
+            while True:
+                started = time.perf_counter()
+                df = next(chunks, None)
+                if df is None:
+                    break
+                if rows_read == 0:
+                    # Названия столбцов файла — один раз на импорт
+                    logging.debug(f"Названия столбцов в файле {file_name}: {df.columns.tolist()}")
+                if progress:
+                    progress('parse', rows_read, rows_total)
+
+                # Строки до контрольной точки уже применены
+                skip = min(max(rows_done - rows_read, 0), len(df))
+                rows_read += len(df)
+                if skip == len(df):
+                    continue
+                typed, chunk_report = normalize_import_frame(df.iloc[skip:], color_mileage_engine)
+                merge_reports(report, chunk_report)
+                parse_seconds += time.perf_counter() - started
+
+                started = time.perf_counter()
+                result = apply_import_chunk(
+                    session, typed, import_id, selected_date, color_mileage_engine, progress,
+                    stage_profits=bool(commit_rows)
+                )
+                cars_added += result["cars_added"]
+                cars_updated += result["cars_updated"]
+                cars_unchanged += result["cars_unchanged"]
+                profits_added += result["profits_added"]
+                affected_stocknums.update(result["stocknums"])
+
+                rows_since_commit += len(df) - skip
+                if commit_rows and rows_since_commit >= commit_rows:
+                    checkpoint_import(session, import_id, rows_done=rows_read,
+                                      cars_added=cars_added, cars_updated=cars_updated)
+                    bump_version(session, 'cars')
+                    session.commit()
+                    checkpointed = rows_read
+                    rows_since_commit = 0
+                write_seconds += time.perf_counter() - started
+
+            if rows_read == 0:
+                session.rollback()
+                if commit_rows:
+                    session.execute(delete(Imports).where(Imports.id == import_id))
+                    session.commit()
+                logging.error("Файл пустой или содержит некорректные данные.")
+                return {"cars_added": 0, "cars_updated": 0, "profits_added": 0, "error": "Файл пустой."}
+
+            if report:
+                logging.warning(f"Отклоненные значения при импорте: {report}")
+
+            started = time.perf_counter()
+            if progress:
+                progress('recompute', rows_read, rows_total)
+            if commit_rows:
+                # Переносим снимок Profits одной транзакцией вместе с пересчетом и завершением импорта
+                added_stocknums = finalize_staged_profits(session, import_id)
+                profits_added = len(added_stocknums)
+                affected_stocknums.update(added_stocknums)
+                # Машины из уже зафиксированных частей прерванного импорта
+                affected_stocknums.update(import_stocknums(session, import_id))
+            if not color_mileage_engine:
+                logging.info(f"Добавлено {profits_added} записей Profits на дату {selected_date}.")
+
+                # Рассчитываем profit и xs для обновленных автомобилей
+                recalculate_profit_and_xs(session, affected_stocknums)
+
+            # Регистрируем импорт в реестре
+            counters = dict(
+                cars_added=cars_added,
+                cars_updated=cars_updated,
+                profits_added=profits_added,
+                parse_seconds=round(parse_seconds, 3),
+                write_seconds=round(write_seconds + time.perf_counter() - started, 3),
+            )
+            if commit_rows:
+                checkpoint_import(session, import_id, status='done', rows_done=rows_read, **counters)
+            else:
+                register_import(
+                    session,
+                    import_id,
+                    file_name=file_name,
+                    file_hash=file_hash,
+                    import_type=import_type,
+                    snapshot_date=snapshot_date,
+                    **counters,
+                )
 
-    # Собираем location
-    if bin_value and xcoord_value:
-        return f"{bin_value}.{xcoord_value}"
-    return bin_value or xcoord_value
+            # Новые версии данных сбрасывают кеши страниц, зависящих от этих таблиц
+            bump_version(session, 'cars', 'imports', *([] if color_mileage_engine else ['profits']))
+
+            # Сохранение всех изменений
+            session.commit()
+
+            result = {
+                "import_id": import_id,
+                "cars_added": cars_added,
+                "cars_updated": cars_updated,
+                "cars_unchanged": cars_unchanged,
+                "profits_added": profits_added,
+                "rejected": report,
+            }
+            if rows_done:
+                result["resumed_from"] = rows_done
+            return result
+
+    except Exception as e:
+        logging.error(f"Ошибка при импорте данных: {e}")
+        result = {"cars_added": 0, "cars_updated": 0, "profits_added": 0, "error": str(e)}
+        if commit_rows and import_id:
+            if checkpointed:
+                # Зафиксированные части остаются, импорт можно продолжить повторным запуском
+                result["import_id"] = import_id
+                result["resumable"] = True
+            else:
+                # Ничего не зафиксировано: убираем запись о начатом импорте
+                with session_scope() as session:
+                    session.execute(delete(Imports).where(Imports.id == import_id))
+        return result
@@ -1,46 +1,27 @@
 
 from sqlalchemy.orm import Session
 from database.models import Cars
+from database.loader import load_table
+from database.schema import to_display_dtypes
 from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, JsCode
 import pandas as pd
 
-def fetch_cars_data(session: Session) -> pd.DataFrame:
+def fetch_cars_data(connection=None) -> pd.DataFrame:
     """
     Извлекает все данные из таблицы Cars и возвращает их в формате DataFrame для дальнейшей обработки.
+    По умолчанию читает через пул отчетов (reporting_engine).
     """
-    query = session.query(
-        Cars.stockn,
-        Cars.make,
-        Cars.model,
-        Cars.year,
-        Cars.color,
-        Cars.milage,
-        Cars.engine,
-        Cars.location,
-        Cars.cost,
-        Cars.inventoried,
-        Cars.breakevendate,
-        Cars.dismantled,
-        Cars.purchesdate,
-        Cars.age,
-        Cars.payback,
-        Cars.profit,
-        Cars.xs,
-        Cars.status,
-        Cars.import_id
-    ).all()
-
-    # Преобразуем результат запроса в DataFrame
     columns = [
         "stockn", "make", "model", "year", "color", "milage", "engine", "location",
         "cost", "inventoried", "breakevendate", "dismantled", "purchesdate", "age",
         "payback", "profit", "xs", "status", "import_id"
     ]
-    df = pd.DataFrame(query, columns=columns)
-    return df
+    return load_table(Cars, columns, connection=connection)
 
 # Вывод таблиц в app.py
 def create_aggrid_table(df, editable=False, height=400, fit_columns_on_grid_load=False):
+    # Категории и nullable-целые не принимают '', поэтому сначала переводим их в обычные типы
+    df = to_display_dtypes(df)
     # Заменяем NaN в DataFrame
     df = df.fillna('')
 
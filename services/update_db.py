@@ -1,75 +1,55 @@
 from datetime import date, datetime
-from sqlalchemy.orm import Session
-from database.models import Cars, Profits
-from services.calculate import calculate_age, calculate_profit, calculate_xs
-from database.db import SessionLocal
+from database.models import Cars
+from services.calculate import (
+    calculate_age, recalculate_profit_and_xs, rechain_change_amounts, refresh_latest_profits
+)
+from database.db import session_scope, disable_statement_timeout
+from database.versions import bump_version
 
 # Функция для обновления значений profit и xs для всех автомобилей
 def update_profit_and_xs():
-    session: Session = SessionLocal()
     try:
-        cars = session.query(Cars).all()
-        for car in cars:
-            # Получаем последний cumulative_amount для stockn
-            last_cumulative_amount = (
-                session.query(Profits.cumulative_amount)
-                .filter(Profits.stockn == car.stockn)
-                .order_by(Profits.date.desc())
-                .first()
-            )
-            if last_cumulative_amount:
-                car.profit = calculate_profit(session, car.stockn, car.cost)
-                car.xs = calculate_xs(session, car.stockn, car.cost)
-        session.commit()
-        print("Profit и Xs обновлены для всех автомобилей.")
+        with session_scope() as session:
+            result = recalculate_profit_and_xs(session)
+            bump_version(session, 'cars')
+            print(f"Profit и Xs обновлены для всех автомобилей: {result}")
+            return result
     except Exception as e:
-        session.rollback()
         print(f"Ошибка при обновлении profit и xs: {e}")
-    finally:
-        session.close()
 
 # Функция для обновления profit и xs при каждом новом импорте
 def update_profit_history():
-    session: Session = SessionLocal()
     try:
-        profits = session.query(Profits).all()
-        for profit in profits:
-            car = session.query(Cars).filter_by(stockn=profit.stockn).first()
-            if car:
-                # Обновляем profit и xs для каждой новой записи Profits
-                profit.change_amount = profit.cumulative_amount - car.profit if car.profit else None
-                car.profit = calculate_profit(session, car.stockn, car.cost)
-                car.xs = calculate_xs(session, car.stockn, car.cost)
-        session.commit()
-        print("ProfitHistory обновлен.")
+        with session_scope() as session:
+            # Цепочка change_amount всех машин одним UPDATE, затем последние записи и profit/xs.
+            # Полный пересчет на большой базе идет дольше DB_STATEMENT_TIMEOUT_MS
+            disable_statement_timeout(session)
+            rechained = rechain_change_amounts(session)
+            refresh_latest_profits(session)
+            recalculate_profit_and_xs(session)
+            bump_version(session, 'cars', 'profits')
+            print(f"ProfitHistory обновлен: исправлено change_amount {rechained}.")
     except Exception as e:
-        session.rollback()
         print(f"Ошибка при обновлении ProfitHistory: {e}")
-    finally:
-        session.close()
 
 # Функция для обновления age один раз в день при запуске
 def update_age_daily():
-    session: Session = SessionLocal()
     today = date.today()
-    # Проверяем последнюю дату обновления в базе данных
-    last_update = session.query(Cars).filter(Cars.age.isnot(None)).first()
-    if last_update and last_update.age_last_updated == today:
-        # Если age уже обновлен сегодня, пропускаем
-        print("Age уже обновлен сегодня.")
-        session.close()
-        return
-
-    # Обновляем age для всех автомобилей
     try:
-        cars = session.query(Cars).all()
-        for car in cars:
-            car.age = calculate_age(car.inventoried)
-            car.age_last_updated = today  # Сохраняем дату обновления
-        session.commit()
-        print("Age обновлен для всех автомобилей.")
+        with session_scope() as session:
+            # Проверяем последнюю дату обновления в базе данных
+            last_update = session.query(Cars).filter(Cars.age.isnot(None)).first()
+            if last_update and last_update.age_last_updated == today:
+                # Если age уже обновлен сегодня, пропускаем
+                print("Age уже обновлен сегодня.")
+                return
+
+            # Обновляем age для всех автомобилей
+            cars = session.query(Cars).all()
+            for car in cars:
+                car.age = calculate_age(car.inventoried)
+                car.age_last_updated = today  # Сохраняем дату обновления
+            bump_version(session, 'cars')
+            print("Age обновлен для всех автомобилей.")
     except Exception as e:
-        session.rollback()
         print(f"Ошибка при обновлении age: {e}")
-    finally:
-        session.close()
@@ -0,0 +1,59 @@
+"""
+Тесты с базой данных выполняются на отдельной базе Postgres из TEST_DATABASE_URL,
+например postgresql://postgres@localhost/allamuchy_test. Перед тестом схема public
+этой базы удаляется и создается заново миграциями. Без TEST_DATABASE_URL такие тесты пропускаются.
+Остальные тесты (обработка файлов и кадров pandas, выбор разделов снимка, цепочка миграций) базы не требуют.
+"""
+import os
+import tempfile
+
+import pytest
+
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+
+# config читает настройки при первом импорте: приложение в тестах работает с тестовой базой,
+# а снимки таблиц и Parquet-копии пишутся во временный каталог
+if TEST_DATABASE_URL:
+    os.environ['DATABASE_URL'] = TEST_DATABASE_URL
+    os.environ.pop('REPORTING_DATABASE_URL', None)
+_files_dir = tempfile.mkdtemp(prefix='allamuchy_tests_')
+os.environ['SNAPSHOT_DIR'] = os.path.join(_files_dir, 'snapshots')
+os.environ['ANALYTICS_DIR'] = os.path.join(_files_dir, 'analytics')
+
+
+def reset_schema():
+    """Пустая схема public тестовой базы (соединения пулов приложения закрываются)."""
+    from sqlalchemy import text
+    from database.db import engine, reporting_engine
+
+    from database import frame_store
+
+    engine.dispose()
+    reporting_engine.dispose()
+    # Версии данных в новой схеме начинаются заново: кадры прошлого теста не должны совпасть с ними
+    with frame_store._lock:
+        frame_store._state['versions'] = None
+    with engine.begin() as connection:
+        connection.execute(text("DROP SCHEMA public CASCADE"))
+        connection.execute(text("CREATE SCHEMA public"))
+    engine.dispose()
+
+
+@pytest.fixture
+def empty_db():
+    """Тестовая база без таблиц."""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL не задан")
+    reset_schema()
+    from database.db import engine
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def migrated_db(empty_db):
+    """Тестовая база со схемой последней миграции."""
+    import create_tables
+
+    create_tables.create_database()
+    yield empty_db
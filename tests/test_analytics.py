@@ -0,0 +1,94 @@
+import pandas as pd
+import pytest
+from sqlalchemy import text, update
+
+import services.analytics as analytics
+from database.db import session_scope
+from database.frame_store import get_frames, PROFITS_FILL_VALUES, CARS_FILL_VALUES
+from database.models import Profits
+from database.schema import apply_schema, CARS_SCHEMA, PROFITS_SCHEMA
+from database.versions import bump_version
+from services.calculate import get_daily_average_changes, get_cars_without_significant_sales, get_monthly_income
+from services.import_service import import_data_from_excel
+from tests.test_import_service import _inventory_csv
+
+POSTGRES_AVERAGES = """
+    SELECT profits.date, avg(profits.change_amount) AS avg_change_all,
+           avg(profits.change_amount) FILTER (WHERE cars.make = 'FORD') AS avg_change_make,
+           avg(profits.change_amount) FILTER (WHERE cars.model = 'FOCUS') AS avg_change_model
+    FROM profits LEFT JOIN cars ON cars.stockn = profits.stockn
+    GROUP BY profits.date ORDER BY profits.date
+"""
+
+
+BACKENDS = ['pandas', 'duckdb']
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch):
+    if request.param == 'duckdb' and analytics.duckdb is None:
+        pytest.skip("пакет duckdb не установлен")
+    monkeypatch.setattr(analytics, 'BACKEND', request.param)
+    return request.param
+
+
+def _frames():
+    """Кадры, как их строит хранилище: у машины 10501 change_amount последних снимков пустой."""
+    cars = pd.DataFrame({'stockn': [10500, 10501], 'make': ['FORD', 'FORD'], 'model': ['FOCUS', 'FIESTA']})
+    dates = ['2024-08-05', '2024-09-02', '2024-10-01', '2024-11-04', '2024-12-02']
+    profits = pd.DataFrame({
+        'stockn': [10500] * 5 + [10501] * 3,
+        'date': pd.to_datetime(dates + ['2024-08-05', '2024-11-04', '2024-12-02']),
+        'cumulative_amount': [300.0, 600.0, 900.0, 1200.0, 1500.0, 400.0, None, None],
+        'change_amount': [300.0] * 5 + [400.0, None, None],
+        'import_id': ['a', 'b', 'c', 'd', 'e', 'a', 'd', 'e'],
+    })
+    return (apply_schema(cars.fillna(CARS_FILL_VALUES), CARS_SCHEMA),
+            apply_schema(profits.fillna(PROFITS_FILL_VALUES), PROFITS_SCHEMA))
+
+
+def test_empty_change_amount_stays_nan_in_frames():
+    _, profits_df = _frames()
+    assert profits_df['change_amount'].isna().sum() == 2
+    assert profits_df['cumulative_amount'].isna().sum() == 0
+
+
+def test_low_sales_count_empty_change_amount_as_zero(backend):
+    cars_df, profits_df = _frames()
+    low_sales = get_cars_without_significant_sales.__wrapped__(profits_df, cars_df, threshold=200)
+    assert low_sales['stockn'].tolist() == [10501]
+
+
+def test_monthly_income_counts_empty_change_amount_as_zero(backend):
+    _, profits_df = _frames()
+    income = get_monthly_income.__wrapped__(profits_df.assign(change_amount=profits_df['change_amount'].where(
+        profits_df['stockn'] == 10501)), start_date='2024-08-01')
+    # Месяц, в котором все change_amount пустые, остается в отчете с нулем
+    assert income['month_str'].tolist() == ['12/24', '11/24', '10/24', '09/24', '08/24']
+    assert income['change_amount'].tolist() == [0.0, 0.0, 0.0, 0.0, 400.0]
+
+
+def test_daily_averages_skip_empty_change_amount_in_frames(backend):
+    cars_df, profits_df = _frames()
+    averages = get_daily_average_changes.__wrapped__(cars_df, profits_df, 'FORD', 'FIESTA', '2024-08-01', '2024-12-31')
+    assert averages['avg_change_all'].tolist() == [350.0, 300.0, 300.0, 300.0, 300.0]
+    assert averages['avg_change_model'].isna().tolist() == [False, True, True, True, True]
+
+
+def test_daily_averages_match_postgres(migrated_db, backend):
+    import_data_from_excel(_inventory_csv([
+        [10500, 'FORD', 'FOCUS', 2010, 1000, '10/01/2024', None, None, '01/01/2024', 'RED', 1000, '2.0L', 1, 2, 100],
+        [10501, 'FORD', 'FOCUS', 2012, 2000, '15/01/2024', None, None, '01/01/2024', 'BLUE', 5000, '1.8L', 3, 4, 300],
+    ]), '2024-10-01')
+    # Пустой change_amount (например, в записях, внесенных вручную)
+    with session_scope() as session:
+        session.execute(update(Profits).where(Profits.stockn == 10501).values(change_amount=None))
+        bump_version(session, 'profits')
+
+    cars_df, profits_df = get_frames()
+    averages = get_daily_average_changes.__wrapped__(cars_df, profits_df, 'FORD', 'FOCUS', '2024-09-01', '2024-12-01')
+
+    with migrated_db.connect() as connection:
+        expected = pd.read_sql(text(POSTGRES_AVERAGES), connection, parse_dates=['date'])
+    assert averages['avg_change_all'].tolist() == expected['avg_change_all'].tolist() == [100.0]
+    pd.testing.assert_frame_equal(averages.reset_index(drop=True), expected, check_dtype=False)
@@ -0,0 +1,41 @@
+from sqlalchemy import select, func
+
+from database.db import session_scope
+from database.models import Profits
+from services.batch_import import import_backfill, parse_date_from_file_name
+from services.import_jobs import IMPORT_LOCK_KEY
+
+
+def _file(file_name: str, sales: int) -> dict:
+    return {'content': f"vStockNo,Manufacturer,Sales\n10500,FORD,{sales}\n".encode(), 'file_name': file_name}
+
+
+def _profits() -> list:
+    with session_scope() as session:
+        return [tuple(row) for row in session.execute(
+            select(Profits.date, Profits.cumulative_amount, Profits.change_amount).order_by(Profits.date)
+        )]
+
+
+def test_parse_date_from_file_name():
+    assert str(parse_date_from_file_name('inv_2024-11-01.xlsx')) == '2024-11-01'
+    assert str(parse_date_from_file_name('inv 01.11.2024.csv')) == '2024-11-01'
+    assert parse_date_from_file_name('inventory.xlsx') is None
+
+
+def test_backfill_chains_files_in_date_order(migrated_db):
+    result = import_backfill([_file('inv_2024-10-08.csv', 250), _file('inv_2024-10-01.csv', 100)], max_workers=1)
+
+    assert result['profits_added'] == 2
+    assert [row[1:] for row in _profits()] == [(100, 100), (250, 150)]
+
+
+def test_backfill_refuses_while_another_import_runs(migrated_db):
+    with migrated_db.connect() as holder:
+        holder.execute(select(func.pg_advisory_lock(IMPORT_LOCK_KEY)))
+        result = import_backfill([_file('inv_2024-10-01.csv', 100)], max_workers=1)
+        holder.execute(select(func.pg_advisory_unlock(IMPORT_LOCK_KEY)))
+        holder.commit()
+
+    assert result['error'] == "Выполняется другой импорт, повторите позже."
+    assert _profits() == []
@@ -0,0 +1,49 @@
+from sqlalchemy import inspect, text
+
+import create_tables
+
+
+def _revision(engine):
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT version_num FROM alembic_version")).scalar()
+
+
+def test_new_database_upgrades_to_head(migrated_db):
+    tables = set(inspect(migrated_db).get_table_names())
+    assert {'cars', 'profits', 'profits_archive', 'imports'} <= tables
+    assert _revision(migrated_db) == '0005'
+
+
+def test_legacy_database_upgrades_to_head(empty_db):
+    # База, созданная до миграций: только cars и profits в исходном виде
+    with empty_db.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE cars (id SERIAL PRIMARY KEY, stockn INTEGER, make VARCHAR, model VARCHAR, "
+            "year INTEGER, color VARCHAR, milage FLOAT, engine VARCHAR, location VARCHAR, cost FLOAT, "
+            "inventoried DATE, breakevendate DATE, dismantled DATE, purchesdate DATE, age INTEGER, "
+            "payback INTEGER, profit FLOAT, xs FLOAT, status VARCHAR, import_id VARCHAR, age_last_updated DATE)"
+        ))
+        connection.execute(text(
+            "CREATE TABLE profits (id SERIAL PRIMARY KEY, stockn INTEGER, date DATE, cumulative_amount FLOAT, "
+            "change_amount FLOAT, import_id VARCHAR, CONSTRAINT _stockn_date_uc UNIQUE (stockn, date))"
+        ))
+        connection.execute(text(
+            "INSERT INTO profits (stockn, date, cumulative_amount, change_amount, import_id) "
+            "VALUES (1, '2024-10-01', 100, 100, 'old'), (1, '2024-11-01', 150, 50, 'old')"
+        ))
+
+    create_tables.create_database()
+
+    assert _revision(empty_db) == '0005'
+    assert 'profits_archive' in inspect(empty_db).get_table_names()
+    with empty_db.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM profits")).scalar() == 2
+
+
+def test_migrations_form_single_chain():
+    from alembic.script import ScriptDirectory
+
+    script = ScriptDirectory.from_config(create_tables.alembic_config())
+    revisions = [revision.revision for revision in script.walk_revisions()]
+    assert script.get_heads() == ['0005']
+    assert revisions == ['0005', '0004', '0003', '0002', '0001']
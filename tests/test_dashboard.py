@@ -0,0 +1,42 @@
+from collections import namedtuple
+
+import pandas as pd
+from sqlalchemy import select, update
+
+from services.dashboard import TABLE_SECTIONS, CHART_SECTIONS, _select_sections, _to_ipc
+
+Row = namedtuple('Row', ['section', 'frame', 'metrics'])
+
+
+def _rows(sections) -> list:
+    return [Row(section, _to_ipc(pd.DataFrame({'stockn': [1]})), {'count': 1}) for section in sections]
+
+
+def test_select_sections_returns_complete_snapshot():
+    sections = _select_sections(_rows(TABLE_SECTIONS + CHART_SECTIONS))
+    assert set(sections) == set(TABLE_SECTIONS + CHART_SECTIONS)
+    assert sections['best']['frame']['stockn'].tolist() == [1]
+    assert sections['best']['metrics'] == {'count': 1}
+
+
+def test_select_sections_rejects_partial_snapshot():
+    assert _select_sections(_rows(TABLE_SECTIONS)) is None
+    assert _select_sections([]) is None
+
+
+def test_snapshot_of_other_data_is_rebuilt(migrated_db):
+    from database.db import session_scope
+    from database.models import DashboardSnapshot
+    from services.dashboard import dashboard_key, get_dashboard, refresh_dashboard_snapshot
+
+    refresh_dashboard_snapshot()
+    # Снимок, сохраненный другим процессом для других данных, не подходит к текущему ключу
+    with session_scope() as session:
+        session.execute(update(DashboardSnapshot).values(data_key='other'))
+
+    sections = get_dashboard()
+
+    assert set(sections) == set(TABLE_SECTIONS + CHART_SECTIONS)
+    with session_scope() as session:
+        keys = set(session.execute(select(DashboardSnapshot.data_key)).scalars())
+    assert keys == {dashboard_key()}
@@ -0,0 +1,26 @@
+from sqlalchemy import text
+
+from database.db import engine, session_scope, disable_statement_timeout
+
+
+def _statement_timeout(connection) -> str:
+    return connection.execute(text("SHOW statement_timeout")).scalar()
+
+
+def test_disable_statement_timeout_spans_commits(empty_db):
+    with engine.connect() as connection:
+        default = _statement_timeout(connection)
+    assert default != '0'
+
+    with session_scope() as session:
+        disable_statement_timeout(session)
+        assert _statement_timeout(session) == '0'
+        # Промежуточная фиксация, как у контрольных точек импорта
+        session.commit()
+        assert _statement_timeout(session) == '0'
+
+    # Соединение вернулось в пул с таймаутом из настроек
+    with engine.connect() as connection:
+        assert _statement_timeout(connection) == default
+    with session_scope() as session:
+        assert _statement_timeout(session) == default
@@ -0,0 +1,104 @@
+from datetime import date
+
+from sqlalchemy import select
+
+from database.db import session_scope
+from database.models import Cars, Profits, ProfitsArchive, CarLatestProfit
+from services.batch_import import import_backfill
+from services.compaction import compact_month
+from services.delete_service import delete_data_by_import_id
+from services.import_service import import_data_from_excel
+from tests.test_import_service import _inventory_csv, _next_import_id
+
+
+def _file(file_name: str, sales: int) -> dict:
+    return {'content': f"vStockNo,Manufacturer,Sales\n10500,FORD,{sales}\n".encode(), 'file_name': file_name}
+
+
+def _profits() -> list:
+    with session_scope() as session:
+        return [tuple(row) for row in session.execute(
+            select(Profits.date, Profits.cumulative_amount, Profits.change_amount).order_by(Profits.date)
+        )]
+
+
+def _import_october_and_compact() -> list:
+    result = import_backfill([_file('inv_2024-10-01.csv', 100), _file('inv_2024-10-08.csv', 250),
+                              _file('inv_2024-10-15.csv', 300)], max_workers=1)
+    with session_scope() as session:
+        compact_month(session, date(2024, 10, 1))
+    assert _profits() == [(date(2024, 10, 15), 300, 300)]
+    return [f['import_id'] for f in result['files']]
+
+
+def test_delete_import_of_compacted_row_keeps_earlier_snapshots(migrated_db):
+    import_ids = _import_october_and_compact()
+
+    result = delete_data_by_import_id(import_ids[-1])
+
+    assert result['profits_deleted'] == 1
+    assert result['profits_unarchived'] == 3
+    assert _profits() == [(date(2024, 10, 1), 100, 100), (date(2024, 10, 8), 250, 150)]
+    with session_scope() as session:
+        assert session.execute(select(ProfitsArchive.id)).all() == []
+        assert session.execute(select(CarLatestProfit.cumulative_amount)).scalar() == 250
+
+
+def test_delete_import_of_archived_row_rechains_month(migrated_db):
+    import_ids = _import_october_and_compact()
+
+    delete_data_by_import_id(import_ids[1])
+
+    assert _profits() == [(date(2024, 10, 1), 100, 100), (date(2024, 10, 15), 300, 200)]
+
+
+def _model_import(model: str, cost: int, snapshot_date: str) -> str:
+    rows = [[10500, 'FORD', model, 2010, cost, '10/01/2024', None, None, '01/01/2024', 'RED', 1000, '2.0L', 1, 2, 100]]
+    return import_data_from_excel(_inventory_csv(rows), snapshot_date)['import_id']
+
+
+def _car():
+    with session_scope() as session:
+        return session.execute(select(Cars.model, Cars.cost, Cars.fingerprint).where(Cars.stockn == 10500)).one()
+
+
+def test_delete_older_import_keeps_fields_changed_later(migrated_db):
+    _model_import('FOCUS', 1000, '2024-10-01')
+    _next_import_id()
+    changed_model = _model_import('FIESTA', 1000, '2024-10-08')
+    _next_import_id()
+    _model_import('FIESTA', 1500, '2024-10-15')
+
+    result = delete_data_by_import_id(changed_model)
+
+    # model записан удаленным импортом и не менялся после него, cost изменил только последний импорт
+    assert result['fields_skipped'] == []
+    assert tuple(_car()[:2]) == ('FOCUS', 1500)
+
+
+def test_delete_import_skips_fields_overwritten_later(migrated_db):
+    _model_import('FOCUS', 1000, '2024-10-01')
+    _next_import_id()
+    first_change = _model_import('FIESTA', 1000, '2024-10-08')
+    _next_import_id()
+    _model_import('MONDEO', 1000, '2024-10-15')
+
+    result = delete_data_by_import_id(first_change)
+
+    assert result['fields_skipped'] == [{'stockn': 10500, 'field': 'model'}]
+    car = _car()
+    assert car.model == 'MONDEO'
+    # Машина не изменилась: хеш последнего файла остается
+    assert car.fingerprint is not None
+
+
+def test_delete_compacted_import_keeps_snapshots_added_after_compaction(migrated_db):
+    import_ids = _import_october_and_compact()
+    _next_import_id()
+    later = import_backfill([_file('inv_2024-10-22.csv', 320)], max_workers=1)
+    assert later['profits_added'] == 1
+
+    delete_data_by_import_id(import_ids[-1])
+
+    assert _profits() == [(date(2024, 10, 1), 100, 100), (date(2024, 10, 8), 250, 150),
+                          (date(2024, 10, 22), 320, 70)]
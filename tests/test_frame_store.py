@@ -0,0 +1,82 @@
+import pandas as pd
+import pytest
+
+from database.frame_store import _lock, _register_token, get_frames, freeze_frame, frame_token
+from services.cache import bounded_cache
+from services.import_service import import_data_from_excel
+from tests.test_import_service import _inventory_csv
+
+
+def test_freeze_frame_blocks_in_place_writes():
+    df = freeze_frame(pd.DataFrame({
+        'count': pd.array([1, None], dtype='Int32'), 'amount': [1.0, 2.0],
+        'make': pd.Categorical(['FORD', 'BMW']), 'date': pd.to_datetime(['2024-10-01', '2024-10-08']),
+    }))
+    for column in ['count', 'amount', 'make']:
+        with pytest.raises(ValueError):
+            df.loc[0, column] = df.loc[1, column]
+    # Для дат pandas после ошибки записи пробует сменить тип столбца и сообщает AssertionError
+    with pytest.raises((ValueError, AssertionError)):
+        df.loc[0, 'date'] = df.loc[1, 'date']
+    assert df['count'].isna().tolist() == [False, True]
+
+
+def test_store_frames_are_read_only(migrated_db):
+    rows = [[10500, 'FORD', 'FOCUS', 2010, 1000, '10/01/2024', None, None, '01/01/2024', 'RED', 1000, '2.0L', 1, 2, 100]]
+    import_data_from_excel(_inventory_csv(rows), '2024-10-01')
+    cars_df, profits_df = get_frames()
+    assert cars_df['location'].dtype == 'string[pyarrow]'
+    assert isinstance(cars_df['make'].dtype, pd.CategoricalDtype)
+
+    with pytest.raises(ValueError):
+        profits_df.loc[0, 'change_amount'] = 0.0
+    with pytest.raises(ValueError):
+        cars_df.loc[0, 'cost'] = 0.0
+    # Новые и замененные столбцы остаются в копии сессии
+    profits_df['change_amount'] = 0.0
+    cars_df['margin'] = cars_df['profit'] / cars_df['cost']
+
+    cars_again, profits_again = get_frames()
+    assert profits_again['change_amount'].tolist() == [100.0]
+    assert 'margin' not in cars_again.columns
+
+
+def test_cached_frames_are_read_only():
+    @bounded_cache(name='tests.frame')
+    def frame():
+        return pd.DataFrame({'month_str': ['10/24', '11/24'], 'value': [1.0, 2.0]})
+
+    cached = frame()
+    with pytest.raises(ValueError):
+        cached.loc[0, 'value'] = 5.0
+    assert frame()['value'].tolist() == [1.0, 2.0]
+    # Кадр со столбцом object сохранен в кеше, а не отклонен при подсчете размера
+    assert (frame.cache.hits, frame.cache.rejected) == (1, 0)
+
+
+def test_frame_token_is_dropped_when_columns_change():
+    frame = freeze_frame(pd.DataFrame({'stockn': [1, 2], 'change_amount': [1.0, 2.0]}))
+    assigned, added, renamed = (frame.copy(deep=False) for _ in range(3))
+    for df in (assigned, added, renamed):
+        with _lock:
+            _register_token(df, ('profits', 1))
+        assert frame_token(df) == ('profits', 1)
+
+    assigned['change_amount'] = 0.0
+    added['margin'] = 1.0
+    renamed.rename(columns={'change_amount': 'amount'}, inplace=True)
+    assert [frame_token(df) for df in (assigned, added, renamed)] == [None, None, None]
+
+
+def test_cache_does_not_reuse_result_for_modified_store_frame(migrated_db):
+    rows = [[10500, 'FORD', 'FOCUS', 2010, 1000, '10/01/2024', None, None, '01/01/2024', 'RED', 1000, '2.0L', 1, 2, 100]]
+    import_data_from_excel(_inventory_csv(rows), '2024-10-01')
+
+    @bounded_cache(name='tests.income')
+    def income(profits_df):
+        return float(profits_df['change_amount'].sum())
+
+    _, profits_df = get_frames()
+    assert income(profits_df) == 100.0
+    profits_df['change_amount'] = 0.0
+    assert income(profits_df) == 0.0
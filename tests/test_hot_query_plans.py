@@ -0,0 +1,53 @@
+import pytest
+from sqlalchemy import text
+
+from benchmarks.explain_hot_queries import (
+    HOT_QUERIES, PRUNED_QUERIES, MONTHS, explain, plan_nodes, parent_indexes,
+)
+from database.partitions import ensure_profits_partitions, is_partition_name
+
+INDEXED_TABLES = {'cars', 'profits'}
+
+
+def _nodes(plan: dict):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from _nodes(child)
+
+
+def _seq_scans(plan: dict) -> set:
+    """Таблицы cars и profits (включая секции Profits), которые план читает последовательно."""
+    return {
+        node['Relation Name'] for node in _nodes(plan)
+        if node['Node Type'] == 'Seq Scan'
+        and (node['Relation Name'] in INDEXED_TABLES or is_partition_name(node['Relation Name']))
+    }
+
+
+@pytest.fixture
+def plan_connection(migrated_db):
+    """Соединение в транзакции с секциями за MONTHS и настройками из explain_hot_queries (откатывается)."""
+    with migrated_db.connect() as connection:
+        transaction = connection.begin()
+        connection.execute(text("SET LOCAL enable_seqscan = off"))
+        connection.execute(text("SET LOCAL enable_hashagg = off"))
+        ensure_profits_partitions(connection, MONTHS)
+        yield connection
+        transaction.rollback()
+
+
+@pytest.mark.parametrize('name, statement, expected', HOT_QUERIES, ids=[query[0] for query in HOT_QUERIES])
+def test_hot_query_uses_index(plan_connection, name, statement, expected):
+    plan = explain(plan_connection, statement)
+    assert not _seq_scans(plan), f"{name}: Seq Scan по {_seq_scans(plan)}"
+
+    parents = parent_indexes(plan_connection)
+    used = {parents.get(index, index) for index in plan_nodes(plan, 'Index Name')}
+    assert used & expected, f"{name}: использованы индексы {used or 'никакие'}, ожидался один из {expected}"
+
+
+@pytest.mark.parametrize('name, statement, expected', PRUNED_QUERIES, ids=[query[0] for query in PRUNED_QUERIES])
+def test_query_reads_only_needed_partitions(plan_connection, name, statement, expected):
+    plan = explain(plan_connection, statement)
+    assert not _seq_scans(plan), f"{name}: Seq Scan по {_seq_scans(plan)}"
+    assert set(filter(is_partition_name, plan_nodes(plan, 'Relation Name'))) == expected
@@ -0,0 +1,75 @@
+import threading
+import time
+from datetime import date
+
+from sqlalchemy import create_engine, select, func, text
+
+import config
+from database.db import session_scope
+from database.models import ImportJobs
+import services.import_jobs as import_jobs
+
+CSV = b"vStockNo,Manufacturer,Sales\n10500,FORD,100\n"
+
+
+def _queue_job() -> int:
+    with session_scope() as session:
+        job = ImportJobs(status='queued', progress=0.0, file_name='inventory.csv', content=CSV,
+                         snapshot_date=date(2024, 10, 1), color_mileage_engine=False, force=False)
+        session.add(job)
+        session.flush()
+        return job.id
+
+
+def _job(job_id: int):
+    with session_scope() as session:
+        return session.execute(
+            select(ImportJobs.status, ImportJobs.message, ImportJobs.result, ImportJobs.finished_at)
+            .where(ImportJobs.id == job_id)
+        ).one()
+
+
+def _start_waiting_job(holder, job_id: int) -> threading.Thread:
+    """Берет блокировку импорта соединением holder и запускает задачу, которая ждет ее в отдельном потоке."""
+    holder.execute(select(func.pg_advisory_lock(import_jobs.IMPORT_LOCK_KEY)))
+    worker = threading.Thread(target=import_jobs._run_job, args=(job_id,))
+    worker.start()
+    time.sleep(1)
+    return worker
+
+
+def test_job_waits_for_lock_longer_than_statement_timeout(migrated_db, monkeypatch):
+    # Соединения задачи с коротким statement_timeout: ожидание блокировки не должно им ограничиваться
+    short_timeout = create_engine(config.DATABASE_URL, connect_args={'options': '-c statement_timeout=300'})
+    monkeypatch.setattr(import_jobs, 'engine', short_timeout)
+    job_id = _queue_job()
+
+    with migrated_db.connect() as holder:
+        worker = _start_waiting_job(holder, job_id)
+        assert _job(job_id).status == 'queued'
+        holder.execute(select(func.pg_advisory_unlock(import_jobs.IMPORT_LOCK_KEY)))
+        holder.commit()
+
+    worker.join(timeout=30)
+    short_timeout.dispose()
+    job = _job(job_id)
+    assert job.status == 'done', job.message
+    assert job.result['profits_added'] == 1
+
+
+def test_job_is_marked_failed_when_lock_wait_fails(migrated_db):
+    job_id = _queue_job()
+
+    with migrated_db.connect() as holder:
+        worker = _start_waiting_job(holder, job_id)
+        # Отменяем ожидание блокировки, как это сделал бы statement_timeout
+        holder.execute(text(
+            "SELECT pg_cancel_backend(pid) FROM pg_stat_activity "
+            "WHERE wait_event_type = 'Lock' AND wait_event = 'advisory' AND pid <> pg_backend_pid()"
+        ))
+        worker.join(timeout=30)
+        holder.rollback()
+
+    job = _job(job_id)
+    assert job.status == 'failed'
+    assert job.finished_at is not None
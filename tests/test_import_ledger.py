@@ -0,0 +1,19 @@
+import pandas as pd
+
+from services.import_ledger import build_cars_journal
+
+
+def test_build_cars_journal_keeps_before_and_after_of_changed_fields():
+    existing = pd.DataFrame({'id': [7, 8], 'model': ['ACCORD', 'CIVIC'], 'cost': [800.0, None],
+                             'inventoried': pd.to_datetime(['2023-05-01', None])})
+    updates = pd.DataFrame({'id': [7, 8], 'stockn': [10501, 10502], 'model': ['CIVIC', 'CIVIC'],
+                            'cost': [800.0, None], 'inventoried': pd.to_datetime(['2023-05-01', '2024-01-10'])})
+
+    journal = build_cars_journal(updates, existing, ['model', 'cost', 'inventoried'], 'import-1')
+
+    assert journal == [
+        {'import_id': 'import-1', 'car_id': 7, 'stockn': 10501,
+         'before': {'model': 'ACCORD'}, 'after': {'model': 'CIVIC'}},
+        {'import_id': 'import-1', 'car_id': 8, 'stockn': 10502,
+         'before': {'inventoried': None}, 'after': {'inventoried': '2024-01-10'}},
+    ]
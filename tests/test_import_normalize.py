@@ -0,0 +1,74 @@
+import pandas as pd
+import pytest
+
+from services.import_normalize import (
+    clean_milage, normalize_import_frame, parse_import_file, validate_import_file, ImportValidationError,
+)
+
+
+@pytest.mark.parametrize('raw, expected', [
+    # Числовой столбец с пустой ячейкой читается как float64
+    (pd.Series([12345.0, None]), [12345.0, None]),
+    # openpyxl: целые вперемешку с None
+    (pd.Series([12345, None, 7], dtype=object), [12345.0, None, 7.0]),
+    (pd.Series([12345, 7]), [12345.0, 7.0]),
+    # Строки: удаляются все нецифровые символы
+    (pd.Series(['12,345 mi', '1 000', '', 'abc', None]), [12345.0, 1000.0, None, None, None]),
+    (pd.Series(['98 765', pd.NA], dtype='string'), [98765.0, None]),
+    # Строки и числа в одном столбце
+    (pd.Series(['12,345', 678.0, None], dtype=object), [12345.0, 678.0, None]),
+])
+def test_clean_milage(raw, expected):
+    pd.testing.assert_series_equal(clean_milage(raw), pd.Series(expected, dtype='float64'), check_names=False)
+
+
+def test_normalize_keeps_numeric_milage():
+    raw = pd.DataFrame({'vStockNo': [1, 2], 'Odo Reading': [12345.0, None], 'Manufacturer': ['FORD', 'BMW']})
+    typed, report = normalize_import_frame(raw)
+    pd.testing.assert_series_equal(typed['milage'], pd.Series([12345.0, None]), check_names=False)
+    assert 'odo reading' not in report
+
+
+def test_csv_milage_with_blank_cell():
+    content = b"vStockNo,Odo Reading,Cost\n1,12345,100\n2,,200\n3,\"54,321 mi\",300\n"
+    typed = parse_import_file(content, 'inventory.csv')['typed']
+    pd.testing.assert_series_equal(typed['milage'], pd.Series([12345.0, None, 54321.0]), check_names=False)
+
+
+def test_normalize_rejects_bad_values():
+    raw = pd.DataFrame({'vStockNo': [1, 'x', None], 'Cost': ['10.5', 'abc', 3], 'Inventoried': ['01.02.2024', None, 'bad']})
+    typed, report = normalize_import_frame(raw)
+    assert typed['stockn'].tolist() == [1]
+    assert typed['cost'].tolist() == [10.5]
+    assert report['vstockno']['missing'] == 2
+    assert report['cost']['rejected'] == 1
+    assert report['inventoried']['rejected'] == 1
+
+
+# Последний блок (chunk_rows=2) содержит только строку итогов
+FOOTER_CSV = b"vStockNo,Cost\n1,100\n2,200\nTotal,300\n"
+
+
+def test_footer_chunk_is_not_an_error():
+    typed = parse_import_file(FOOTER_CSV, 'inventory.csv', chunk_rows=2)['typed']
+    assert typed['stockn'].tolist() == [1, 2]
+    validate_import_file(FOOTER_CSV, 'inventory.csv', chunk_rows=2)
+
+
+def test_validate_reads_past_invalid_first_chunk():
+    validate_import_file(b"vStockNo,Cost\nHeader,\nnote,\n3,100\n", 'inventory.csv', chunk_rows=2)
+
+
+@pytest.mark.parametrize('content, message', [
+    (b"vStockNo,Cost\nTotal,300\nnote,\nx,1\n", "Ни в одной строке"),
+    (b"Stock,Cost\n1,100\n", "нет обязательного столбца"),
+])
+def test_validate_rejects_file(content, message):
+    with pytest.raises(ImportValidationError, match=message):
+        validate_import_file(content, 'inventory.csv', chunk_rows=2)
+    with pytest.raises(ImportValidationError, match=message):
+        parse_import_file(content, 'inventory.csv', chunk_rows=2)
+
+
+def test_empty_file_is_not_a_validation_error():
+    validate_import_file(b"vStockNo,Cost\n", 'inventory.csv')
@@ -0,0 +1,37 @@
+from sqlalchemy import select, update
+
+from database.db import session_scope
+from database.models import Cars, Profits
+from database.versions import bump_version
+from services.import_preview import preview_import, apply_import_plan
+from services.import_service import import_data_from_excel
+from tests.test_import_service import _inventory_csv, _next_import_id
+
+ROW = [10500, 'FORD', 'FOCUS', 2010, 1000, '10/01/2024', None, None, '01/01/2024', 'RED', 1000, '2.0L', 1, 2, 100]
+
+
+def test_apply_preview(migrated_db):
+    preview = preview_import(_inventory_csv([ROW]), '2024-10-01')
+    assert preview['summary']['cars_added'] == 1
+
+    result = apply_import_plan(preview)
+
+    assert (result['cars_added'], result['profits_added']) == (1, 1)
+
+
+def test_preview_is_stale_after_edit(migrated_db):
+    import_data_from_excel(_inventory_csv([ROW]), '2024-10-01')
+    _next_import_id()
+    preview = preview_import(_inventory_csv([ROW[:2] + ['FIESTA'] + ROW[3:-1] + [250]]), '2024-10-08')
+
+    # Правка машины в таблице после предпросмотра (реестр импортов не меняется)
+    with session_scope() as session:
+        session.execute(update(Cars).where(Cars.stockn == 10500).values(model='MONDEO'))
+        bump_version(session, 'cars')
+
+    result = apply_import_plan(preview)
+
+    assert 'error' in result
+    with session_scope() as session:
+        assert session.execute(select(Cars.model)).scalar() == 'MONDEO'
+        assert len(session.execute(select(Profits.id)).all()) == 1
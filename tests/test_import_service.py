@@ -0,0 +1,154 @@
+import io
+import time
+from datetime import date
+
+import pandas as pd
+from sqlalchemy import select, text
+
+from database.db import session_scope
+import services.import_service as import_service
+from database.models import Cars, Profits, CarLatestProfit, Imports
+from services.calculate import recalculate_profit_and_xs
+from services.import_service import plan_cars_upsert, import_data_from_excel
+
+
+def _inventory_csv(rows: list) -> io.BytesIO:
+    columns = ['vStockNo', 'Manufacturer', 'ModelName', 'ModelYear', 'Cost', 'Inventoried',
+               'BreakevenDate', 'Dismantled', 'PurchaseDate', 'Color', 'Odo Reading', 'Engine', 'Bin', 'XCoord', 'Sales']
+    content = io.BytesIO(pd.DataFrame(rows, columns=columns).to_csv(index=False).encode('utf-8'))
+    content.name = 'inventory.csv'
+    return content
+
+
+def _next_import_id():
+    # import_id — время импорта с точностью до секунды
+    time.sleep(1.05)
+
+
+def _cars(session) -> dict:
+    return {car.stockn: car for car in session.scalars(select(Cars))}
+
+
+def test_plan_cars_upsert_splits_new_and_existing():
+    incoming = pd.DataFrame({
+        'stockn': [10500, 10501],
+        'make': ['FORD', None], 'model': ['FOCUS', 'CIVIC'], 'year': [2010, None], 'cost': [1000.0, None],
+        'inventoried': pd.to_datetime(['2024-01-10', None]), 'purchesdate': pd.to_datetime([None, None]),
+        'breakevendate': pd.to_datetime([None, None]), 'dismantled': pd.to_datetime([None, '2024-03-01']),
+        'color': ['RED', 'BLUE'], 'milage': [1.0, 2.0], 'engine': ['2.0L', None], 'location': ['1.2', None],
+    })
+    existing = pd.DataFrame({
+        'id': [7], 'stockn': [10501], 'make': ['HONDA'], 'model': ['ACCORD'], 'year': [2005], 'cost': [800.0],
+        'inventoried': pd.to_datetime(['2023-05-01']), 'purchesdate': pd.to_datetime([None]),
+        'breakevendate': pd.to_datetime([None]), 'dismantled': pd.to_datetime([None]), 'status': ['active'],
+    })
+
+    inserts, updates = plan_cars_upsert(incoming, existing, 'import-1', color_mileage_engine=False)
+
+    assert inserts['stockn'].tolist() == [10500]
+    assert inserts.iloc[0]['status'] == 'active'
+    assert inserts.iloc[0]['import_id'] == 'import-1'
+
+    update = updates.iloc[0]
+    assert update['id'] == 7
+    # Пустые значения файла не затирают текущие, непустые заменяют
+    assert update['make'] == 'HONDA'
+    assert update['model'] == 'CIVIC'
+    assert update['cost'] == 800.0
+    assert update['status'] == 'scrap'
+
+
+def test_import_inserts_then_updates_cars_and_chains_profits(migrated_db):
+    first = import_data_from_excel(_inventory_csv([
+        [10500, 'FORD', 'FOCUS', 2010, 1000, '10/01/2024', None, None, '01/01/2024', 'RED', '1,000 mi', '2.0L', 1, 2, 100],
+        [10501, 'HONDA', 'CIVIC', 2012, 2000, '15/01/2024', None, None, '01/01/2024', 'BLUE', 5000, '1.8L', 3, 4, 300],
+    ]), '2024-10-01')
+    assert (first['cars_added'], first['cars_updated'], first['profits_added']) == (2, 0, 2)
+    _next_import_id()
+
+    second = import_data_from_excel(_inventory_csv([
+        [10500, None, 'FIESTA', None, None, None, None, '01/11/2024', None, None, None, None, None, None, 250],
+        [10501, 'HONDA', 'CIVIC', 2012, 2000, '15/01/2024', None, None, '01/01/2024', 'BLUE', 5000, '1.8L', 3, 4, 300],
+        [10502, 'BMW', 'X5', 2015, 5000, '20/02/2024', None, None, '01/02/2024', 'BLACK', None, '3.0L', None, 7, 50],
+    ]), '2024-10-08')
+    assert second['cars_added'] == 1
+    assert second['profits_added'] == 3
+
+    with session_scope() as session:
+        cars = _cars(session)
+        assert cars[10500].make == 'FORD'
+        assert cars[10500].model == 'FIESTA'
+        assert cars[10500].cost == 1000
+        assert cars[10500].milage == 1000
+        assert cars[10500].status == 'scrap'
+        assert cars[10502].location == '7'
+
+        chain = session.execute(
+            select(Profits.stockn, Profits.date, Profits.cumulative_amount, Profits.change_amount)
+            .order_by(Profits.stockn, Profits.date)
+        ).all()
+        assert [tuple(row) for row in chain] == [
+            (10500, date(2024, 10, 1), 100, 100),
+            (10500, date(2024, 10, 8), 250, 150),
+            (10501, date(2024, 10, 1), 300, 300),
+            (10501, date(2024, 10, 8), 300, 0),
+            (10502, date(2024, 10, 8), 50, 50),
+        ]
+
+        latest = {row.stockn: row for row in session.scalars(select(CarLatestProfit))}
+        assert latest[10500].date == date(2024, 10, 8)
+        assert latest[10500].cumulative_amount == 250
+        # profit и xs пересчитаны по последнему cumulative_amount
+        assert cars[10500].profit == 250 - 1000
+        assert cars[10501].xs == 0.15
+
+
+def test_same_file_same_date_is_skipped(migrated_db):
+    rows = [[10500, 'FORD', 'FOCUS', 2010, 1000, '10/01/2024', None, None, '01/01/2024', 'RED', 1000, '2.0L', 1, 2, 100]]
+    import_data_from_excel(_inventory_csv(rows), '2024-10-01')
+    _next_import_id()
+    repeated = import_data_from_excel(_inventory_csv(rows), '2024-10-01')
+
+    assert repeated['duplicate_of']
+    with session_scope() as session:
+        assert len(session.execute(select(Profits.id)).all()) == 1
+
+
+def test_import_transaction_does_not_lock_profits_for_new_month(migrated_db, monkeypatch):
+    # Секция нового месяца создается до транзакции импорта: на время импорта profits не блокируется
+    held = []
+
+    def recalculate(session, stocknums):
+        with migrated_db.connect() as observer:
+            held.extend(observer.execute(text(
+                "SELECT mode FROM pg_locks WHERE relation = 'profits'::regclass AND mode = 'AccessExclusiveLock'"
+            )).scalars())
+        return recalculate_profit_and_xs(session, stocknums)
+
+    monkeypatch.setattr(import_service, 'recalculate_profit_and_xs', recalculate)
+    rows = [[10500, 'FORD', 'FOCUS', 2010, 1000, '10/01/2024', None, None, '01/01/2024', 'RED', 1000, '2.0L', 1, 2, 100]]
+    result = import_data_from_excel(_inventory_csv(rows), '2031-05-01')
+
+    assert result['profits_added'] == 1
+    assert held == []
+
+
+def test_chunked_import_with_footer_rows(migrated_db):
+    rows = [[10500 + i, 'FORD', 'FOCUS', 2010, 1000, '10/01/2024', None, None, '01/01/2024', 'RED', 1000, '2.0L', 1, 2, 100]
+            for i in range(3)]
+    rows.append(['Total', None, None, None, 3000, None, None, None, None, None, None, None, None, None, 300])
+
+    result = import_data_from_excel(_inventory_csv(rows), '2024-10-01', chunk_rows=2, commit_rows=2)
+
+    assert 'error' not in result
+    assert (result['cars_added'], result['profits_added']) == (3, 3)
+
+
+def test_invalid_file_is_rejected_before_registration(migrated_db):
+    rows = [['Total', None, None, None, 3000, None, None, None, None, None, None, None, None, None, 300]]
+
+    result = import_data_from_excel(_inventory_csv(rows), '2024-10-01', commit_rows=2)
+
+    assert 'Ни в одной строке' in result['error']
+    with session_scope() as session:
+        assert session.execute(select(Imports.id)).all() == []
@@ -0,0 +1,26 @@
+from datetime import date
+
+from sqlalchemy import select, update
+
+from database.db import session_scope
+from database.models import Profits, CarLatestProfit
+from services.batch_import import import_backfill
+from services.update_db import update_profit_history
+
+
+def _file(file_name: str, sales: int) -> dict:
+    return {'content': f"vStockNo,Manufacturer,Sales\n10500,FORD,{sales}\n".encode(), 'file_name': file_name}
+
+
+def test_update_profit_history_rechains_and_refreshes_latest(migrated_db):
+    import_backfill([_file('inv_2024-10-01.csv', 100), _file('inv_2024-10-08.csv', 250)], max_workers=1)
+    with session_scope() as session:
+        session.execute(update(Profits).values(change_amount=7))
+        session.execute(update(CarLatestProfit).values(change_amount=7))
+
+    update_profit_history()
+
+    with session_scope() as session:
+        chain = session.execute(select(Profits.date, Profits.change_amount).order_by(Profits.date)).all()
+        assert [tuple(row) for row in chain] == [(date(2024, 10, 1), 100), (date(2024, 10, 8), 150)]
+        assert session.execute(select(CarLatestProfit.change_amount)).scalar() == 150